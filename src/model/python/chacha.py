@@ -42,7 +42,20 @@
 #-------------------------------------------------------------------
 # Python module imports.
 #-------------------------------------------------------------------
+import os
 import sys
+import json
+import time
+import array
+import struct
+import argparse
+import copy
+import functools
+import threading
+import collections
+import concurrent.futures
+
+from chacha_codegen import QR_INDICES, block_function
 
 
 #-------------------------------------------------------------------
@@ -51,251 +64,1107 @@ import sys
 TAU   = [0x61707865, 0x3120646e, 0x79622d36, 0x6b206574]
 SIGMA = [0x61707865, 0x3320646e, 0x79622d32, 0x6b206574]
 
+# Packing of the 16 state words into a little endian 64 byte block.
+BLOCK_STRUCT = struct.Struct('<16I')
+
+# Event tags and number of words per event in TraceRecorder.
+TRACE_INIT  = 0
+TRACE_BLOCK = 1
+TRACE_QR    = 2
+TRACE_ROUND = 3
+TRACE_DONE  = 4
+TRACE_EVENT_WORDS = [16, 18, 14, 18, 18]
+
+# Default max number of keys in the key template cache.
+DEFAULT_KEY_CACHE_SIZE = 4096
+
+# Default max number of cached XChaCha subkey templates.
+DEFAULT_SUBKEY_CACHE_SIZE = 1024
+
+# State layouts. The original layout with 64 bit iv and 64 bit
+# block counter used by the HW, RFC 8439 with 96 bit nonce and
+# 32 bit block counter, and XChaCha with 192 bit nonce.
+MODE_ORIGINAL = "original"
+MODE_IETF     = "ietf"
+MODE_XCHACHA  = "xchacha"
+MODES = [MODE_ORIGINAL, MODE_IETF, MODE_XCHACHA]
+
+# Fields of PerfCounters. Times are in seconds.
+PERF_FIELDS = ("blocks", "bytes", "key_setups", "seeks", "keystream_hits",
+               "key_setup_time", "rounds_time", "xor_time")
+
+# Environment variable that enables the perf counters for all
+# new instances.
+PERF_ENV = "CHACHA_PERF"
+
+# Names of the cipher engines. The numpy engine requires NumPy.
+ENGINES = ["python", "numpy"]
+
+# Default number of bytes per chunk handled by a worker in the
+# command line tool. Must be a multiple of the block size.
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+#-------------------------------------------------------------------
+# quarterround()
+#
+# The quarterround function. Returns the updated a, b, c, d.
+#-------------------------------------------------------------------
+def quarterround(a, b, c, d):
+    (a0, a1, b0, b1, b2, b3, c0, c1, d0, d1, d2, d3) = quarterround_steps(a, b, c, d)
+    return (a1, b3, c1, d3)
+
+
+#-------------------------------------------------------------------
+# quarterround_steps()
+#
+# The quarterround function with all intermediate values
+# returned, named as in chacha_qr.v.
+#-------------------------------------------------------------------
+def quarterround_steps(a, b, c, d):
+    a0 = (a + b) & 0xffffffff
+    d0 = d ^ a0
+    d1 = ((d0 << 16) + (d0 >> 16)) & 0xffffffff
+    c0 = (c + d1) & 0xffffffff
+    b0 = b ^ c0
+    b1 = ((b0 << 12) + (b0 >> 20)) & 0xffffffff
+    a1 = (a0 + b1) & 0xffffffff
+    d2 = d1 ^ a1
+    d3 = ((d2 << 8) + (d2 >> 24)) & 0xffffffff
+    c1 = (c0 + d3) & 0xffffffff
+    b2 = b1 ^ c1
+    b3 = ((b2 << 7) + (b2 >> 25)) & 0xffffffff
+    return (a0, a1, b0, b1, b2, b3, c0, c1, d0, d1, d2, d3)
+
+
+#-------------------------------------------------------------------
+# xor_bytes()
+#
+# Return the XOR of two bytes-like objects of the same length as
+# bytes. The spans are converted to single integers, which means
+# that the XOR is done on whole words by the interpreter instead
+# of one byte at a time.
+#-------------------------------------------------------------------
+def xor_bytes(a, b):
+    n = len(a)
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(n, "little")
+
+
+#-------------------------------------------------------------------
+# print_words()
+#
+# Print a given list of 16 state words.
+#-------------------------------------------------------------------
+def print_words(words):
+    print(" 0: 0x%08x,  1: 0x%08x,  2: 0x%08x,  3: 0x%08x" %\
+          (words[0], words[1], words[2], words[3]))
+    print(" 4: 0x%08x,  5: 0x%08x,  6: 0x%08x,  7: 0x%08x" %\
+          (words[4], words[5], words[6], words[7]))
+    print(" 8: 0x%08x,  9: 0x%08x, 10: 0x%08x, 11: 0x%08x" %\
+          (words[8], words[9], words[10], words[11]))
+    print("12: 0x%08x, 13: 0x%08x, 14: 0x%08x, 15: 0x%08x" %\
+          (words[12], words[13], words[14], words[15]))
+    print("")
+
+
+#-------------------------------------------------------------------
+# Tracer()
+#
+# Interface for tracing the block processing. A tracer attached
+# to a ChaCha instance gets these calls. The lists given must
+# not be kept, since they are updated by the cipher.
+#-------------------------------------------------------------------
+class Tracer():
+
+    #---------------------------------------------------------------
+    # init()
+    #
+    # The state after key and iv setup.
+    #---------------------------------------------------------------
+    def init(self, state):
+        pass
+
+
+    #---------------------------------------------------------------
+    # block()
+    #
+    # Start of a block. The block counter as two words, the state
+    # and the temporary state x before round processing.
+    #---------------------------------------------------------------
+    def block(self, counter, state, x):
+        pass
+
+
+    #---------------------------------------------------------------
+    # quarterround()
+    #
+    # Quarterround qr (0..7) in double round dr done. The x
+    # indices used and the input and output words as tuples.
+    #---------------------------------------------------------------
+    def quarterround(self, dr, qr, indices, inputs, outputs):
+        pass
+
+
+    #---------------------------------------------------------------
+    # round()
+    #
+    # Round qr (0 = column, 1 = diagonal) in double round dr done,
+    # x is the temporary state after the round. This corresponds
+    # to one cycle in CTRL_ROUNDS in chacha_core.v.
+    #---------------------------------------------------------------
+    def round(self, dr, qr, x):
+        pass
+
+
+    #---------------------------------------------------------------
+    # block_done()
+    #
+    # End of a block. The block counter, the temporary state x
+    # after round processing and the block words.
+    #---------------------------------------------------------------
+    def block_done(self, counter, x, block):
+        pass
+
+
+#-------------------------------------------------------------------
+# PrintTracer()
+#
+# Tracer that prints the processing to stdout. This is what the
+# verbose parameter of ChaCha gives. Level 1 prints the states
+# before and after round processing, level 2 also prints every
+# quarterround and level 3 also the intermediate values.
+#-------------------------------------------------------------------
+class PrintTracer(Tracer):
+
+    def __init__(self, verbose = 1):
+        self.verbose = verbose
+
+
+    def init(self, state):
+        print("State after init:")
+        print_words(state)
+
+
+    def block(self, counter, state, x):
+        print("State before round processing.")
+        print_words(state)
+        print("X before round processing:")
+        print_words(x)
+
+
+    def quarterround(self, dr, qr, indices, inputs, outputs):
+        if self.verbose < 2:
+            return
+
+        if qr == 0:
+            print("Doubleround 0x%02x:" % dr)
+
+        print("Indata to quarterround:")
+        print("X state indices:", *indices)
+        print("a = 0x%08x, b = 0x%08x, c = 0x%08x, d = 0x%08x" % inputs)
+        print("")
+
+        if self.verbose > 2:
+            (a0, a1, b0, b1, b2, b3, c0, c1, d0, d1, d2, d3) = quarterround_steps(*inputs)
+            print("Intermediate values:")
+            print("a0 = 0x%08x, a1 = 0x%08x" % (a0, a1))
+            print("b0 = 0x%08x, b1 = 0x%08x, b2 = 0x%08x, b3 = 0x%08x" %\
+                  (b0, b1, b2, b3))
+            print("c0 = 0x%08x, c1 = 0x%08x" % (c0, c1))
+            print("d0 = 0x%08x, d1 = 0x%08x, d2 = 0x%08x, d3 = 0x%08x" %\
+                  (d0, d1, d2, d3))
+            print("")
+
+        print("Outdata from quarterround:")
+        print("a_prim = 0x%08x, b_prim = 0x%08x, c_prim = 0x%08x, d_prim = 0x%08x" % outputs)
+        print("")
+
+
+    def round(self, dr, qr, x):
+        if (self.verbose > 1) and qr:
+            print("X after doubleround 0x%02x:" % dr)
+            print_words(x)
+
+
+    def block_done(self, counter, x, block):
+        print("X after round processing:")
+        print_words(x)
+        print("Block state after round processing.")
+        print_words(block)
+
+
+#-------------------------------------------------------------------
+# TraceRecorder()
+#
+# Tracer that records all events as 32-bit words in an array.
+# Each event is stored as a tag word followed by the words of
+# the event. dump() writes the states in the same format as the
+# dump_state task in tb_chacha_core.v.
+#-------------------------------------------------------------------
+class TraceRecorder(Tracer):
+
+    def __init__(self, quarterrounds = True):
+        self.quarterrounds = quarterrounds
+        self.buffer = array.array('I')
+
+
+    def init(self, state):
+        self.buffer.append(TRACE_INIT)
+        self.buffer.extend(state)
+
+
+    def block(self, counter, state, x):
+        self.buffer.append(TRACE_BLOCK)
+        self.buffer.extend(counter)
+        self.buffer.extend(x)
+
+
+    def quarterround(self, dr, qr, indices, inputs, outputs):
+        if self.quarterrounds:
+            self.buffer.extend((TRACE_QR, dr, qr))
+            self.buffer.extend(indices)
+            self.buffer.extend(inputs)
+            self.buffer.extend(outputs)
+
+
+    def round(self, dr, qr, x):
+        self.buffer.extend((TRACE_ROUND, dr, qr))
+        self.buffer.extend(x)
+
+
+    def block_done(self, counter, x, block):
+        self.buffer.append(TRACE_DONE)
+        self.buffer.extend(counter)
+        self.buffer.extend(block)
+
+
+    #---------------------------------------------------------------
+    # events()
+    #
+    # Generator giving the recorded events as (tag, words) tuples.
+    #---------------------------------------------------------------
+    def events(self):
+        i = 0
+        while i < len(self.buffer):
+            tag = self.buffer[i]
+            n = TRACE_EVENT_WORDS[tag]
+            yield (tag, self.buffer[(i + 1) : (i + 1 + n)].tolist())
+            i += n + 1
+
+
+    #---------------------------------------------------------------
+    # dump()
+    #
+    # Write the state at the start of every block and after every
+    # round to the file f, in the format used by dump_state in
+    # tb_chacha_core.v. The state at the start of a block is what
+    # state_reg holds after CTRL_INIT. The state after a round is
+    # what state_reg holds after the cycle with the given qr_ctr_reg
+    # and dr_ctr_reg.
+    #---------------------------------------------------------------
+    def dump(self, f = sys.stdout):
+        counter = [0, 0]
+        for (tag, words) in self.events():
+            if tag == TRACE_BLOCK:
+                counter = words[0:2]
+                self._dump_state(f, words[2:18], 0, 0, counter)
+
+            elif tag == TRACE_ROUND:
+                self._dump_state(f, words[2:18], words[1], words[0], counter)
+
+
+    def _dump_state(self, f, x, qr, dr, counter):
+        f.write("Round state:\n")
+        for i in range(0, 16, 4):
+            f.write(", ".join([("state%d_reg" % j).ljust(11) + " = %08x" % x[j]
+                               for j in range(i, i + 4)]) + "\n")
+        f.write("\n")
+        f.write("qr_ctr_reg = %01x, dr_ctr_reg  = %01x\n" % (qr, dr))
+        f.write("block0_ctr_reg = %08x, block1_ctr_reg = %08x\n" % (counter[0], counter[1]))
+        f.write("\n")
+
+
+#-------------------------------------------------------------------
+# key_template()
+#
+# Given a key of 16 or 32 bytes returns the list of the constant
+# and key words, i.e. words 0..11 of the initial state.
+#-------------------------------------------------------------------
+def key_template(key):
+    keywords = list(struct.unpack_from('<%dI' % (len(key) // 4), bytes(key)))
+
+    if len(key) == 16:
+        return TAU + keywords + keywords
+
+    elif len(key) == 32:
+        return SIGMA + keywords
+
+    else:
+        print("Key length of %d bits, is not supported." % (len(key) * 8))
+        return None
+
+
+#-------------------------------------------------------------------
+# hchacha()
+#
+# HChaCha. Given a key of 16 or 32 bytes and a nonce of 16 bytes
+# returns the 32 byte subkey, i.e. words 0..3 and 12..15 of the
+# state after the rounds, without the final addition.
+#-------------------------------------------------------------------
+def hchacha(key, nonce, rounds = 20):
+    x = key_template(key) + list(struct.unpack('<4I', bytes(nonce)))
+    for i in range(rounds // 2):
+        for (ai, bi, ci, di) in QR_INDICES:
+            (x[ai], x[bi], x[ci], x[di]) = quarterround(x[ai], x[bi], x[ci], x[di])
+    return struct.pack('<8I', *(x[0:4] + x[12:16]))
+
+
+#-------------------------------------------------------------------
+# xchacha_template()
+#
+# Given a key and the first 16 bytes of an XChaCha nonce returns
+# the constant and subkey words, i.e. words 0..11 of the initial
+# state of the ChaCha instance that processes the message.
+#-------------------------------------------------------------------
+def xchacha_template(key, nonce, rounds = 20):
+    if len(key) not in (16, 32):
+        print("Key length of %d bits, is not supported." % (len(key) * 8))
+        return None
+    return SIGMA + list(struct.unpack('<8I', hchacha(key, nonce, rounds)))
+
+
+#-------------------------------------------------------------------
+# KeyCache()
+#
+# Bounded LRU cache of key templates, keyed by the key bytes
+# (and thereby also the key length). The templates are stored
+# as array('I'). Counts hits and misses.
+# The function creating the templates can be given, any extra
+# arguments to get() are passed to it and are part of the
+# cache key.
+#-------------------------------------------------------------------
+class KeyCache():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, maxsize = DEFAULT_KEY_CACHE_SIZE, make = key_template):
+        self.maxsize = maxsize
+        self.make = make
+        self.templates = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    #---------------------------------------------------------------
+    # get()
+    #
+    # Return the template for the given key, creating and caching
+    # it if needed. Returns None for unsupported key lengths.
+    #---------------------------------------------------------------
+    def get(self, key, *args):
+        key = bytes(key)
+        cache_key = (key,) + args if args else key
+        with self.lock:
+            template = self.templates.get(cache_key)
+            if template is not None:
+                self.templates.move_to_end(cache_key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = self.make(key, *args)
+        if template is not None:
+            template = array.array('I', template)
+        if (template is not None) and (self.maxsize > 0):
+            with self.lock:
+                self.templates[cache_key] = template
+                while len(self.templates) > self.maxsize:
+                    self.templates.popitem(last = False)
+        return template
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return a dict with the hit and miss counters and the size.
+    #---------------------------------------------------------------
+    def stats(self):
+        return {"hits" : self.hits, "misses" : self.misses,
+                "size" : len(self.templates), "maxsize" : self.maxsize}
+
+
+    #---------------------------------------------------------------
+    # clear()
+    #
+    # Remove all templates and reset the counters.
+    #---------------------------------------------------------------
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# The key cache shared by all ChaCha instances by default.
+KEY_CACHE = KeyCache()
+
+# The XChaCha subkey cache shared by all ChaCha instances by
+# default. Keyed by key, the first 16 nonce bytes and rounds.
+SUBKEY_CACHE = KeyCache(DEFAULT_SUBKEY_CACHE_SIZE, xchacha_template)
+
+
+#-------------------------------------------------------------------
+# PerfCounters()
+#
+# Performance counters of a ChaCha instance: keystream blocks
+# generated, keystream bytes produced, key setups, counter
+# seeks and keystream() calls that used buffered keystream, and
+# the time spent in key setup, in the rounds and in serializing
+# the blocks and XOR with the data.
+#-------------------------------------------------------------------
+class PerfCounters():
+
+    __slots__ = PERF_FIELDS
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self):
+        self.reset()
+
+
+    #---------------------------------------------------------------
+    # reset()
+    #
+    # Set all counters to zero.
+    #---------------------------------------------------------------
+    def reset(self):
+        for name in PERF_FIELDS:
+            setattr(self, name, 0)
+
+
+    #---------------------------------------------------------------
+    # add()
+    #
+    # Add the counters of another PerfCounters to this one.
+    #---------------------------------------------------------------
+    def add(self, other):
+        for name in PERF_FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+    #---------------------------------------------------------------
+    # as_dict()
+    #
+    # Return the counters as a dict.
+    #---------------------------------------------------------------
+    def as_dict(self):
+        return {name : getattr(self, name) for name in PERF_FIELDS}
+
+
+#-------------------------------------------------------------------
+# PerfRegistry()
+#
+# Process wide aggregate of the perf counters. The counters of
+# live instances are registered here and are added to the
+# retired counters when the instance is deleted or the counters
+# are disabled. The counters of an instance are only updated by
+# the thread using it, the lock only protects the registry.
+# enabled is the default for new instances, and is initially
+# set if the CHACHA_PERF environment variable is set.
+#-------------------------------------------------------------------
+class PerfRegistry():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.live = set()
+        self.retired = PerfCounters()
+
+
+    #---------------------------------------------------------------
+    # register()
+    #---------------------------------------------------------------
+    def register(self, counters):
+        with self.lock:
+            self.live.add(counters)
+
+
+    #---------------------------------------------------------------
+    # retire()
+    #
+    # Move the counters of an instance to the retired counters.
+    #---------------------------------------------------------------
+    def retire(self, counters):
+        with self.lock:
+            if counters in self.live:
+                self.live.discard(counters)
+                self.retired.add(counters)
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return a dict with the sum of the counters of all live and
+    # retired instances, and the number of live instances.
+    #---------------------------------------------------------------
+    def stats(self):
+        total = PerfCounters()
+        with self.lock:
+            total.add(self.retired)
+            for counters in self.live:
+                total.add(counters)
+            result = total.as_dict()
+            result["instances"] = len(self.live)
+        return result
+
+
+    #---------------------------------------------------------------
+    # dump()
+    #
+    # Write stats() as JSON to the given file.
+    #---------------------------------------------------------------
+    def dump(self, f = sys.stdout):
+        json.dump(self.stats(), f, indent=2)
+        f.write("\n")
+
+
+    #---------------------------------------------------------------
+    # reset()
+    #
+    # Set the counters of all live and retired instances to zero.
+    #---------------------------------------------------------------
+    def reset(self):
+        with self.lock:
+            self.retired.reset()
+            for counters in self.live:
+                counters.reset()
+
+
+# The process wide perf counters.
+PERF_REGISTRY = PerfRegistry(bool(os.environ.get(PERF_ENV)))
+
 
 #-------------------------------------------------------------------
 # ChaCha()
+#
+# The state is updated in place, which means that an instance
+# must not be used by several threads at the same time. Use
+# ChaChaPool in chacha_pool.py to share a key between threads.
+#
+# To keep many live instances cheap the class uses __slots__ and
+# the 16 state words, including the block counter in words 12
+# and 13, are kept in a single array('I'). The scratch state for
+# the rounds only exists while a block is computed. On 64 bit
+# CPython 3.11 an instance uses about 480 bytes: the object with
+# its slots, the state array and the partial binding the block
+# function to the state. This is measured with chacha_bench.py
+# --memory, which reported about 700 bytes per instance for the
+# previous layout with lists of ints and a __dict__.
+#
+# The perf counters are opt-in. When enabled the instance is
+# switched to a subclass that counts and times the work, see
+# set_perf(). Without them the methods below have no checks.
 #-------------------------------------------------------------------
 class ChaCha():
-    
+
+    __slots__ = ("state", "_rounds", "verbose", "mode", "counter_words",
+                 "counter_end", "tracer", "_block", "keystream_tail", "key", "perf")
+
+    # Key cache used by set_key_iv().
+    key_cache = KEY_CACHE
+
+    # Subkey cache used by set_iv() in XChaCha mode.
+    subkey_cache = SUBKEY_CACHE
+
     #---------------------------------------------------------------
     # __init__()
     #
     # Given the key, iv initializes the state of the cipher.
     # The number of rounds used can be set. By default 8 rounds
     # are used. Accepts a list of either 16 or 32 bytes as key.
-    # Accepts a list of 8 bytes as IV.
+    # Accepts a list of 8 bytes as IV. If verbose is set and no
+    # tracer is given, a PrintTracer with the verbose level is used.
+    #
+    # The mode selects the state layout:
+    # MODE_ORIGINAL: 8 byte iv, 64 bit block counter.
+    # MODE_IETF: 12 byte nonce, 32 bit block counter (RFC 8439).
+    # The counter does not wrap, OverflowError is raised for
+    # requests that would use blocks past 2**32 - 1.
+    # MODE_XCHACHA: 24 byte nonce. The key and the first 16 nonce
+    # bytes give a subkey using HChaCha with the same number of
+    # rounds, the last 8 nonce bytes are used as iv with a 64 bit
+    # block counter. For counters below 2**32 this is the same as
+    # the RFC 8439 based XChaCha20 construction.
+    #
+    # If perf is true the perf counters are enabled. If perf is
+    # None the default from PERF_REGISTRY.enabled is used.
     #---------------------------------------------------------------
-    def __init__(self, key, iv, rounds = 8, verbose = 0):
-        self.state = [0] * 16
-        self.x = [0] * 16
-        self.rounds = rounds
+    def __init__(self, key, iv, rounds = 8, verbose = 0, tracer = None,
+                 mode = MODE_ORIGINAL, perf = None):
+        if mode not in MODES:
+            raise ValueError("Mode %s is not supported." % mode)
+        self.state = array.array('I', bytes(64))
+        self._rounds = rounds
         self.verbose = verbose
+        self.mode = mode
+        self.counter_words = 1 if (mode == MODE_IETF) else 2
+        self.perf = None
+        if (tracer is None) and verbose:
+            tracer = PrintTracer(verbose)
+        self.set_tracer(tracer)
+        if perf is None:
+            perf = PERF_REGISTRY.enabled
+        if perf:
+            self.set_perf(True)
         self.set_key_iv(key, iv)
-        
+
+
+    #---------------------------------------------------------------
+    # __setstate__()
+    #
+    # Used by copy and pickle. The copy gets its own state array,
+    # and its own block function bound to it.
+    #---------------------------------------------------------------
+    def __setstate__(self, state):
+        (_, slots) = state
+        for (name, value) in slots.items():
+            setattr(self, name, value)
+        self.state = array.array('I', self.state)
+        self.set_tracer(self.tracer)
+
+
+    #---------------------------------------------------------------
+    # rounds
+    #
+    # The number of rounds. Setting it selects the block function
+    # for the new number of rounds. In XChaCha mode the subkey is
+    # derived with the rounds in use when the nonce is set.
+    #---------------------------------------------------------------
+    @property
+    def rounds(self):
+        return self._rounds
+
+
+    @rounds.setter
+    def rounds(self, rounds):
+        self._rounds = rounds
+        self.set_tracer(self.tracer)
+
+
+    #---------------------------------------------------------------
+    # set_tracer()
+    #
+    # Attach a tracer, or detach with None. The block function
+    # is selected here, which means that without a tracer no
+    # tracing checks are done when processing blocks. Without a
+    # tracer the generated block function for the number of
+    # rounds from chacha_codegen.py is bound to the state.
+    #---------------------------------------------------------------
+    def set_tracer(self, tracer):
+        self.tracer = tracer
+        if tracer is None:
+            self._block = functools.partial(block_function(self.rounds), self.state)
+        else:
+            self._block = self._traced_block
+
+
+    #---------------------------------------------------------------
+    # set_perf()
+    #
+    # Enable or disable the perf counters. When enabled the
+    # instance class is switched to the subclass from perf_class()
+    # and new counters are registered in PERF_REGISTRY. When
+    # disabled the counters are retired and the original class
+    # is restored, which means that a disabled instance does no
+    # counting at all.
+    #---------------------------------------------------------------
+    def set_perf(self, enabled = True):
+        if enabled and (self.perf is None):
+            self.__class__ = perf_class(type(self))
+            self.perf = PerfCounters()
+            PERF_REGISTRY.register(self.perf)
+            self.set_tracer(self.tracer)
+
+        elif (not enabled) and (self.perf is not None):
+            PERF_REGISTRY.retire(self.perf)
+            self.perf = None
+            self.__class__ = self._perf_base
+            self.set_tracer(self.tracer)
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return a dict with the perf counters of the instance, all
+    # zero if the perf counters are not enabled.
+    #---------------------------------------------------------------
+    def stats(self):
+        if self.perf is None:
+            result = PerfCounters().as_dict()
+        else:
+            result = self.perf.as_dict()
+        result["enabled"] = self.perf is not None
+        return result
+
 
     #---------------------------------------------------------------
     # set_key_iv()
     # 
     # Set key and iv. Basically reinitialize the cipher.
-    # This also resets the block counter.
-    #---------------------------------------------------------------
-    def set_key_iv(self, key, iv):
-        keyword0 = self._b2w(key[0:4])
-        keyword1 = self._b2w(key[4:8])
-        keyword2 = self._b2w(key[8:12])
-        keyword3 = self._b2w(key[12:16])
-        
-        if len(key) == 16:
-            self.state[0]  = TAU[0]
-            self.state[1]  = TAU[1]
-            self.state[2]  = TAU[2]
-            self.state[3]  = TAU[3]
-            self.state[4]  = keyword0
-            self.state[5]  = keyword1
-            self.state[6]  = keyword2
-            self.state[7]  = keyword3
-            self.state[8]  = keyword0
-            self.state[9]  = keyword1
-            self.state[10] = keyword2
-            self.state[11] = keyword3
-
-        elif len(key) == 32:
-            keyword4 = self._b2w(key[16:20])
-            keyword5 = self._b2w(key[20:24])
-            keyword6 = self._b2w(key[24:28])
-            keyword7 = self._b2w(key[28:32])
-            self.state[0]  = SIGMA[0]
-            self.state[1]  = SIGMA[1]
-            self.state[2]  = SIGMA[2]
-            self.state[3]  = SIGMA[3]
-            self.state[4]  = keyword0
-            self.state[5]  = keyword1
-            self.state[6]  = keyword2
-            self.state[7]  = keyword3
-            self.state[8]  = keyword4
-            self.state[9]  = keyword5
-            self.state[10] = keyword6
-            self.state[11] = keyword7
+    # This also resets the block counter. The constant and
+    # key words are taken from the key cache, unless cache is
+    # false. In XChaCha mode they are instead set by set_iv()
+    # from the subkey cache.
+    #---------------------------------------------------------------
+    def set_key_iv(self, key, iv, cache = True):
+        if self.mode == MODE_XCHACHA:
+            self.key = bytes(key)
         else:
-            print("Key length of %d bits, is not supported." % (len(key) * 8))
+            if cache:
+                template = self.key_cache.get(key)
+            else:
+                template = key_template(key)
+            if template is not None:
+                self.state[0:12] = array.array('I', template)
+        self.set_iv(iv)
 
-        # Common state init for both key lengths.
-        self.block_counter = [0, 0]
-        self.state[12] = self.block_counter[0]
-        self.state[13] = self.block_counter[1]
-        self.state[14] = self._b2w(iv[0:4])
-        self.state[15] = self._b2w(iv[4:8])
+        if self.tracer is not None:
+            self.tracer.init(self.state)
+
+
+    #---------------------------------------------------------------
+    # set_iv()
+    #
+    # Set a new iv for the current key. This also resets
+    # the block counter. In IETF mode the first nonce word is
+    # kept as the fixed upper word of the block counter. In
+    # XChaCha mode the subkey is set for the new nonce.
+    #---------------------------------------------------------------
+    def set_iv(self, iv):
+        state = self.state
+        state[12] = 0
+        state[13] = 0
+        self.counter_end = False
+
+        if self.mode != MODE_ORIGINAL:
+            if len(iv) != (12 if (self.mode == MODE_IETF) else 24):
+                raise ValueError("Nonce length of %d bits, is not supported in %s mode." %
+                                 ((len(iv) * 8), self.mode))
+
+            if self.mode == MODE_IETF:
+                state[13] = self._b2w(iv[0:4])
+                iv = iv[4:12]
+
+            else:
+                template = self.subkey_cache.get(self.key, bytes(iv[0:16]), self.rounds)
+                if template is not None:
+                    state[0:12] = template
+                iv = iv[16:24]
+
+        self.keystream_tail = b''
+        state[14] = self._b2w(iv[0:4])
+        state[15] = self._b2w(iv[4:8])
 
-        if self.verbose:
-            print("State after init:")
-            self._print_state()
-        
 
     #---------------------------------------------------------------
     # next()
     #
-    # Encyp/decrypt the next block. This also updates the
-    # internal state and increases the block counter.
+    # Encyp/decrypt the next block given and returned as a list
+    # of 64 byte values. This also increases the block counter.
+    # Any buffered keystream from encrypt() is discarded. Kept for
+    # compatibility, encrypt_block() works on bytes.
     #---------------------------------------------------------------
     def next(self, data_in):
-        # Copy the current internal state to the temporary state x.
-        self.x = self.state[:]
+        return list(self.encrypt_block(bytes(data_in)))
 
-        if self.verbose:
-            print("State before round processing.")
-            self._print_state()
 
-        if self.verbose:
-            print("X before round processing:")
-            self._print_x()
-        
-        # Update the internal state by performing
-        # (rounds / 2) double rounds.
-        for i in range(int(self.rounds / 2)):
-            if (self.verbose > 1):
-                print("Doubleround 0x%02x:" % i)
-            self._doubleround()
-            if (self.verbose > 1):
-                print("")
-            
-        if self.verbose:
-            print("X after round processing:")
-            self._print_x()
-
-        # Update the internal state by adding the elements
-        # of the temporary state to the internal state.
-        self.state = [((self.state[i] + self.x[i]) & 0xffffffff) for i in range(16)]
-
-        if self.verbose:
-            print("State after round processing.")
-            self._print_state()
-        
-        bytestate = []
-        for i in self.state:
-            bytestate += self._w2b(i)
-        
-        # Create the data out words.
-        data_out = [data_in[i] ^ bytestate[i] for i in range(64)]
-
-        # Update the block counter.
+    #---------------------------------------------------------------
+    # encrypt_block()
+    #
+    # Encyp/decrypt the next block given as a bytes-like object of
+    # 64 bytes, and return the result as bytes. This also increases
+    # the block counter. Any buffered keystream from encrypt() is
+    # discarded.
+    #---------------------------------------------------------------
+    def encrypt_block(self, data_in):
+        data_in = memoryview(data_in).cast('B')
+        if len(data_in) != 64:
+            raise ValueError("Block of %d bytes, must be 64 bytes." % len(data_in))
+
+        self._check_counter(1)
+        self.keystream_tail = b''
+        keystream = BLOCK_STRUCT.pack(*self._block())
         self._inc_counter()
-        
-        return data_out
+        return xor_bytes(data_in, keystream)
+
+
+    #---------------------------------------------------------------
+    # encrypt()
+    #
+    # Encrypt/decrypt data given as any bytes-like object of any
+    # length and return the result as bytes. Keystream bytes not
+    # used by a call are kept and used by the next call. This means
+    # that a message processed in pieces of any size gives the same
+    # result as processing the whole message in one call.
+    #---------------------------------------------------------------
+    def encrypt(self, data):
+        data = memoryview(data).cast('B')
+        return xor_bytes(data, self.keystream(len(data)))
+
+
+    #---------------------------------------------------------------
+    # decrypt()
+    #
+    # Decryption is the same operation as encryption.
+    #---------------------------------------------------------------
+    def decrypt(self, data):
+        return self.encrypt(data)
+
+
+    #---------------------------------------------------------------
+    # keystream_into()
+    #
+    # Write nblocks consecutive keystream blocks into the given
+    # writable buffer (bytearray, memoryview etc), starting at
+    # offset zero. The block counter is advanced once per block.
+    # The blocks start at the current block counter, any buffered
+    # keystream from encrypt() is discarded.
+    # Returns the number of bytes written.
+    #---------------------------------------------------------------
+    def keystream_into(self, buf, nblocks):
+        view = memoryview(buf).cast('B')
+        if len(view) < (nblocks * 64):
+            raise ValueError("Buffer of %d bytes can not hold %d blocks." %
+                             (len(view), nblocks))
+
+        self._check_counter(nblocks)
+        self.keystream_tail = b''
+        self._blocks_into(view, nblocks)
+        return nblocks * 64
+
+
+    #---------------------------------------------------------------
+    # keystream()
+    #
+    # Return the next nbytes of keystream as bytes. Buffered
+    # keystream from a previous call is used first, and any
+    # remaining bytes in the last generated block are kept
+    # for the next call.
+    #---------------------------------------------------------------
+    def keystream(self, nbytes):
+        tail = self.keystream_tail
+        if nbytes <= len(tail):
+            self.keystream_tail = tail[nbytes:]
+            return tail[:nbytes]
+
+        nblocks = (nbytes - len(tail) + 63) // 64
+        self._check_counter(nblocks)
+        buf = bytearray(len(tail) + (nblocks * 64))
+        buf[0 : len(tail)] = tail
+        self._blocks_into(memoryview(buf)[len(tail):], nblocks)
+        self.keystream_tail = bytes(buf[nbytes:])
+        del buf[nbytes:]
+        return bytes(buf)
+
+
+    #---------------------------------------------------------------
+    # set_counter()
+    #
+    # Set the 64 bit (32 bit in IETF mode) block counter. The next
+    # block generated will be block n of the keystream. Any
+    # buffered keystream is discarded. In IETF mode n may be 2**32,
+    # the end of the counter range.
+    #---------------------------------------------------------------
+    def set_counter(self, n):
+        if (self.counter_words == 1) and (n > 0x100000000):
+            raise OverflowError("Block counter %d, is not supported in %s mode." %
+                                (n, self.mode))
+        self.state[12] = n & 0xffffffff
+        if self.counter_words == 2:
+            self.state[13] = (n >> 32) & 0xffffffff
+        self.counter_end = (self.counter_words == 1) and (n > 0xffffffff)
+        self.keystream_tail = b''
+
+
+    #---------------------------------------------------------------
+    # get_counter()
+    #
+    # Return the 64 bit (32 bit in IETF mode) block counter,
+    # i.e. the number of the next block to be generated.
+    #---------------------------------------------------------------
+    def get_counter(self):
+        if self.counter_words == 1:
+            return self.state[12] + (self.counter_end << 32)
+        return self.state[12] + (self.state[13] << 32)
+
+
+    #---------------------------------------------------------------
+    # block_counter
+    #
+    # The block counter words as a list [low, high]. In IETF
+    # mode the high word is the first nonce word.
+    #---------------------------------------------------------------
+    @property
+    def block_counter(self):
+        return [self.state[12], self.state[13]]
+
+
+    #---------------------------------------------------------------
+    # seek()
+    #
+    # Move to the given byte offset in the keystream. Only the
+    # block containing the offset is computed. If the offset is
+    # not block aligned the rest of that block is buffered for
+    # the next encrypt()/keystream() call.
+    #---------------------------------------------------------------
+    def seek(self, byte_offset):
+        self.set_counter(byte_offset // 64)
+        if byte_offset % 64:
+            self.keystream_tail = self.keystream(64)[(byte_offset % 64):]
+
+
+    #---------------------------------------------------------------
+    # tell()
+    #
+    # Return the current byte offset in the keystream.
+    #---------------------------------------------------------------
+    def tell(self):
+        return (self.get_counter() * 64) - len(self.keystream_tail)
+
+
+    #---------------------------------------------------------------
+    # _blocks_into()
+    #
+    # Pack nblocks consecutive keystream blocks into the given
+    # byte memoryview and advance the block counter.
+    #---------------------------------------------------------------
+    def _blocks_into(self, view, nblocks):
+        pack_into = BLOCK_STRUCT.pack_into
+        for i in range(nblocks):
+            pack_into(view, i * 64, *self._block())
+            self._inc_counter()
+
+
+    #---------------------------------------------------------------
+    # _plain_block()
+    #
+    # Generate the keystream block for the current block counter
+    # as a list of 16 words. The block is always computed from the
+    # key and iv in the internal state with the block counter
+    # in state words 12 and 13, just like the init_state_word
+    # logic in the HW. This is the reference for the generated
+    # block functions used when no tracer is attached.
+    #---------------------------------------------------------------
+    def _plain_block(self):
+        state = self.state
+
+        # Copy the current internal state to the temporary state x.
+        x = state.tolist()
+
+        # Update the temporary state by performing
+        # (rounds / 2) double rounds.
+        for i in range(self.rounds // 2):
+            self._doubleround(x)
+
+        # The block is the sum of the internal state and
+        # the temporary state.
+        return [((a + b) & 0xffffffff) for (a, b) in zip(state, x)]
+
+
+    #---------------------------------------------------------------
+    # _traced_block()
+    #
+    # Same as _plain_block() but reports the initial state, the
+    # inputs and outputs of every quarterround, the state after
+    # every round and the final block to the tracer.
+    #---------------------------------------------------------------
+    def _traced_block(self):
+        tracer = self.tracer
+        x = self.state.tolist()
+        tracer.block(self.block_counter, self.state, x)
+
+        for dr in range(self.rounds // 2):
+            for qr in range(2):
+                for i in range((qr * 4), (qr * 4) + 4):
+                    (ai, bi, ci, di) = QR_INDICES[i]
+                    inputs = (x[ai], x[bi], x[ci], x[di])
+                    self._quarterround(x, ai, bi, ci, di)
+                    tracer.quarterround(dr, i, QR_INDICES[i], inputs,
+                                        (x[ai], x[bi], x[ci], x[di]))
+                tracer.round(dr, qr, x)
+
+        block = [((self.state[i] + x[i]) & 0xffffffff) for i in range(16)]
+        tracer.block_done(self.block_counter, x, block)
+        return block
 
 
     #---------------------------------------------------------------
     # _doubleround()
     #
     # Perform the two complete rounds that comprises the
-    # double round.
-    #---------------------------------------------------------------
-    def _doubleround(self):
-        if (self.verbose > 0):
-            print("Start of double round processing.")
-        
-        self._quarterround(0, 4,  8, 12)
-        if (self.verbose > 1):
-            print("X after QR 0")
-            self._print_x()
-        self._quarterround(1, 5,  9, 13)
-        if (self.verbose > 1):
-            print("X after QR 1")
-            self._print_x()
-        self._quarterround(2, 6, 10, 14)
-        if (self.verbose > 1):
-            print("X after QR 2")
-            self._print_x()
-        self._quarterround(3, 7, 11, 15)
-        if (self.verbose > 1):
-            print("X after QR 3")
-            self._print_x()
-        
-        self._quarterround(0, 5, 10, 15)
-        if (self.verbose > 1):
-            print("X after QR 4")
-            self._print_x()
-        self._quarterround(1, 6, 11, 12)
-        if (self.verbose > 1):
-            print("X after QR 5")
-            self._print_x()
-        self._quarterround(2, 7,  8, 13)
-        if (self.verbose > 1):
-            print("X after QR 6")
-            self._print_x()
-        self._quarterround(3, 4,  9, 14)
-        if (self.verbose > 1):
-            print("X after QR 7")
-            self._print_x()
-            
-        if (self.verbose > 0):
-            print("End of double round processing.")
-
-            
+    # double round on the temporary state x.
+    #---------------------------------------------------------------
+    def _doubleround(self, x):
+        self._quarterround(x, 0, 4,  8, 12)
+        self._quarterround(x, 1, 5,  9, 13)
+        self._quarterround(x, 2, 6, 10, 14)
+        self._quarterround(x, 3, 7, 11, 15)
+
+        self._quarterround(x, 0, 5, 10, 15)
+        self._quarterround(x, 1, 6, 11, 12)
+        self._quarterround(x, 2, 7,  8, 13)
+        self._quarterround(x, 3, 4,  9, 14)
+
+
     #---------------------------------------------------------------
     #  _quarterround()
     #
     # Updates four elements in the state vector x given by
     # their indices.
     #---------------------------------------------------------------
-    def _quarterround(self, ai, bi, ci, di):
+    def _quarterround(self, x, ai, bi, ci, di):
         # Extract four elemenst from x using the qi tuple.
-        a, b, c, d = self.x[ai], self.x[bi], self.x[ci], self.x[di]
+        a, b, c, d = x[ai], x[bi], x[ci], x[di]
+        (a_prim, b_prim, c_prim, d_prim) = quarterround(a, b, c, d)
 
-        if (self.verbose > 1):
-            print("Indata to quarterround:")
-            print("X state indices:", ai, bi, ci, di)
-            print("a = 0x%08x, b = 0x%08x, c = 0x%08x, d = 0x%08x" %\
-                  (a, b, c, d))
-            print("")
-            
-        a0 = (a + b) & 0xffffffff
-        d0 = d ^ a0
-        d1 = ((d0 << 16) + (d0 >> 16)) & 0xffffffff
-        c0 = (c + d1) & 0xffffffff
-        b0 = b ^ c0
-        b1 = ((b0 << 12) + (b0 >> 20)) & 0xffffffff
-        a1 = (a0 + b1) & 0xffffffff
-        d2 = d1 ^ a1
-        d3 = ((d2 << 8) + (d2 >> 24)) & 0xffffffff
-        c1 = (c0 + d3) & 0xffffffff 
-        b2 = b1 ^ c1
-        b3 = ((b2 << 7) + (b2 >> 25)) & 0xffffffff 
-
-        if (self.verbose > 2):
-            print("Intermediate values:")
-            print("a0 = 0x%08x, a1 = 0x%08x" % (a0, a1))
-            print("b0 = 0x%08x, b1 = 0x%08x, b2 = 0x%08x, b3 = 0x%08x" %\
-                  (b0, b1, b2, b3))
-            print("c0 = 0x%08x, c1 = 0x%08x" % (c0, c1))
-            print("d0 = 0x%08x, d1 = 0x%08x, d2 = 0x%08x, d3 = 0x%08x" %\
-                  (d0, d1, d2, d3))
-            print("")
-        
-        a_prim = a1
-        b_prim = b3
-        c_prim = c1
-        d_prim = d3
-
-        if (self.verbose > 1):
-            print("Outdata from quarterround:")
-            print("a_prim = 0x%08x, b_prim = 0x%08x, c_prim = 0x%08x, d_prim = 0x%08x" %\
-                  (a_prim, b_prim, c_prim, d_prim))
-            print("")
-            
         # Update the four elemenst in x using the qi tuple.
-        self.x[ai], self.x[bi] = a_prim, b_prim
-        self.x[ci], self.x[di] = c_prim, d_prim
+        x[ai], x[bi] = a_prim, b_prim
+        x[ci], x[di] = c_prim, d_prim
+
+
+    #---------------------------------------------------------------
+    # _check_counter()
+    #
+    # Raise OverflowError if generating nblocks blocks would use
+    # blocks past 2**32 - 1 with the 32 bit IETF block counter.
+    #---------------------------------------------------------------
+    def _check_counter(self, nblocks):
+        if (self.counter_words == 1) and ((self.get_counter() + nblocks) > 0x100000000):
+            raise OverflowError("Block counter would wrap in %s mode." % self.mode)
 
 
     #---------------------------------------------------------------
     # _inc_counter()
     #
-    # Increase the 64 bit block counter.
+    # Increase the 64 bit block counter. The counter wraps
+    # around to zero after 0xffffffffffffffff. The 32 bit IETF
+    # counter is checked by _check_counter() before use, after
+    # block 2**32 - 1 counter_end is set instead of wrapping.
     #---------------------------------------------------------------
     def _inc_counter(self):
-        self.block_counter[0] += 1 & 0xffffffff
-        if not (self.block_counter[0] % 0xffffffff):
-            self.block_counter[1] += 1 & 0xffffffff
+        state = self.state
+        state[12] = (state[12] + 1) & 0xffffffff
+        if not state[12]:
+            if self.counter_words == 2:
+                state[13] = (state[13] + 1) & 0xffffffff
+            else:
+                self.counter_end = True
 
 
     #---------------------------------------------------------------
@@ -320,38 +1189,198 @@ class ChaCha():
                 ((word & 0x00ff0000) >> 16), ((word & 0xff000000) >> 24)]
 
 
+#-------------------------------------------------------------------
+# PerfMixin()
+#
+# Methods that update the perf counters. Combined with a cipher
+# class by perf_class(). Every method does the same work as the
+# cipher class method and adds to the counters. The time in the
+# rounds is measured by a wrapper around the block function.
+#-------------------------------------------------------------------
+class PerfMixin():
+
+    __slots__ = ()
+
     #---------------------------------------------------------------
-    # _print_state()
+    # __del__()
     #
-    # Print the internal state.
+    # Keep the counters of the instance in the aggregate.
     #---------------------------------------------------------------
-    def _print_state(self):
-        print(" 0: 0x%08x,  1: 0x%08x,  2: 0x%08x,  3: 0x%08x" %\
-              (self.state[0], self.state[1], self.state[2], self.state[3]))
-        print(" 4: 0x%08x,  5: 0x%08x,  6: 0x%08x,  7: 0x%08x" %\
-              (self.state[4], self.state[5], self.state[6], self.state[7]))
-        print(" 8: 0x%08x,  9: 0x%08x, 10: 0x%08x, 11: 0x%08x" %\
-              (self.state[8], self.state[9], self.state[10], self.state[11]))
-        print("12: 0x%08x, 13: 0x%08x, 14: 0x%08x, 15: 0x%08x" %\
-              (self.state[12], self.state[13], self.state[14], self.state[15]))
-        print("")
+    def __del__(self):
+        if self.perf is not None:
+            PERF_REGISTRY.retire(self.perf)
 
 
     #---------------------------------------------------------------
-    # _print_x()
+    # __setstate__()
     #
-    # Print the temporary state X.
+    # Used by copy and pickle. The copy gets its own counters,
+    # and its own timed block function since the wrapper of the
+    # original is not copied.
     #---------------------------------------------------------------
-    def _print_x(self):
-        print(" 0: 0x%08x,  1: 0x%08x,  2: 0x%08x,  3: 0x%08x" %\
-              (self.x[0], self.x[1], self.x[2], self.x[3]))
-        print(" 4: 0x%08x,  5: 0x%08x,  6: 0x%08x,  7: 0x%08x" %\
-              (self.x[4], self.x[5], self.x[6], self.x[7]))
-        print(" 8: 0x%08x,  9: 0x%08x, 10: 0x%08x, 11: 0x%08x" %\
-              (self.x[8], self.x[9], self.x[10], self.x[11]))
-        print("12: 0x%08x, 13: 0x%08x, 14: 0x%08x, 15: 0x%08x" %\
-              (self.x[12], self.x[13], self.x[14], self.x[15]))
-        print("")
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.perf = PerfCounters()
+        PERF_REGISTRY.register(self.perf)
+        self.set_tracer(self.tracer)
+
+
+    #---------------------------------------------------------------
+    # set_tracer()
+    #
+    # Select the block function and wrap it to time the rounds.
+    #---------------------------------------------------------------
+    def set_tracer(self, tracer):
+        super().set_tracer(tracer)
+        block = self._block
+        perf = self.perf
+        clock = time.perf_counter
+
+        def timed_block():
+            start = clock()
+            words = block()
+            perf.rounds_time += clock() - start
+            return words
+
+        self._block = timed_block
+
+
+    #---------------------------------------------------------------
+    # set_key_iv()
+    #---------------------------------------------------------------
+    def set_key_iv(self, key, iv, cache = True):
+        start = time.perf_counter()
+        super().set_key_iv(key, iv, cache)
+        self.perf.key_setup_time += time.perf_counter() - start
+        self.perf.key_setups += 1
+
+
+    #---------------------------------------------------------------
+    # encrypt_block()
+    #
+    # The time not spent in the rounds is spent packing the block
+    # and XOR with the data.
+    #---------------------------------------------------------------
+    def encrypt_block(self, data_in):
+        perf = self.perf
+        rounds_time = perf.rounds_time
+        start = time.perf_counter()
+        result = super().encrypt_block(data_in)
+        perf.xor_time += (time.perf_counter() - start) - (perf.rounds_time - rounds_time)
+        perf.blocks += 1
+        perf.bytes += 64
+        return result
+
+
+    #---------------------------------------------------------------
+    # encrypt()
+    #---------------------------------------------------------------
+    def encrypt(self, data):
+        data = memoryview(data).cast('B')
+        keystream = self.keystream(len(data))
+        start = time.perf_counter()
+        result = xor_bytes(data, keystream)
+        self.perf.xor_time += time.perf_counter() - start
+        return result
+
+
+    #---------------------------------------------------------------
+    # keystream_into()
+    #---------------------------------------------------------------
+    def keystream_into(self, buf, nblocks):
+        nbytes = super().keystream_into(buf, nblocks)
+        self.perf.bytes += nbytes
+        return nbytes
+
+
+    #---------------------------------------------------------------
+    # keystream()
+    #---------------------------------------------------------------
+    def keystream(self, nbytes):
+        if self.keystream_tail:
+            self.perf.keystream_hits += 1
+        self.perf.bytes += nbytes
+        return super().keystream(nbytes)
+
+
+    #---------------------------------------------------------------
+    # set_counter()
+    #
+    # Counted as a seek, seek() also ends up here.
+    #---------------------------------------------------------------
+    def set_counter(self, n):
+        super().set_counter(n)
+        self.perf.seeks += 1
+
+
+    #---------------------------------------------------------------
+    # seek()
+    #
+    # The block buffered for an unaligned offset is not returned
+    # to the caller and is not counted as bytes produced.
+    #---------------------------------------------------------------
+    def seek(self, byte_offset):
+        nbytes = self.perf.bytes
+        super().seek(byte_offset)
+        self.perf.bytes = nbytes
+
+
+    #---------------------------------------------------------------
+    # _blocks_into()
+    #
+    # The time not spent in the block function is spent packing
+    # the blocks. Engines that compute the blocks without the
+    # block function, like the numpy engine, write the words
+    # directly and all the time is counted as rounds.
+    #---------------------------------------------------------------
+    def _blocks_into(self, view, nblocks):
+        perf = self.perf
+        rounds_time = perf.rounds_time
+        start = time.perf_counter()
+        super()._blocks_into(view, nblocks)
+        elapsed = time.perf_counter() - start
+        if perf.rounds_time == rounds_time:
+            perf.rounds_time += elapsed
+        else:
+            perf.xor_time += elapsed - (perf.rounds_time - rounds_time)
+        perf.blocks += nblocks
+
+
+# Classes created by perf_class(), keyed by the cipher class.
+PERF_CLASSES = {}
+
+
+#-------------------------------------------------------------------
+# perf_class()
+#
+# Return the subclass of the given cipher class with the
+# methods from PerfMixin. It has no slots of its own, which means
+# that an instance can be switched between the classes.
+#-------------------------------------------------------------------
+def perf_class(cls):
+    if issubclass(cls, PerfMixin):
+        return cls
+    if cls not in PERF_CLASSES:
+        PERF_CLASSES.setdefault(cls, type("Perf" + cls.__name__, (PerfMixin, cls),
+                                          {"__slots__" : (), "_perf_base" : cls}))
+    return PERF_CLASSES[cls]
+
+
+#-------------------------------------------------------------------
+# get_engine()
+#
+# Return the cipher class implementing the given engine.
+# Raises ImportError if the engine is not available.
+#-------------------------------------------------------------------
+def get_engine(name):
+    if name == "python":
+        return ChaCha
+
+    if name == "numpy":
+        from chacha_numpy import ChaChaNumpy
+        return ChaChaNumpy
+
+    raise ValueError("Unknown engine %s." % name)
 
 
 #-------------------------------------------------------------------
@@ -681,13 +1710,203 @@ def main():
     print
 
 
+    # Testing with the RFC 8439 block function test vector.
+    # 256 bit key, 96 bit nonce, block counter 1, 20 rounds.
+    print("IETF-256-20: RFC 8439 section 2.3.2. 256 bit key, 20 rounds.")
+    key9 = list(range(32))
+    nonce9 = [0x00, 0x00, 0x00, 0x09, 0x00, 0x00, 0x00, 0x4a,
+              0x00, 0x00, 0x00, 0x00]
+    expected9 = [0x10, 0xf1, 0xe7, 0xe4, 0xd1, 0x3b, 0x59, 0x15,
+                 0x50, 0x0f, 0xdd, 0x1f, 0xa3, 0x20, 0x71, 0xc4,
+                 0xc7, 0xd1, 0xf4, 0xc7, 0x33, 0xc0, 0x68, 0x03,
+                 0x04, 0x22, 0xaa, 0x9a, 0xc3, 0xd4, 0x6c, 0x4e,
+                 0xd2, 0x82, 0x64, 0x46, 0x07, 0x9f, 0xaa, 0x09,
+                 0x14, 0xc2, 0xd7, 0x05, 0xd9, 0x8b, 0x02, 0xa2,
+                 0xb5, 0x12, 0x9c, 0xd1, 0xde, 0x16, 0x4e, 0xb9,
+                 0xcb, 0xd0, 0x83, 0xe8, 0xa2, 0x50, 0x3c, 0x4e]
+    block9 = [0x00] * 64
+    cipher9 = ChaCha(key9, nonce9, 20, mode=MODE_IETF)
+    cipher9.set_counter(1)
+    result9 = cipher9.next(block9)
+    check_block(result9, expected9, "IETF-256-20")
+
+    # The 32 bit IETF block counter must not wrap. The last block
+    # can be used, the request after it must fail.
+    cipher9.set_counter(0xfffffffe)
+    try:
+        cipher9.keystream(192)
+        print("ERROR: IETF block counter wrapped.")
+    except OverflowError:
+        last = cipher9.keystream(128)[64:]
+        try:
+            cipher9.keystream(1)
+            print("ERROR: IETF block counter wrapped after the last block.")
+        except OverflowError:
+            end = cipher9.get_counter()
+            cipher9.set_counter(0xffffffff)
+            if (end == 0x100000000) and (last == cipher9.keystream(64)):
+                print("SUCCESS: IETF block counter wrap was rejected.")
+            else:
+                print("ERROR: IETF block counter was not correct at the end.")
+    print
+
+
+    # Testing HChaCha20 with the test vector in
+    # draft-irtf-cfrg-xchacha section 2.2.1.
+    print("HCHACHA-256-20: HChaCha20 subkey. 256 bit key, 20 rounds.")
+    key10 = list(range(32))
+    nonce10 = [0x00, 0x00, 0x00, 0x09, 0x00, 0x00, 0x00, 0x4a,
+               0x00, 0x00, 0x00, 0x00, 0x31, 0x41, 0x59, 0x27]
+    expected10 = [0x82, 0x41, 0x3b, 0x42, 0x27, 0xb2, 0x7b, 0xfe,
+                  0xd3, 0x0e, 0x42, 0x50, 0x8a, 0x87, 0x7d, 0x73,
+                  0xa0, 0xf9, 0xe4, 0xd5, 0x8a, 0x74, 0xa8, 0x53,
+                  0xc1, 0x2e, 0xc4, 0x13, 0x26, 0xd3, 0xec, 0xdc]
+    result10 = list(hchacha(key10, nonce10, 20))
+    check_block(result10, expected10, "HCHACHA-256-20")
+    print
+
+
+    # XChaCha must be the same as ChaCha with the HChaCha subkey
+    # and the last 8 nonce bytes as iv. The second instance with
+    # the same nonce prefix should get the subkey from the cache.
+    print("XCHACHA-256-20: XChaCha with cached subkey. 256 bit key, 20 rounds.")
+    nonce11 = nonce10 + [0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08]
+    subkey_misses = SUBKEY_CACHE.misses
+    cipher11 = ChaCha(key10, nonce11, 20, mode=MODE_XCHACHA)
+    result11 = list(cipher11.keystream(128))
+    cipher11.set_iv(nonce10 + [0x00] * 8)
+    expected11 = list(ChaCha(result10, nonce11[16:24], 20).keystream(128))
+    check_block(result11, expected11, "XCHACHA-256-20")
+    if SUBKEY_CACHE.misses != (subkey_misses + 1):
+        print("ERROR: XChaCha subkey was not cached.")
+    print
+
+
+    # The perf counters must not change the result, and must count
+    # the blocks, bytes, seeks and buffered keystream used.
+    print("PERF-256-20: Perf counters. 256 bit key, 20 rounds.")
+    cipher12 = ChaCha(key10, iv7, 20, perf=True)
+    result12 = list(cipher12.encrypt(bytes(100)) + cipher12.encrypt(bytes(28)))
+    cipher12.seek(64)
+    result12 += list(cipher12.keystream(64))
+    cipher12.seek(100)
+    result12 += list(cipher12.keystream(28))
+    expected12 = list(ChaCha(key10, iv7, 20).keystream(128))
+    expected12 += expected12[64:128] + expected12[100:128]
+    check_block(result12, expected12, "PERF-256-20")
+    stats12 = cipher12.stats()
+    if ((stats12["blocks"], stats12["bytes"], stats12["key_setups"], stats12["seeks"],
+         stats12["keystream_hits"]) != (4, 220, 1, 2, 2)):
+        print("ERROR: Perf counters not correct: %s" % stats12)
+    if PERF_REGISTRY.stats()["blocks"] < stats12["blocks"]:
+        print("ERROR: Perf counters not in the process wide aggregate.")
+    print
+
+
+    # Changing the rounds must select the new block function, and
+    # a copy must not share the state with the original.
+    print("COPY-256-20: Rounds change and copy. 256 bit key, 20 rounds.")
+    cipher13 = ChaCha(key10, iv7, 8)
+    cipher13.rounds = 20
+    result13 = list(cipher13.keystream(64))
+    copy13 = copy.copy(cipher13)
+    result13 += list(copy13.keystream(64)) + list(cipher13.keystream(64))
+    expected13 = list(ChaCha(key10, iv7, 20).keystream(128))
+    expected13 += expected13[64:128]
+    check_block(result13, expected13, "COPY-256-20")
+    print
+
+
+#-------------------------------------------------------------------
+# _crypt_chunk()
+#
+# Worker for the command line tool. Encrypts length bytes
+# starting at offset in the input file and writes the result
+# at the same offset in the output file. The cipher starts
+# at the block counter given by the offset.
+#-------------------------------------------------------------------
+def _crypt_chunk(engine, key, iv, rounds, mode, ctr, in_path, out_path, offset, length):
+    with open(in_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+
+    cipher = get_engine(engine)(key, iv, rounds, mode = mode)
+    cipher.set_counter(ctr + (offset // 64))
+    result = cipher.encrypt(data)
+
+    with open(out_path, "r+b") as f:
+        f.seek(offset)
+        f.write(result)
+    return len(result)
+
+
+#-------------------------------------------------------------------
+# cli()
+#
+# Command line tool for encrypting and decrypting files. The input
+# is split into block aligned chunks that are processed in
+# parallel by a pool of worker processes.
+#-------------------------------------------------------------------
+def cli(args):
+    parser = argparse.ArgumentParser(prog="chacha",
+                                     description="Encrypt or decrypt a file with ChaCha.")
+    parser.add_argument("command", choices=["encrypt", "decrypt"])
+    parser.add_argument("--key", required=True,
+                        help="Key as 32 or 64 hex digits.")
+    parser.add_argument("--iv", required=True,
+                        help="IV as 16 hex digits, or the nonce as 24 (ietf) or 48 (xchacha) hex digits.")
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--mode", choices=MODES, default=MODE_ORIGINAL)
+    parser.add_argument("--ctr", type=int, default=0,
+                        help="Initial block counter.")
+    parser.add_argument("--engine", choices=ENGINES, default="python")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument("infile")
+    parser.add_argument("outfile")
+    opts = parser.parse_args(args)
+
+    key = bytes.fromhex(opts.key)
+    iv = bytes.fromhex(opts.iv)
+    if len(key) not in (16, 32):
+        parser.error("Key length of %d bits, is not supported." % (len(key) * 8))
+    if len(iv) != {MODE_ORIGINAL : 8, MODE_IETF : 12, MODE_XCHACHA : 24}[opts.mode]:
+        parser.error("IV length of %d bits, is not supported." % (len(iv) * 8))
+    if (opts.chunk_size <= 0) or (opts.chunk_size % 64):
+        parser.error("Chunk size must be a positive multiple of 64.")
+
+    # Create the output file with the final size so that the
+    # workers can write their chunks at any offset.
+    size = os.path.getsize(opts.infile)
+    with open(opts.outfile, "wb") as f:
+        f.truncate(size)
+
+    chunks = [(opts.engine, key, iv, opts.rounds, opts.mode, opts.ctr,
+               opts.infile, opts.outfile, offset, min(opts.chunk_size, size - offset))
+              for offset in range(0, size, opts.chunk_size)]
+
+    if (opts.jobs <= 1) or (len(chunks) <= 1):
+        for chunk in chunks:
+            _crypt_chunk(*chunk)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(opts.jobs) as pool:
+            futures = [pool.submit(_crypt_chunk, *chunk) for chunk in chunks]
+            for future in futures:
+                future.result()
+    return 0
+
+
 #-------------------------------------------------------------------
 # __name__
 # Python thingy which allows the file to be run standalone as
 # well as parsed from within a Python interpreter.
 #-------------------------------------------------------------------
-if __name__=="__main__": 
-    # Run the main function.
+if __name__=="__main__":
+    # Run the command line tool if given arguments,
+    # otherwise run the main function.
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
     sys.exit(main())
 
 #=======================================================================
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_aead.py
+# --------------
+# ChaCha-Poly1305 AEAD built on the ChaCha model, as specified in
+# RFC 8439. The Poly1305 key is taken from keystream block zero and
+# the data is encrypted from block one. Encryption and
+# authentication are done in a single pass over the data, chunk by
+# chunk, and can be done incrementally with update() and
+# finalize(). A 24 byte nonce gives XChaCha-Poly1305.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import hmac
+import array
+import struct
+import operator
+
+from chacha import MODE_IETF, MODE_XCHACHA, get_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# The Poly1305 prime 2**130 - 5 and the clamping mask for r.
+POLY1305_P = (1 << 130) - 5
+POLY1305_R_MASK = 0x0ffffffc0ffffffc0ffffffc0fffffff
+
+# Max number of 16 byte blocks added to the accumulator per step.
+POLY1305_STRIDE = 64
+
+# Default number of bytes encrypted and authenticated per step
+# by ChaChaPoly1305Stream.update().
+DEFAULT_AEAD_CHUNK_SIZE = 16 * 1024
+
+# State layout used for the supported nonce lengths.
+NONCE_MODES = {12 : MODE_IETF, 24 : MODE_XCHACHA}
+
+# Max message length with a 12 byte nonce (RFC 8439). The 32 bit
+# block counter covers blocks 1 to 2**32 - 1 after the Poly1305
+# key block.
+IETF_MAX_DATA_LEN = ((1 << 32) - 1) * 64
+
+
+#-------------------------------------------------------------------
+# Poly1305()
+#
+# Incremental Poly1305 MAC. Up to POLY1305_STRIDE full blocks
+# m1..mn are added in one step as
+#   h = h * r**n + m1 * r**n + m2 * r**(n-1) + ... + mn * r
+# using precomputed powers of r. The products are summed with
+# map() over the 64 bit halves of the blocks, which means that
+# there is a single reduction mod p per step.
+#-------------------------------------------------------------------
+class Poly1305():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # Given the 32 byte one time key.
+    #---------------------------------------------------------------
+    def __init__(self, key):
+        key = bytes(key)
+        if len(key) != 32:
+            raise ValueError("Poly1305 key length of %d bits, is not supported." %
+                             (len(key) * 8))
+        self.r = int.from_bytes(key[0:16], "little") & POLY1305_R_MASK
+        self.s = int.from_bytes(key[16:32], "little")
+        self.h = 0
+        self.buf = b''
+
+        # Powers r**1.. and their prefix sums, grown on demand.
+        self.rpow = []
+        self.rsum = [0]
+
+
+    #---------------------------------------------------------------
+    # update()
+    #
+    # Add data of any length to the MAC.
+    #---------------------------------------------------------------
+    def update(self, data):
+        data = memoryview(data).cast('B')
+        if self.buf:
+            need = 16 - len(self.buf)
+            self.buf += bytes(data[0 : need])
+            data = data[need:]
+            if len(self.buf) < 16:
+                return
+            self._blocks(self.buf)
+            self.buf = b''
+
+        n = len(data) & ~15
+        if n:
+            self._blocks(data[0 : n])
+        self.buf = bytes(data[n:])
+
+
+    #---------------------------------------------------------------
+    # finalize()
+    #
+    # Return the 16 byte tag.
+    #---------------------------------------------------------------
+    def finalize(self):
+        h = self.h
+        if self.buf:
+            m = int.from_bytes(self.buf + b'\x01', "little")
+            h = ((h + m) * self.r) % POLY1305_P
+        return ((h + self.s) & ((1 << 128) - 1)).to_bytes(16, "little")
+
+
+    #---------------------------------------------------------------
+    # _powers()
+    #
+    # Make sure that the powers of r up to r**n are available.
+    #---------------------------------------------------------------
+    def _powers(self, n):
+        rpow = self.rpow
+        while len(rpow) < n:
+            p = ((rpow[-1] * self.r) % POLY1305_P) if rpow else self.r
+            rpow.append(p)
+            self.rsum.append(self.rsum[-1] + p)
+
+
+    #---------------------------------------------------------------
+    # _blocks()
+    #
+    # Add the full 16 byte blocks in the given data.
+    #---------------------------------------------------------------
+    def _blocks(self, data):
+        mul = operator.mul
+        h = self.h
+        for start in range(0, len(data), (POLY1305_STRIDE * 16)):
+            words = array.array('Q')
+            words.frombytes(data[start : (start + (POLY1305_STRIDE * 16))])
+            if sys.byteorder != "little":
+                words.byteswap()
+
+            # The blocks in reverse order are multiplied with
+            # r**1..r**n, the 2**128 bit of all blocks is added
+            # using the prefix sum.
+            n = len(words) // 2
+            self._powers(n)
+            rpow = self.rpow
+            lo = sum(map(mul, words[(2 * n - 2) :: -2], rpow))
+            hi = sum(map(mul, words[(2 * n - 1) :: -2], rpow))
+            h = ((h * rpow[n - 1]) + lo + (hi << 64) + (self.rsum[n] << 128)) % POLY1305_P
+        self.h = h
+
+
+#-------------------------------------------------------------------
+# ChaChaPoly1305Stream()
+#
+# Incremental AEAD encryption or decryption of one message. The
+# additional data is given when the stream is created, the
+# message with any number of update() calls. finalize() returns
+# the tag, when decrypting the expected tag must be given and
+# ValueError is raised if it does not match.
+#-------------------------------------------------------------------
+class ChaChaPoly1305Stream():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # Given a 32 byte key and a 12 byte (RFC 8439) or 24 byte
+    # (XChaCha) nonce.
+    #---------------------------------------------------------------
+    def __init__(self, key, nonce, aad = b'', decrypt = False, rounds = 20,
+                 engine = "python", chunk_size = DEFAULT_AEAD_CHUNK_SIZE):
+        if len(key) != 32:
+            raise ValueError("Key length of %d bits, is not supported." % (len(key) * 8))
+        if len(nonce) not in NONCE_MODES:
+            raise ValueError("Nonce length of %d bits, is not supported." % (len(nonce) * 8))
+
+        self.decrypt = decrypt
+        self.chunk_size = chunk_size
+        self.cipher = get_engine(engine)(key, nonce, rounds, mode = NONCE_MODES[len(nonce)])
+
+        # Block zero gives the Poly1305 key, leaving the cipher
+        # at block one.
+        self.mac = Poly1305(self.cipher.keystream(64)[0 : 32])
+        self.mac.update(aad)
+        self.mac.update(bytes(-len(aad) % 16))
+        self.aad_len = len(aad)
+        self.data_len = 0
+        self.max_data_len = IETF_MAX_DATA_LEN if (len(nonce) == 12) else None
+        self.tag = None
+
+
+    #---------------------------------------------------------------
+    # update()
+    #
+    # Encrypt or decrypt the next part of the message and return
+    # the result. Each chunk is authenticated right after it has
+    # been encrypted, or right before it is decrypted. Raises
+    # OverflowError if the message would exceed the max length.
+    #---------------------------------------------------------------
+    def update(self, data):
+        if self.tag is not None:
+            raise ValueError("Stream has been finalized.")
+
+        data = memoryview(data).cast('B')
+        if (self.max_data_len is not None) and ((self.data_len + len(data)) > self.max_data_len):
+            raise OverflowError("Message of more than %d bytes, is not supported." %
+                                self.max_data_len)
+        crypt = self.cipher.encrypt
+        mac_update = self.mac.update
+        result = []
+        for start in range(0, len(data), self.chunk_size):
+            chunk = data[start : (start + self.chunk_size)]
+            if self.decrypt:
+                mac_update(chunk)
+                result.append(crypt(chunk))
+            else:
+                chunk = crypt(chunk)
+                mac_update(chunk)
+                result.append(chunk)
+        self.data_len += len(data)
+        return b''.join(result)
+
+
+    #---------------------------------------------------------------
+    # finalize()
+    #
+    # Finish the MAC and return the tag. When decrypting the
+    # given tag is checked.
+    #---------------------------------------------------------------
+    def finalize(self, tag = None):
+        if self.tag is None:
+            self.mac.update(bytes(-self.data_len % 16))
+            self.mac.update(struct.pack('<QQ', self.aad_len, self.data_len))
+            self.tag = self.mac.finalize()
+
+        if self.decrypt and ((tag is None) or not hmac.compare_digest(self.tag, bytes(tag))):
+            raise ValueError("Authentication tag is not correct.")
+        return self.tag
+
+
+#-------------------------------------------------------------------
+# ChaChaPoly1305()
+#
+# AEAD for a given key. seal() returns the ciphertext with the
+# 16 byte tag appended, open() checks and removes the tag and
+# returns the plaintext. seal_stream() and open_stream() return
+# ChaChaPoly1305Stream objects for incremental processing.
+#-------------------------------------------------------------------
+class ChaChaPoly1305():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, key, rounds = 20, engine = "python"):
+        self.key = bytes(key)
+        self.rounds = rounds
+        self.engine = engine
+
+
+    #---------------------------------------------------------------
+    # seal_stream(), open_stream()
+    #---------------------------------------------------------------
+    def seal_stream(self, nonce, aad = b''):
+        return ChaChaPoly1305Stream(self.key, nonce, aad, False, self.rounds, self.engine)
+
+
+    def open_stream(self, nonce, aad = b''):
+        return ChaChaPoly1305Stream(self.key, nonce, aad, True, self.rounds, self.engine)
+
+
+    #---------------------------------------------------------------
+    # seal()
+    #---------------------------------------------------------------
+    def seal(self, nonce, data, aad = b''):
+        stream = self.seal_stream(nonce, aad)
+        data = stream.update(data)
+        return data + stream.finalize()
+
+
+    #---------------------------------------------------------------
+    # open()
+    #
+    # Raises ValueError if the tag is not correct.
+    #---------------------------------------------------------------
+    def open(self, nonce, data, aad = b''):
+        data = memoryview(data).cast('B')
+        if len(data) < 16:
+            raise ValueError("Data is too short to hold a tag.")
+        stream = self.open_stream(nonce, aad)
+        result = stream.update(data[0 : -16])
+        stream.finalize(data[-16:])
+        return result
+
+
+#-------------------------------------------------------------------
+# check()
+#
+# Compare the result with the expected bytes and print if the
+# result for the given test case was correct or not. Returns
+# the number of errors.
+#-------------------------------------------------------------------
+def check(result, expected, test_case):
+    if result == expected:
+        print("SUCCESS: %s was correct." % test_case)
+        return 0
+
+    print("ERROR: %s was not correct." % test_case)
+    print("Expected: %s" % expected.hex())
+    print("Result:   %s" % result.hex())
+    return 1
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Test Poly1305 and the AEAD with the RFC 8439 test vectors, and
+# check that streaming gives the same result as one call.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha-Poly1305 AEAD.")
+    print("---------------------------------")
+
+    errors = 0
+
+    # RFC 8439 section 2.5.2.
+    mac = Poly1305(bytes.fromhex("85d6be7857556d337f4452fe42d506a8"
+                                 "0103808afb0db2fd4abff6af4149f51b"))
+    mac.update(b"Cryptographic Forum Research Group")
+    errors += check(mac.finalize(), bytes.fromhex("a8061dc1305136c6c22b8baf0c0127a9"),
+                    "POLY1305-RFC8439")
+
+    # The stepped accumulator must be the same as adding one
+    # block at a time.
+    key = bytes(((i * 37) + 5) & 0xff for i in range(32))
+    data = bytes(((i * 11) ^ (i >> 3)) & 0xff for i in range(5000))
+    r = int.from_bytes(key[0:16], "little") & POLY1305_R_MASK
+    h = 0
+    for i in range(0, len(data), 16):
+        h = ((h + int.from_bytes(data[i : (i + 16)] + b'\x01', "little")) * r) % POLY1305_P
+    expected = ((h + int.from_bytes(key[16:32], "little")) & ((1 << 128) - 1)).to_bytes(16, "little")
+    mac = Poly1305(key)
+    for i in range(0, len(data), 1001):
+        mac.update(data[i : (i + 1001)])
+    errors += check(mac.finalize(), expected, "POLY1305-STRIDE")
+
+    # RFC 8439 section 2.8.2.
+    key = bytes(range(0x80, 0xa0))
+    nonce = bytes.fromhex("070000004041424344454647")
+    aad = bytes.fromhex("50515253c0c1c2c3c4c5c6c7")
+    plaintext = (b"Ladies and Gentlemen of the class of '99: If I could offer you "
+                 b"only one tip for the future, sunscreen would be it.")
+    expected_tag = bytes.fromhex("1ae10b594f09e26a7e902ecbd0600691")
+    aead = ChaChaPoly1305(key)
+    sealed = aead.seal(nonce, plaintext, aad)
+    errors += check(sealed[-16:], expected_tag, "AEAD-RFC8439-TAG")
+    errors += check(aead.open(nonce, sealed, aad), plaintext, "AEAD-RFC8439-OPEN")
+
+    # Streaming in pieces of different sizes, with a 24 byte nonce.
+    nonce = bytes(range(24))
+    sealed = aead.seal(nonce, data, aad)
+    stream = aead.seal_stream(nonce, aad)
+    result = b''.join(stream.update(data[i : (i + 333)]) for i in range(0, len(data), 333))
+    errors += check(result + stream.finalize(), sealed, "AEAD-XCHACHA-STREAM")
+
+    stream = aead.open_stream(nonce, aad)
+    result = stream.update(sealed[0 : 100]) + stream.update(sealed[100 : -16])
+    stream.finalize(sealed[-16:])
+    errors += check(result, data, "AEAD-XCHACHA-OPEN-STREAM")
+
+    tampered = bytearray(sealed)
+    tampered[1234] ^= 0x01
+    try:
+        aead.open(nonce, tampered, aad)
+        print("ERROR: AEAD-TAMPER was not detected.")
+        errors += 1
+    except ValueError:
+        print("SUCCESS: AEAD-TAMPER was detected.")
+
+    # The message length with a 12 byte nonce is limited by the
+    # 32 bit block counter.
+    stream = aead.seal_stream(bytes(12))
+    stream.data_len = IETF_MAX_DATA_LEN - 64
+    stream.cipher.set_counter((1 << 32) - 1)
+    stream.update(bytes(64))
+    try:
+        stream.update(bytes(1))
+        print("ERROR: AEAD-MAX-LEN was not detected.")
+        errors += 1
+    except OverflowError:
+        print("SUCCESS: AEAD-MAX-LEN was detected.")
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_aead.py
+#=======================================================================
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_asyncio.py
+# -----------------
+# asyncio adapters that encrypt and decrypt network streams using
+# the ChaCha model. Large reads and writes are processed in batches
+# in an executor so that a single large transfer does not block the
+# event loop for other connections.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import asyncio
+
+from chacha import ChaCha
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Data larger than this number of bytes is processed in batches
+# of this size in the executor instead of on the event loop.
+DEFAULT_OFFLOAD_SIZE = 16 * 1024
+
+
+#-------------------------------------------------------------------
+# ChaChaStreamReader()
+#
+# Wraps an asyncio.StreamReader. Data read is decrypted with
+# the given cipher. Concurrent reads are serialized with a lock
+# so that each read is decrypted with the keystream at its
+# position in the stream.
+#-------------------------------------------------------------------
+class ChaChaStreamReader():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # executor is passed to run_in_executor(), None means the
+    # default executor of the loop.
+    #---------------------------------------------------------------
+    def __init__(self, reader, cipher, offload_size = DEFAULT_OFFLOAD_SIZE,
+                 executor = None):
+        self.reader = reader
+        self.cipher = cipher
+        self.offload_size = offload_size
+        self.executor = executor
+        self.lock = asyncio.Lock()
+
+
+    #---------------------------------------------------------------
+    # read()
+    #
+    # Read up to n bytes and return them decrypted.
+    #---------------------------------------------------------------
+    async def read(self, n = -1):
+        async with self.lock:
+            data = await self.reader.read(n)
+            return await _crypt(self.cipher, data, self.offload_size, self.executor)
+
+
+    #---------------------------------------------------------------
+    # readexactly()
+    #
+    # Read exactly n bytes and return them decrypted.
+    #---------------------------------------------------------------
+    async def readexactly(self, n):
+        async with self.lock:
+            data = await self.reader.readexactly(n)
+            return await _crypt(self.cipher, data, self.offload_size, self.executor)
+
+
+    #---------------------------------------------------------------
+    # at_eof()
+    #---------------------------------------------------------------
+    def at_eof(self):
+        return self.reader.at_eof()
+
+
+#-------------------------------------------------------------------
+# ChaChaStreamWriter()
+#
+# Wraps an asyncio.StreamWriter. Data written is encrypted with
+# the given cipher. Small writes are encrypted directly. Large
+# writes are encrypted in the executor in the background, and
+# any writes made while that is going on are queued after it
+# so that the keystream is used in order. drain() waits for all
+# queued writes.
+#-------------------------------------------------------------------
+class ChaChaStreamWriter():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, writer, cipher, offload_size = DEFAULT_OFFLOAD_SIZE,
+                 executor = None):
+        self.writer = writer
+        self.cipher = cipher
+        self.offload_size = offload_size
+        self.executor = executor
+        self.pending = None
+
+
+    #---------------------------------------------------------------
+    # write()
+    #---------------------------------------------------------------
+    def write(self, data):
+        if (self.pending is None) and (len(data) <= self.offload_size):
+            self.writer.write(self.cipher.encrypt(data))
+        else:
+            self.pending = asyncio.ensure_future(self._write_queued(self.pending, bytes(data)))
+
+
+    #---------------------------------------------------------------
+    # drain()
+    #
+    # Wait for queued writes and for the underlying writer.
+    #---------------------------------------------------------------
+    async def drain(self):
+        await self._wait_pending()
+        await self.writer.drain()
+
+
+    #---------------------------------------------------------------
+    # close()
+    #
+    # Close the underlying writer once the queued writes are done.
+    #---------------------------------------------------------------
+    def close(self):
+        if self.pending is None:
+            self.writer.close()
+        else:
+            self.pending.add_done_callback(lambda task: self.writer.close())
+
+
+    #---------------------------------------------------------------
+    # wait_closed()
+    #---------------------------------------------------------------
+    async def wait_closed(self):
+        await self._wait_pending()
+        await self.writer.wait_closed()
+
+
+    #---------------------------------------------------------------
+    # _wait_pending()
+    #
+    # Wait for the queued writes. Errors from them are raised here,
+    # once. Writes made after that are not queued after the failed
+    # write.
+    #---------------------------------------------------------------
+    async def _wait_pending(self):
+        if self.pending is not None:
+            pending = self.pending
+            try:
+                await pending
+            finally:
+                if self.pending is pending:
+                    self.pending = None
+
+
+    #---------------------------------------------------------------
+    # _write_queued()
+    #
+    # Wait for the previously queued write, then encrypt and
+    # write the given data.
+    #---------------------------------------------------------------
+    async def _write_queued(self, previous, data):
+        if previous is not None:
+            await previous
+        self.writer.write(await _crypt(self.cipher, data, self.offload_size, self.executor))
+
+
+#-------------------------------------------------------------------
+# _crypt()
+#
+# Encrypt/decrypt data with the cipher. Data larger than
+# offload_size is processed in batches in the executor, which
+# gives the event loop a chance to run between the batches.
+#-------------------------------------------------------------------
+async def _crypt(cipher, data, offload_size, executor):
+    if len(data) <= offload_size:
+        return cipher.encrypt(data)
+
+    loop = asyncio.get_running_loop()
+    view = memoryview(data)
+    result = []
+    for start in range(0, len(view), offload_size):
+        result.append(await loop.run_in_executor(executor, cipher.encrypt,
+                                                 view[start : (start + offload_size)]))
+    return b''.join(result)
+
+
+#-------------------------------------------------------------------
+# wrap_streams()
+#
+# Wrap an asyncio reader, writer pair. Each direction must have
+# its own cipher instance.
+#-------------------------------------------------------------------
+def wrap_streams(reader, writer, read_cipher, write_cipher,
+                 offload_size = DEFAULT_OFFLOAD_SIZE, executor = None):
+    return (ChaChaStreamReader(reader, read_cipher, offload_size, executor),
+            ChaChaStreamWriter(writer, write_cipher, offload_size, executor))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed runs a local echo server that decrypts and
+# re-encrypts all data, and checks that a client gets back
+# what it sent for both small and large writes. Also checks
+# that concurrent reads are decrypted in stream order.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha asyncio adapters.")
+    print("------------------------------------")
+    error_ctr = 0
+
+    key = [(i * 0x11) & 0xff for i in range(32)]
+    up_iv = [0x00] * 8
+    down_iv = [0xff] * 8
+    data = bytes((i * 7) & 0xff for i in range(100000))
+
+    async def echo(reader, writer):
+        reader, writer = wrap_streams(reader, writer, ChaCha(key, up_iv),
+                                      ChaCha(key, down_iv), offload_size = 4096)
+        while True:
+            block = await reader.read(65536)
+            if not block:
+                break
+            writer.write(block)
+            await writer.drain()
+        writer.close()
+
+    async def client():
+        server = await asyncio.start_server(echo, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        reader, writer = wrap_streams(reader, writer, ChaCha(key, down_iv),
+                                      ChaCha(key, up_iv), offload_size = 4096)
+        writer.write(data[:10])
+        writer.write(data[10:90000])
+        writer.write(data[90000:])
+        await writer.drain()
+        result = await reader.readexactly(len(data))
+        writer.close()
+        await writer.wait_closed()
+        server.close()
+        await server.wait_closed()
+        return result
+
+    async def concurrent_reads():
+        stream = asyncio.StreamReader()
+        stream.feed_data(ChaCha(key, up_iv).encrypt(data))
+        stream.feed_eof()
+        reader = ChaChaStreamReader(stream, ChaCha(key, up_iv), offload_size = 1024)
+        sizes = [30000, 10, 20000, 49990]
+        parts = await asyncio.gather(*[reader.readexactly(n) for n in sizes])
+        return b''.join(parts)
+
+    if asyncio.run(client()) == data:
+        print("SUCCESS: Echo through encrypted streams was correct.")
+    else:
+        print("ERROR: Echo through encrypted streams was not correct.")
+        error_ctr += 1
+
+    # Writer that fails the first write and records the others.
+    class FlakyWriter():
+        def __init__(self):
+            self.failed = False
+            self.data = []
+
+        def write(self, data):
+            if not self.failed:
+                self.failed = True
+                raise ConnectionResetError("Transient error.")
+            self.data.append(data)
+
+        async def drain(self):
+            pass
+
+    async def failed_write():
+        flaky = FlakyWriter()
+        writer = ChaChaStreamWriter(flaky, ChaCha(key, up_iv), offload_size = 1024)
+        writer.write(data[0 : 5000])
+        try:
+            await writer.drain()
+            return None
+        except ConnectionResetError:
+            pass
+        writer.cipher.seek(5000)
+        writer.write(data[5000 : 10000])
+        await writer.drain()
+        return b''.join(flaky.data)
+
+    if asyncio.run(failed_write()) == ChaCha(key, up_iv).encrypt(data[0 : 10000])[5000:]:
+        print("SUCCESS: Write after a failed write was correct.")
+    else:
+        print("ERROR: Write after a failed write was not correct.")
+        error_ctr += 1
+
+    if asyncio.run(concurrent_reads()) == data:
+        print("SUCCESS: Concurrent reads were decrypted in order.")
+    else:
+        print("ERROR: Concurrent reads were not decrypted in order.")
+        error_ctr += 1
+
+    return error_ctr
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_asyncio.py
+#=======================================================================
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_bench.py
+# ---------------
+# Benchmark for the ChaCha model. Measures key setup latency,
+# per block latency and throughput for all available engines over
+# rounds, key lengths and message sizes. The results are emitted
+# as JSON and can be compared against a stored baseline, like the
+# reference baseline in chacha_bench_baseline.json.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import json
+import time
+import tracemalloc
+import argparse
+import platform
+
+from chacha import ENGINES, get_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+ROUNDS = [8, 12, 20]
+KEYLENS = [128, 256]
+# Default sizes, the same as in the reference baseline.
+SIZES = [64, 1 << 10, 1 << 14, 1 << 18, 1 << 22]
+
+# Minimum total time in seconds for each measurement.
+DEFAULT_MIN_TIME = 0.2
+
+# Sizes whose estimated run time exceeds this many seconds are
+# skipped. The estimate is based on the previous size.
+DEFAULT_MAX_SECONDS = 60.0
+
+# Allowed relative throughput drop compared to the baseline.
+DEFAULT_THRESHOLD = 0.10
+
+# Default number of live instances for the memory measurement.
+DEFAULT_MEMORY_INSTANCES = 100000
+
+
+#-------------------------------------------------------------------
+# measure()
+#
+# Call fn repeatedly until at least min_time seconds have passed.
+# Returns the mean time in seconds per call.
+#-------------------------------------------------------------------
+def measure(fn, min_time = DEFAULT_MIN_TIME):
+    n = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / n
+
+
+#-------------------------------------------------------------------
+# bench_config()
+#
+# Benchmark one engine, round and key length combination for
+# the given message sizes. Returns a list of result dicts.
+#-------------------------------------------------------------------
+def bench_config(engine, cipher_class, rounds, keylen, sizes, min_time, max_seconds):
+    key = bytes(range(keylen // 8))
+    iv = bytes(8)
+
+    setup_s = measure(lambda: cipher_class(key, iv, rounds), min_time)
+
+    cipher = cipher_class(key, iv, rounds)
+    block = bytearray(64)
+    block_s = measure(lambda: cipher.keystream_into(block, 1), min_time)
+
+    results = []
+    bytes_per_s = 64 / block_s
+    for size in sizes:
+        result = {"engine" : engine, "rounds" : rounds, "keylen" : keylen,
+                  "size" : size, "setup_s" : setup_s, "block_s" : block_s}
+
+        if (size / bytes_per_s) > max_seconds:
+            result["skipped"] = True
+            results.append(result)
+            continue
+
+        message = bytes(size)
+        cipher = cipher_class(key, iv, rounds)
+        bytes_per_s = size / measure(lambda: cipher.encrypt(message), min_time)
+        result["bytes_per_s"] = bytes_per_s
+        results.append(result)
+    return results
+
+
+#-------------------------------------------------------------------
+# bench_memory()
+#
+# Measure the memory allocated per live instance when count
+# instances are created, with one shared key or a distinct key
+# per instance. Returns a result dict.
+#-------------------------------------------------------------------
+def bench_memory(engine, cipher_class, count, distinct_keys):
+    ivs = [i.to_bytes(8, "little") for i in range(count)]
+    if distinct_keys:
+        keys = [i.to_bytes(32, "little") for i in range(count)]
+    else:
+        keys = [bytes(32)] * count
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    ciphers = [cipher_class(key, iv, 20) for (key, iv) in zip(keys, ivs)]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    del ciphers
+    return {"engine" : engine, "instances" : count, "distinct_keys" : distinct_keys,
+            "bytes_per_instance" : used / count}
+
+
+#-------------------------------------------------------------------
+# compare()
+#
+# Compare the throughput in results with the baseline results.
+# Returns a list of regression descriptions.
+#-------------------------------------------------------------------
+def compare(results, baseline, threshold):
+    def config(r):
+        return (r["engine"], r["rounds"], r["keylen"], r["size"])
+
+    reference = {config(r) : r["bytes_per_s"] for r in baseline["results"]
+                 if "bytes_per_s" in r}
+
+    regressions = []
+    for r in results["results"]:
+        if ("bytes_per_s" in r) and (config(r) in reference):
+            ratio = r["bytes_per_s"] / reference[config(r)]
+            if ratio < (1.0 - threshold):
+                regressions.append("%s rounds=%d keylen=%d size=%d: %.0f B/s, baseline %.0f B/s (%.1f%%)" %
+                                   (config(r) + (r["bytes_per_s"], reference[config(r)],
+                                                 (ratio - 1.0) * 100)))
+    return regressions
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="chacha_bench",
+                                     description="Benchmark the ChaCha model.")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--rounds", nargs="+", type=int, default=ROUNDS)
+    parser.add_argument("--keylens", nargs="+", type=int, choices=KEYLENS, default=KEYLENS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    parser.add_argument("--output", help="Write the JSON results to this file.")
+    parser.add_argument("--baseline", help="JSON results to compare against.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--memory", type=int, nargs="?", const=DEFAULT_MEMORY_INSTANCES,
+                        help="Also measure the memory per instance with this many live instances.")
+    opts = parser.parse_args(args)
+
+    results = {"python" : platform.python_version(),
+               "machine" : platform.machine(),
+               "results" : []}
+    if opts.memory:
+        results["memory"] = []
+
+    for engine in opts.engines:
+        try:
+            cipher_class = get_engine(engine)
+        except ImportError as e:
+            print("Skipping engine %s: %s" % (engine, e), file=sys.stderr)
+            continue
+
+        for rounds in opts.rounds:
+            for keylen in opts.keylens:
+                for r in bench_config(engine, cipher_class, rounds, keylen, opts.sizes,
+                                      opts.min_time, opts.max_seconds):
+                    results["results"].append(r)
+                    if "bytes_per_s" in r:
+                        print("%-8s rounds=%2d keylen=%d size=%9d: setup %8.2f us, block %8.2f us, %12.0f B/s" %
+                              (engine, rounds, keylen, r["size"], r["setup_s"] * 1e6,
+                               r["block_s"] * 1e6, r["bytes_per_s"]), file=sys.stderr)
+
+        if opts.memory:
+            for distinct_keys in (False, True):
+                r = bench_memory(engine, cipher_class, opts.memory, distinct_keys)
+                results["memory"].append(r)
+                print("%-8s instances=%d distinct_keys=%d: %8.1f bytes/instance" %
+                      (engine, r["instances"], distinct_keys, r["bytes_per_instance"]),
+                      file=sys.stderr)
+
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print("")
+
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, opts.threshold)
+        for regression in regressions:
+            print("REGRESSION: %s" % regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main(sys.argv[1:]))
+
+#=======================================================================
+# EOF chacha_bench.py
+#=======================================================================
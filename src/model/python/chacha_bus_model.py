@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_bus_model.py
+# -------------------
+# Register level model of the chacha.v top level wrapper and a
+# host driver for it that counts bus transactions, status polls and
+# cycles. The wrapper is modelled on top of the cycle level model
+# of chacha_core in chacha_core_model.py, which means that the
+# cycle counts and the data are those of the HW. The driver supports
+# access patterns that skip rewriting unchanged registers and that
+# overlap data_in writes and data_out reads with the core
+# processing.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import argparse
+
+from chacha import ChaCha
+from chacha_core_model import ChaChaCoreModel
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+ADDR_NAME0       = 0x00
+ADDR_NAME1       = 0x01
+ADDR_VERSION     = 0x02
+
+ADDR_CTRL        = 0x08
+CTRL_INIT_BIT    = 0
+CTRL_NEXT_BIT    = 1
+
+ADDR_STATUS      = 0x09
+STATUS_READY_BIT = 0
+STATUS_VALID_BIT = 1
+
+ADDR_KEYLEN      = 0x0a
+ADDR_ROUNDS      = 0x0b
+
+ADDR_KEY0        = 0x10
+ADDR_KEY7        = 0x17
+
+ADDR_IV0         = 0x20
+ADDR_IV1         = 0x21
+
+ADDR_DATA_IN0    = 0x40
+ADDR_DATA_IN15   = 0x4f
+
+ADDR_DATA_OUT0   = 0x80
+ADDR_DATA_OUT15  = 0x8f
+
+CORE_NAME0       = 0x63686163
+CORE_NAME1       = 0x68612020
+CORE_VERSION     = 0x302e3830
+
+
+#-------------------------------------------------------------------
+# ChaChaRegs()
+#
+# Model of chacha.v. Every read(), write() and idle() is one
+# clock cycle. Reads return the value seen on read_data during
+# the cycle, writes take effect at the end of the cycle.
+#-------------------------------------------------------------------
+class ChaChaRegs():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self):
+        self.core = ChaChaCoreModel()
+        self.init_reg = 0
+        self.next_reg = 0
+        self.keylen_reg = 0
+        self.rounds_reg = 0
+        self.key_reg = [0] * 8
+        self.iv_reg = [0] * 2
+        self.data_in_reg = [0] * 16
+
+
+    #---------------------------------------------------------------
+    # cycles
+    #
+    # Number of clock cycles since reset.
+    #---------------------------------------------------------------
+    @property
+    def cycles(self):
+        return self.core.cycles
+
+
+    #---------------------------------------------------------------
+    # read()
+    #---------------------------------------------------------------
+    def read(self, addr):
+        data = self._read_data(addr)
+        self._clock()
+        return data
+
+
+    #---------------------------------------------------------------
+    # write()
+    #---------------------------------------------------------------
+    def write(self, addr, data):
+        self._clock(addr, data & 0xffffffff)
+
+
+    #---------------------------------------------------------------
+    # idle()
+    #
+    # Run n cycles without bus access.
+    #---------------------------------------------------------------
+    def idle(self, n = 1):
+        for i in range(n):
+            self._clock()
+
+
+    #---------------------------------------------------------------
+    # _read_data()
+    #
+    # The read_data mux in the address decoder.
+    #---------------------------------------------------------------
+    def _read_data(self, addr):
+        core = self.core
+        if ADDR_KEY0 <= addr <= ADDR_KEY7:
+            return self.key_reg[addr - ADDR_KEY0]
+
+        if ADDR_DATA_OUT0 <= addr <= ADDR_DATA_OUT15:
+            i = (addr - ADDR_DATA_OUT0) * 4
+            return int.from_bytes(core.data_out[i : (i + 4)], "big")
+
+        return {ADDR_NAME0   : CORE_NAME0,
+                ADDR_NAME1   : CORE_NAME1,
+                ADDR_VERSION : CORE_VERSION,
+                ADDR_CTRL    : (self.next_reg << 1) | self.init_reg,
+                ADDR_STATUS  : (core.data_out_valid << 1) | core.ready,
+                ADDR_KEYLEN  : self.keylen_reg,
+                ADDR_ROUNDS  : self.rounds_reg,
+                ADDR_IV0     : self.iv_reg[0],
+                ADDR_IV1     : self.iv_reg[1]}.get(addr, 0)
+
+
+    #---------------------------------------------------------------
+    # _clock()
+    #
+    # One clock cycle, with a write to addr if given. The core is
+    # clocked with the current register values, then the registers
+    # are updated.
+    #---------------------------------------------------------------
+    def _clock(self, addr = None, data = 0):
+        core = self.core
+        core.key = b''.join(w.to_bytes(4, "big") for w in self.key_reg)
+        core.keylen = self.keylen_reg
+        core.iv = b''.join(w.to_bytes(4, "big") for w in self.iv_reg)
+        core.ctr = 0
+        core.rounds = self.rounds_reg
+        core.data_in = b''.join(w.to_bytes(4, "big") for w in self.data_in_reg)
+        core.clock(init = self.init_reg, next = self.next_reg)
+
+        self.init_reg = 0
+        self.next_reg = 0
+        if addr is None:
+            return
+
+        if addr == ADDR_CTRL:
+            self.init_reg = (data >> CTRL_INIT_BIT) & 1
+            self.next_reg = (data >> CTRL_NEXT_BIT) & 1
+        elif addr == ADDR_KEYLEN:
+            self.keylen_reg = data & 1
+        elif addr == ADDR_ROUNDS:
+            self.rounds_reg = data & 0x1f
+        elif ADDR_KEY0 <= addr <= ADDR_KEY7:
+            self.key_reg[addr - ADDR_KEY0] = data
+        elif ADDR_IV0 <= addr <= ADDR_IV1:
+            self.iv_reg[addr - ADDR_IV0] = data
+        elif ADDR_DATA_IN0 <= addr <= ADDR_DATA_IN15:
+            self.data_in_reg[addr - ADDR_DATA_IN0] = data
+
+
+#-------------------------------------------------------------------
+# ChaChaDriver()
+#
+# Host driver for the chacha.v register API. Counts bus reads,
+# bus writes, status polls and cycles.
+#
+# skip_rewrites: Keep a shadow of the written registers and do
+# not write key, iv, keylen and rounds again if unchanged. Only
+# the four used key words are written for 128 bit keys.
+#
+# pipeline: Write the last data_in words of a block and read the
+# data_out words of the previous block while the core processes
+# the block. Only as many accesses as the core latency allows
+# are moved into the processing window.
+#-------------------------------------------------------------------
+class ChaChaDriver():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, regs = None, skip_rewrites = True, pipeline = True):
+        if regs is None:
+            regs = ChaChaRegs()
+        self.regs = regs
+        self.skip_rewrites = skip_rewrites
+        self.pipeline = pipeline
+        self.shadow = {}
+        self.reads = 0
+        self.writes = 0
+        self.polls = 0
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return a dict with the transaction and cycle counters.
+    #---------------------------------------------------------------
+    def stats(self):
+        return {"reads" : self.reads, "writes" : self.writes,
+                "polls" : self.polls, "cycles" : self.regs.cycles}
+
+
+    #---------------------------------------------------------------
+    # read(), write()
+    #---------------------------------------------------------------
+    def read(self, addr):
+        self.reads += 1
+        return self.regs.read(addr)
+
+
+    def write(self, addr, data):
+        if self.skip_rewrites and (self.shadow.get(addr) == data):
+            return
+        self.writes += 1
+        self.shadow[addr] = data
+        self.regs.write(addr, data)
+
+
+    #---------------------------------------------------------------
+    # wait_valid()
+    #
+    # Poll the status register until data_out_valid is set.
+    #---------------------------------------------------------------
+    def wait_valid(self):
+        while True:
+            self.polls += 1
+            if (self.regs.read(ADDR_STATUS) >> STATUS_VALID_BIT) & 1:
+                return
+
+
+    #---------------------------------------------------------------
+    # set_parameters()
+    #
+    # Write key, keylen, iv and rounds.
+    #---------------------------------------------------------------
+    def set_parameters(self, key, iv, rounds):
+        self.write(ADDR_KEYLEN, int(len(key) == 32))
+        self.write(ADDR_ROUNDS, rounds)
+        nwords = len(key) // 4 if self.skip_rewrites else 8
+        padded = bytes(key) + bytes(32 - len(key))
+        for i in range(nwords):
+            self.write(ADDR_KEY0 + i, int.from_bytes(padded[(i * 4) : (i * 4 + 4)], "big"))
+        for i in range(2):
+            self.write(ADDR_IV0 + i, int.from_bytes(bytes(iv[(i * 4) : (i * 4 + 4)]), "big"))
+
+
+    #---------------------------------------------------------------
+    # encrypt()
+    #
+    # Encrypt/decrypt a message with the core, starting at block
+    # counter zero. Returns the result and a dict with the
+    # transaction and cycle counts for the message.
+    #---------------------------------------------------------------
+    def encrypt(self, key, iv, rounds, message):
+        start = self.stats()
+        message = bytes(message)
+        nblocks = (len(message) + 63) // 64
+        padded = message + bytes((nblocks * 64) - len(message))
+
+        # Data out writes of a block that still have to be read.
+        pending = []
+        result = []
+
+        for n in range(nblocks):
+            if not self.skip_rewrites or (n == 0):
+                self.set_parameters(key, iv, rounds)
+
+            block = padded[(n * 64) : (n * 64 + 64)]
+            words_in = min(16, (len(message) - (n * 64) + 3) // 4)
+            writes = [(ADDR_DATA_IN0 + i, int.from_bytes(block[(i * 4) : (i * 4 + 4)], "big"))
+                      for i in range(words_in)]
+
+            # Split the accesses into those before and after the
+            # start of the block. data_in writes are seen by the core
+            # up to rounds + 2 cycles after the start, data_out of
+            # the previous block can be read up to rounds + 3 cycles
+            # after the start.
+            w_after = 0
+            r_after = 0
+            if self.pipeline:
+                w_after = min(len(writes), rounds + 2)
+                r_after = min(len(pending), rounds + 3 - w_after)
+
+            for (addr, data) in writes[0 : (len(writes) - w_after)]:
+                self.write(addr, data)
+            for addr in pending[0 : (len(pending) - r_after)]:
+                result.append(self.read(addr))
+
+            # Start the block. The shadow is bypassed for the
+            # control register.
+            self.writes += 1
+            if n == 0:
+                self.regs.write(ADDR_CTRL, 1 << CTRL_INIT_BIT)
+            else:
+                self.regs.write(ADDR_CTRL, 1 << CTRL_NEXT_BIT)
+
+            for (addr, data) in writes[(len(writes) - w_after):]:
+                self.write(addr, data)
+            for addr in pending[(len(pending) - r_after):]:
+                result.append(self.read(addr))
+
+            # Status is stale in the cycle right after the start.
+            if (w_after + r_after) == 0:
+                self.regs.idle()
+            self.wait_valid()
+
+            pending = [ADDR_DATA_OUT0 + i for i in range(words_in)]
+
+        for addr in pending:
+            result.append(self.read(addr))
+
+        data = b''.join(w.to_bytes(4, "big") for w in result)[0 : len(message)]
+        end = self.stats()
+        return (data, {k : (end[k] - start[k]) for k in end})
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Encrypt a set of messages with different driver access patterns,
+# check the results against the ChaCha model and print the
+# transaction and cycle counts.
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="chacha_bus_model",
+                                     description="Model host access to the chacha.v register API.")
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--keylen", type=int, choices=[128, 256], default=256)
+    parser.add_argument("--messages", type=int, default=4)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--fmax", type=float, help="Clock frequency in MHz.")
+    opts = parser.parse_args(args)
+
+    key = bytes(((i * 0x11) & 0xff) for i in range(opts.keylen // 8))
+    messages = [bytes(((i + j) & 0xff) for j in range(opts.size)) for i in range(opts.messages)]
+    ivs = [bytes([i] * 8) for i in range(opts.messages)]
+
+    errors = 0
+    for (skip_rewrites, pipeline) in [(False, False), (True, False), (True, True)]:
+        driver = ChaChaDriver(skip_rewrites = skip_rewrites, pipeline = pipeline)
+        total = None
+        for (iv, message) in zip(ivs, messages):
+            (result, stats) = driver.encrypt(key, iv, opts.rounds, message)
+            if result != ChaCha(key, iv, opts.rounds).encrypt(message):
+                errors += 1
+            if total is None:
+                total = stats
+            else:
+                total = {k : (total[k] + stats[k]) for k in stats}
+
+        nbytes = opts.messages * opts.size
+        line = ("skip_rewrites=%d pipeline=%d: %6d writes, %6d reads, %6d polls, %7d cycles, %.3f bytes/cycle" %
+                (skip_rewrites, pipeline, total["writes"], total["reads"], total["polls"],
+                 total["cycles"], nbytes / total["cycles"]))
+        if opts.fmax:
+            line += ", %.1f MB/s" % (nbytes / total["cycles"] * opts.fmax)
+        print(line)
+
+    if errors:
+        print("ERROR: %d messages were not correct." % errors)
+    else:
+        print("SUCCESS: All messages were correct.")
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main(sys.argv[1:]))
+
+#=======================================================================
+# EOF chacha_bus_model.py
+#=======================================================================
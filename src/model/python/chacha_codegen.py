@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_codegen.py
+# -----------------
+# Generator of round count specialized ChaCha block functions.
+# For a given number of rounds the generator emits straight line
+# Python source where the state is held in local variables, all
+# quarterrounds are inlined and the final addition is folded into
+# the return statement. The source is compiled once per number of
+# rounds and the code objects can also be cached on disk.
+#
+# Run standalone to print the generated source, or to check the
+# generated functions against the reference model.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import marshal
+import argparse
+import threading
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Increase when the generated code changes, invalidates the
+# code objects cached on disk.
+CODEGEN_VERSION = 1
+
+# Directory for cached code objects. If not set the code is only
+# cached in memory.
+CACHE_DIR_ENV = "CHACHA_CODEGEN_CACHE"
+
+# The quarterround indices of the column and diagonal rounds.
+QR_INDICES = [(0, 4,  8, 12), (1, 5,  9, 13), (2, 6, 10, 14), (3, 7, 11, 15),
+              (0, 5, 10, 15), (1, 6, 11, 12), (2, 7,  8, 13), (3, 4,  9, 14)]
+
+# Step, rotation pairs of the quarterround: a += b; d ^= a; d <<<= 16 etc.
+QR_STEPS = [(0, 1, 3, 16), (2, 3, 1, 12), (0, 1, 3, 8), (2, 3, 1, 7)]
+
+
+# Compiled block functions, keyed by number of rounds.
+_functions = {}
+_lock = threading.Lock()
+
+
+#-------------------------------------------------------------------
+# generate_source()
+#
+# Return the Python source of the function block_<rounds>(s),
+# which given the 16 state words s returns the keystream block
+# as a list of 16 words. As in the ChaCha class rounds // 2
+# double rounds are performed. Each quarterround step
+# (a += b; d ^= a; d <<<= n) is a single statement using
+# assignment expressions, which is about 15% faster than one
+# statement per operation.
+#-------------------------------------------------------------------
+def generate_source(rounds):
+    names = ", ".join("x%d" % i for i in range(16))
+    state = ", ".join("s%d" % i for i in range(16))
+    lines = ["def block_%d(s):" % rounds,
+             "    (%s) = s" % state,
+             "    (%s) = (%s)" % (names, state)]
+
+    for dr in range(rounds // 2):
+        lines.append("")
+        lines.append("    # Double round %d." % dr)
+        for qr in QR_INDICES:
+            for (add, src, dst, rot) in QR_STEPS:
+                (a, b, d) = (qr[add], qr[src], qr[dst])
+                lines.append("    x%d = (((t := x%d ^ (x%d := (x%d + x%d) & 0xffffffff)) << %d) | (t >> %d)) & 0xffffffff" %
+                             (d, d, a, a, b, rot, (32 - rot)))
+
+    lines.append("")
+    lines.append("    return [%s]" % ",\n            ".join(
+        "(x%d + s%d) & 0xffffffff" % (i, i) for i in range(16)))
+    return "\n".join(lines) + "\n"
+
+
+#-------------------------------------------------------------------
+# block_function()
+#
+# Return the compiled block function for the given number of
+# rounds. If a cache directory is given, or set in the
+# environment variable CHACHA_CODEGEN_CACHE, the code object is
+# loaded from there if present and stored there otherwise. Only
+# point the cache to a directory that is not writable by others,
+# the cached code is executed.
+#-------------------------------------------------------------------
+def block_function(rounds, cache_dir = None):
+    fn = _functions.get(rounds)
+    if fn is not None:
+        return fn
+
+    with _lock:
+        fn = _functions.get(rounds)
+        if fn is None:
+            code = _load_code(rounds, cache_dir or os.environ.get(CACHE_DIR_ENV))
+            namespace = {}
+            exec(code, namespace)
+            fn = namespace["block_%d" % rounds]
+            _functions[rounds] = fn
+    return fn
+
+
+#-------------------------------------------------------------------
+# _load_code()
+#
+# Return the code object for the given number of rounds, from the
+# cache directory if possible, otherwise generated and compiled.
+#-------------------------------------------------------------------
+def _load_code(rounds, cache_dir):
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, "chacha_block_%d.%s.v%d.bin" %
+                            (rounds, sys.implementation.cache_tag, CODEGEN_VERSION))
+        try:
+            with open(path, "rb") as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    code = compile(generate_source(rounds), "<chacha_block_%d>" % rounds, "exec")
+
+    if path:
+        try:
+            os.makedirs(cache_dir, exist_ok = True)
+            tmp_path = "%s.%d.tmp" % (path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                marshal.dump(code, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    return code
+
+
+#-------------------------------------------------------------------
+# check()
+#
+# Compare the generated block functions with the reference block
+# function in the ChaCha class. Returns the number of errors.
+#-------------------------------------------------------------------
+def check(rounds_list):
+    from chacha import ChaCha
+
+    errors = 0
+    for rounds in rounds_list:
+        cipher = ChaCha(bytes(range(32)), bytes(range(8)), rounds)
+        fn = block_function(rounds)
+        rounds_errors = 0
+        for counter in (0, 1, 0xffffffff, 0x123456789abcdef):
+            cipher.set_counter(counter)
+            if fn(cipher.state) != cipher._plain_block():
+                rounds_errors += 1
+
+        if rounds_errors:
+            print("ERROR: Generated block function for %d rounds was not correct." % rounds)
+        else:
+            print("SUCCESS: Generated block function for %d rounds was correct." % rounds)
+        errors += rounds_errors
+    return errors
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="chacha_codegen",
+                                     description="Generate round count specialized ChaCha block functions.")
+    parser.add_argument("--rounds", nargs="+", type=int, default=[8, 12, 20])
+    parser.add_argument("--check", action="store_true",
+                        help="Check the generated functions against the model.")
+    parser.add_argument("--output", help="Write the generated source to this file.")
+    opts = parser.parse_args(args)
+
+    if opts.check:
+        return check(opts.rounds)
+
+    source = "\n\n".join(generate_source(rounds) for rounds in opts.rounds)
+    if opts.output:
+        with open(opts.output, "w") as f:
+            f.write(source)
+    else:
+        print(source)
+    return 0
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main(sys.argv[1:]))
+
+#=======================================================================
+# EOF chacha_codegen.py
+#=======================================================================
@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_core_model.py
+# --------------------
+# Cycle level model of chacha_core.v. The model has the same
+# registers and control FSM (CTRL_IDLE, CTRL_INIT, CTRL_ROUNDS,
+# CTRL_FINALIZE, CTRL_DONE) as the HW and is clocked one cycle at
+# a time. The round datapath uses the quarterround function from
+# chacha.py. Used to predict latency and throughput of the core
+# without running a Verilog simulation.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import struct
+import argparse
+
+from chacha import ChaCha, TAU, SIGMA, QR_INDICES, quarterround
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Datapath quarterround states.
+QR0 = 0
+QR1 = 1
+
+CTRL_IDLE     = 0
+CTRL_INIT     = 1
+CTRL_ROUNDS   = 2
+CTRL_FINALIZE = 3
+CTRL_DONE     = 4
+
+CTRL_WAIT     = 5
+
+CTRL_NAMES = ["CTRL_IDLE", "CTRL_INIT", "CTRL_ROUNDS", "CTRL_FINALIZE", "CTRL_DONE",
+              "CTRL_WAIT"]
+
+# Round engine states of the pipelined core.
+ROUND_IDLE   = 0
+ROUND_INIT   = 1
+ROUND_ROUNDS = 2
+ROUND_STORE  = 3
+
+ROUND_NAMES = ["ROUND_IDLE", "ROUND_INIT", "ROUND_ROUNDS", "ROUND_STORE"]
+
+DEFAULT_ROUNDS = [8, 12, 20]
+DEFAULT_KEYLENS = [128, 256]
+
+# Idle cycles between blocks in check_model().
+CHECK_GAP = 64
+
+
+#-------------------------------------------------------------------
+# ChaChaCoreModel()
+#-------------------------------------------------------------------
+class ChaChaCoreModel():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # The quarterrounds per cycle is four as in chacha_core.v,
+    # which means that one round is done per cycle. Other values
+    # model variants of the core with fewer or more quarterround
+    # instances.
+    #---------------------------------------------------------------
+    def __init__(self, qr_per_cycle = 4):
+        self.qr_per_cycle = qr_per_cycle
+
+        # Input ports.
+        self.key = bytes(32)
+        self.keylen = 0
+        self.iv = bytes(8)
+        self.ctr = 0
+        self.rounds = 8
+        self.data_in = bytes(64)
+
+        self.reset()
+
+
+    #---------------------------------------------------------------
+    # reset()
+    #
+    # Set all registers to their reset values.
+    #---------------------------------------------------------------
+    def reset(self):
+        self.state_reg = [0] * 16
+        self.data_out_reg = bytes(64)
+        self.data_out_valid_reg = 0
+        self.qr_ctr_reg = 0
+        self.dr_ctr_reg = 0
+        self.block0_ctr_reg = 0
+        self.block1_ctr_reg = 0
+        self.chacha_ctrl_reg = CTRL_IDLE
+        self.ready_reg = 1
+        self.cycles = 0
+
+
+    #---------------------------------------------------------------
+    # set_inputs()
+    #
+    # Set the key, keylen, iv, ctr, rounds and data_in ports. The
+    # key is given as 16 or 32 bytes, keylen is derived from it.
+    #---------------------------------------------------------------
+    def set_inputs(self, key, iv, rounds = 8, ctr = 0, data_in = bytes(64)):
+        self.keylen = int(len(key) == 32)
+        self.key = bytes(key) + bytes(32 - len(key))
+        self.iv = bytes(iv)
+        self.ctr = ctr
+        self.rounds = rounds & 0x1f
+        self.data_in = bytes(data_in)
+
+
+    #---------------------------------------------------------------
+    # ready, data_out_valid, data_out
+    #
+    # The output ports.
+    #---------------------------------------------------------------
+    @property
+    def ready(self):
+        return self.ready_reg
+
+
+    @property
+    def data_out_valid(self):
+        return self.data_out_valid_reg
+
+
+    @property
+    def data_out(self):
+        return self.data_out_reg
+
+
+    #---------------------------------------------------------------
+    # init_state_word()
+    #
+    # The initial state for the current block, as given by the
+    # init_state_logic in the HW.
+    #---------------------------------------------------------------
+    def init_state_word(self):
+        keywords = list(struct.unpack('<8I', self.key))
+        if self.keylen:
+            words = SIGMA + keywords
+        else:
+            words = TAU + keywords[0:4] + keywords[0:4]
+        words += [self.block0_ctr_reg, self.block1_ctr_reg]
+        words += list(struct.unpack('<2I', self.iv))
+        return words
+
+
+    #---------------------------------------------------------------
+    # clock()
+    #
+    # Perform one clock cycle with the given init and next inputs.
+    # The combinational logic is evaluated from the current
+    # registers and inputs, then all registers are updated.
+    #---------------------------------------------------------------
+    def clock(self, init = 0, next = 0):
+        init_state = 0
+        update_state = 0
+        update_output = 0
+        qr_ctr_inc = 0
+        qr_ctr_rst = 0
+        dr_ctr_inc = 0
+        dr_ctr_rst = 0
+        block_ctr_inc = 0
+        block_ctr_set = 0
+        ready_new = None
+        data_out_valid_new = None
+        chacha_ctrl_new = None
+
+        # chacha_ctrl_fsm
+        ctrl = self.chacha_ctrl_reg
+        if ctrl == CTRL_IDLE:
+            if init:
+                block_ctr_set = 1
+                ready_new = 0
+                chacha_ctrl_new = CTRL_INIT
+
+        elif ctrl == CTRL_INIT:
+            init_state = 1
+            qr_ctr_rst = 1
+            dr_ctr_rst = 1
+            chacha_ctrl_new = CTRL_ROUNDS
+
+        elif ctrl == CTRL_ROUNDS:
+            update_state = 1
+            qr_ctr_inc = 1
+            if self.qr_ctr_reg == self._last_qr():
+                dr_ctr_inc = 1
+                if self.dr_ctr_reg == (((self.rounds >> 1) - 1) & 0xf):
+                    chacha_ctrl_new = CTRL_FINALIZE
+
+        elif ctrl == CTRL_FINALIZE:
+            ready_new = 1
+            update_output = 1
+            data_out_valid_new = 1
+            chacha_ctrl_new = CTRL_DONE
+
+        elif ctrl == CTRL_DONE:
+            if init or next:
+                ready_new = 0
+                data_out_valid_new = 0
+                chacha_ctrl_new = CTRL_INIT
+                if init:
+                    block_ctr_set = 1
+                else:
+                    block_ctr_inc = 1
+
+        # state_logic and data_out_logic
+        state_new = None
+        if init_state:
+            state_new = self.init_state_word()
+
+        if update_state:
+            state_new = self._update_state()
+
+        data_out_new = None
+        if update_output:
+            data_out_new = self._xor_data_in(self._block_state())
+
+        # block_ctr
+        block0_ctr_new = None
+        block1_ctr_new = None
+        if block_ctr_set:
+            block0_ctr_new = self.ctr & 0xffffffff
+            block1_ctr_new = (self.ctr >> 32) & 0xffffffff
+        if block_ctr_inc:
+            block0_ctr_new = (self.block0_ctr_reg + 1) & 0xffffffff
+            if self.block0_ctr_reg == 0xffffffff:
+                block1_ctr_new = (self.block1_ctr_reg + 1) & 0xffffffff
+
+        # reg_update
+        if state_new is not None:
+            self.state_reg = state_new
+        if data_out_new is not None:
+            self.data_out_reg = data_out_new
+        if data_out_valid_new is not None:
+            self.data_out_valid_reg = data_out_valid_new
+        if qr_ctr_rst:
+            self.qr_ctr_reg = 0
+        if qr_ctr_inc:
+            self.qr_ctr_reg = (self.qr_ctr_reg + 1) % (self._last_qr() + 1)
+        if dr_ctr_rst:
+            self.dr_ctr_reg = 0
+        if dr_ctr_inc:
+            self.dr_ctr_reg = (self.dr_ctr_reg + 1) & 0xf
+        if block0_ctr_new is not None:
+            self.block0_ctr_reg = block0_ctr_new
+        if block1_ctr_new is not None:
+            self.block1_ctr_reg = block1_ctr_new
+        if ready_new is not None:
+            self.ready_reg = ready_new
+        if chacha_ctrl_new is not None:
+            self.chacha_ctrl_reg = chacha_ctrl_new
+
+        self.cycles += 1
+
+
+    #---------------------------------------------------------------
+    # _last_qr()
+    #
+    # The last value of qr_ctr_reg in a double round.
+    #---------------------------------------------------------------
+    def _last_qr(self):
+        return (8 // self.qr_per_cycle) - 1
+
+
+    #---------------------------------------------------------------
+    # _block_state()
+    #
+    # The keystream block given by the initial state and the
+    # current state, as computed by data_out_logic in the HW.
+    #---------------------------------------------------------------
+    def _block_state(self):
+        block = [((i + s) & 0xffffffff) for (i, s) in
+                 zip(self.init_state_word(), self.state_reg)]
+        return struct.pack('<16I', *block)
+
+
+    #---------------------------------------------------------------
+    # _xor_data_in()
+    #
+    # XOR data_in with the given keystream block.
+    #---------------------------------------------------------------
+    def _xor_data_in(self, keystream):
+        return bytes([(d ^ k) for (d, k) in zip(self.data_in, keystream)])
+
+
+    #---------------------------------------------------------------
+    # _update_state()
+    #
+    # Perform the quarterrounds selected by qr_ctr_reg on the state.
+    #---------------------------------------------------------------
+    def _update_state(self):
+        x = self.state_reg[:]
+        first = self.qr_ctr_reg * self.qr_per_cycle
+        for (ai, bi, ci, di) in QR_INDICES[first : (first + self.qr_per_cycle)]:
+            (x[ai], x[bi], x[ci], x[di]) = quarterround(x[ai], x[bi], x[ci], x[di])
+        return x
+
+
+    #---------------------------------------------------------------
+    # run_block()
+    #
+    # Start processing with init (or next if init is false) and
+    # clock until data_out_valid is set. Returns the number of
+    # cycles from the cycle where init/next is sampled until
+    # data_out_valid is set.
+    #---------------------------------------------------------------
+    def run_block(self, init = 1):
+        start = self.cycles
+        self.clock(init = init, next = int(not init))
+        while not self.data_out_valid:
+            self.clock()
+        return self.cycles - start
+
+
+#-------------------------------------------------------------------
+# ChaChaPipelinedCoreModel()
+#
+# Model of the pipelined chacha_core variant generated by
+# tools/lsbgen.py. The rounds are done by a round engine that
+# runs ahead of the output FSM. When the rounds of a block are
+# done the engine either hands the keystream directly to the
+# output (if data_out is waiting for it) or stores it in a
+# keystream register, and then directly starts the rounds of
+# the next block. The rounds of the next block are thereby
+# overlapped with the hand-off of the current block.
+#-------------------------------------------------------------------
+class ChaChaPipelinedCoreModel(ChaChaCoreModel):
+
+    #---------------------------------------------------------------
+    # reset()
+    #---------------------------------------------------------------
+    def reset(self):
+        ChaChaCoreModel.reset(self)
+        self.ks_reg = bytes(64)
+        self.ks_valid_reg = 0
+        self.round_ctrl_reg = ROUND_IDLE
+
+
+    #---------------------------------------------------------------
+    # clock()
+    #
+    # Perform one clock cycle with the given init and next inputs.
+    # The output FSM (chacha_ctrl_fsm) and the round engine
+    # (round_ctrl_fsm) are evaluated from the current registers,
+    # then all registers are updated.
+    #---------------------------------------------------------------
+    def clock(self, init = 0, next = 0):
+        restart = 0
+        ks_consume = 0
+        ks_bypass = 0
+        ready_new = None
+        data_out_valid_new = None
+        chacha_ctrl_new = None
+
+        # chacha_ctrl_fsm
+        ctrl = self.chacha_ctrl_reg
+        if ctrl == CTRL_IDLE:
+            if init:
+                restart = 1
+                ready_new = 0
+                chacha_ctrl_new = CTRL_WAIT
+
+        elif ctrl == CTRL_WAIT:
+            if self.ks_valid_reg:
+                ks_consume = 1
+            elif self.round_ctrl_reg == ROUND_STORE:
+                ks_bypass = 1
+            if ks_consume or ks_bypass:
+                ready_new = 1
+                data_out_valid_new = 1
+                chacha_ctrl_new = CTRL_DONE
+
+        elif ctrl == CTRL_DONE:
+            if init or next:
+                restart = init
+                ready_new = 0
+                data_out_valid_new = 0
+                chacha_ctrl_new = CTRL_WAIT
+
+        # round_ctrl_fsm
+        init_state = 0
+        next_state = 0
+        update_state = 0
+        qr_ctr_inc = 0
+        qr_ctr_rst = 0
+        dr_ctr_inc = 0
+        dr_ctr_rst = 0
+        block_ctr_inc = 0
+        ks_we = 0
+        ks_valid_new = None
+        round_ctrl_new = None
+
+        if restart:
+            ks_valid_new = 0
+            round_ctrl_new = ROUND_INIT
+        else:
+            if ks_consume:
+                ks_valid_new = 0
+
+            rctrl = self.round_ctrl_reg
+            if rctrl == ROUND_INIT:
+                init_state = 1
+                qr_ctr_rst = 1
+                dr_ctr_rst = 1
+                round_ctrl_new = ROUND_ROUNDS
+
+            elif rctrl == ROUND_ROUNDS:
+                update_state = 1
+                qr_ctr_inc = 1
+                if self.qr_ctr_reg == self._last_qr():
+                    dr_ctr_inc = 1
+                    if self.dr_ctr_reg == (((self.rounds >> 1) - 1) & 0xf):
+                        round_ctrl_new = ROUND_STORE
+
+            elif rctrl == ROUND_STORE:
+                if (not self.ks_valid_reg) or ks_consume:
+                    next_state = 1
+                    qr_ctr_rst = 1
+                    dr_ctr_rst = 1
+                    block_ctr_inc = 1
+                    round_ctrl_new = ROUND_ROUNDS
+                    if not ks_bypass:
+                        ks_we = 1
+                        ks_valid_new = 1
+
+        # state_logic
+        state_new = None
+        if init_state:
+            state_new = self.init_state_word()
+
+        if next_state:
+            state_new = self.init_state_word()
+            (state_new[12], state_new[13]) = self._next_block_ctr()
+
+        if update_state:
+            state_new = self._update_state()
+
+        # data_out_logic
+        data_out_new = None
+        if ks_consume:
+            data_out_new = self._xor_data_in(self.ks_reg)
+        if ks_bypass:
+            data_out_new = self._xor_data_in(self._block_state())
+
+        ks_new = None
+        if ks_we:
+            ks_new = self._block_state()
+
+        # block_ctr
+        block0_ctr_new = None
+        block1_ctr_new = None
+        if restart:
+            block0_ctr_new = self.ctr & 0xffffffff
+            block1_ctr_new = (self.ctr >> 32) & 0xffffffff
+        if block_ctr_inc:
+            (block0_ctr_new, block1_ctr_new) = self._next_block_ctr()
+
+        # reg_update
+        if state_new is not None:
+            self.state_reg = state_new
+        if data_out_new is not None:
+            self.data_out_reg = data_out_new
+        if data_out_valid_new is not None:
+            self.data_out_valid_reg = data_out_valid_new
+        if ks_new is not None:
+            self.ks_reg = ks_new
+        if ks_valid_new is not None:
+            self.ks_valid_reg = ks_valid_new
+        if qr_ctr_rst:
+            self.qr_ctr_reg = 0
+        if qr_ctr_inc:
+            self.qr_ctr_reg = (self.qr_ctr_reg + 1) % (self._last_qr() + 1)
+        if dr_ctr_rst:
+            self.dr_ctr_reg = 0
+        if dr_ctr_inc:
+            self.dr_ctr_reg = (self.dr_ctr_reg + 1) & 0xf
+        if block0_ctr_new is not None:
+            self.block0_ctr_reg = block0_ctr_new
+        if block1_ctr_new is not None:
+            self.block1_ctr_reg = block1_ctr_new
+        if ready_new is not None:
+            self.ready_reg = ready_new
+        if chacha_ctrl_new is not None:
+            self.chacha_ctrl_reg = chacha_ctrl_new
+        if round_ctrl_new is not None:
+            self.round_ctrl_reg = round_ctrl_new
+
+        self.cycles += 1
+
+
+    #---------------------------------------------------------------
+    # _next_block_ctr()
+    #
+    # The block counter words of the next block.
+    #---------------------------------------------------------------
+    def _next_block_ctr(self):
+        block0 = (self.block0_ctr_reg + 1) & 0xffffffff
+        block1 = self.block1_ctr_reg
+        if self.block0_ctr_reg == 0xffffffff:
+            block1 = (block1 + 1) & 0xffffffff
+        return (block0, block1)
+
+
+#-------------------------------------------------------------------
+# make_core()
+#
+# Create the cycle model for the given core variant.
+#-------------------------------------------------------------------
+def make_core(qr_per_cycle = 4, pipeline = False):
+    if pipeline:
+        return ChaChaPipelinedCoreModel(qr_per_cycle)
+    return ChaChaCoreModel(qr_per_cycle)
+
+
+#-------------------------------------------------------------------
+# predict()
+#
+# Run a number of consecutive blocks in the cycle model with next
+# asserted as soon as data_out_valid is set, and return a dict
+# with the latency of the first block, the cycles per block and
+# the bytes per cycle in the steady state.
+#-------------------------------------------------------------------
+def predict(rounds, keylen = 256, blocks = 4, qr_per_cycle = 4, pipeline = False):
+    core = make_core(qr_per_cycle, pipeline)
+    core.set_inputs(bytes(keylen // 8), bytes(8), rounds)
+    latency = core.run_block(init = 1)
+
+    start = core.cycles
+    for i in range(blocks):
+        core.run_block(init = 0)
+    cycles_per_block = (core.cycles - start) / blocks
+
+    return {"rounds" : rounds, "keylen" : keylen, "qr_per_cycle" : qr_per_cycle,
+            "pipeline" : pipeline, "latency" : latency, "cycles_per_block" : cycles_per_block,
+            "bytes_per_cycle" : 64 / cycles_per_block}
+
+
+#-------------------------------------------------------------------
+# check_model()
+#
+# Check that consecutive blocks from the cycle model are the
+# same as from the ChaCha model. Returns True if they are. The
+# blocks are read both with next asserted directly and with
+# CHECK_GAP idle cycles between blocks, so that the pipelined
+# core also delivers blocks from its keystream register.
+#-------------------------------------------------------------------
+def check_model(rounds, keylen, qr_per_cycle = 4, blocks = 3, pipeline = False):
+    key = bytes(((i * 0x11) & 0xff) for i in range(keylen // 8))
+    iv = bytes([0x0f, 0x1e, 0x2d, 0x3c, 0x4b, 0x59, 0x68, 0x77])
+    ctr = 0xfffffffe
+
+    cipher = ChaCha(key, iv, rounds)
+    cipher.set_counter(ctr)
+    expected = cipher.keystream(64 * blocks)
+
+    for gap in (0, CHECK_GAP):
+        core = make_core(qr_per_cycle, pipeline)
+        core.set_inputs(key, iv, rounds, ctr)
+        result = b''
+        for i in range(blocks):
+            for j in range(gap * int(i > 0)):
+                core.clock()
+            core.run_block(init = int(i == 0))
+            result += core.data_out
+        if result != expected:
+            return False
+    return True
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Print predicted latency and throughput for the given round
+# counts and key lengths, optionally as bytes per second at the
+# given clock frequency.
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="chacha_core_model",
+                                     description="Predict chacha_core latency and throughput.")
+    parser.add_argument("--rounds", nargs="+", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--keylens", nargs="+", type=int, choices=DEFAULT_KEYLENS,
+                        default=DEFAULT_KEYLENS)
+    parser.add_argument("--qr-per-cycle", type=int, choices=[1, 2, 4, 8], default=4)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Model the pipelined core variant.")
+    parser.add_argument("--fmax", type=float, help="Clock frequency in MHz.")
+    parser.add_argument("--check", action="store_true",
+                        help="Check the output against the ChaCha model.")
+    opts = parser.parse_args(args)
+
+    errors = 0
+    for rounds in opts.rounds:
+        for keylen in opts.keylens:
+            p = predict(rounds, keylen, qr_per_cycle = opts.qr_per_cycle,
+                        pipeline = opts.pipeline)
+            line = ("rounds=%2d keylen=%d: latency %2d cycles, %5.1f cycles/block, %.3f bytes/cycle" %
+                    (rounds, keylen, p["latency"], p["cycles_per_block"], p["bytes_per_cycle"]))
+            if opts.fmax:
+                line += ", %.1f MB/s" % (p["bytes_per_cycle"] * opts.fmax)
+            if opts.check:
+                if check_model(rounds, keylen, opts.qr_per_cycle, pipeline = opts.pipeline):
+                    line += ", output correct"
+                else:
+                    line += ", output NOT correct"
+                    errors += 1
+            print(line)
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main(sys.argv[1:]))
+
+#=======================================================================
+# EOF chacha_core_model.py
+#=======================================================================
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_fuzz.py
+# --------------
+# Differential fuzzing of the chacha_core RTL against the Python
+# model. Random cases (key, keylen, iv, ctr, rounds, data_in) are
+# generated and computed with the model, written as test vector
+# files in batches and run through the tb_chacha_core_vectors
+# simulation built in toolruns, with several simulator processes
+# in parallel. Mismatches are shrunk to a minimal reproducer that
+# is written as a single vector file.
+#
+# Only chacha_core is fuzzed, the bus interface in chacha.v and
+# tb_chacha are not. Rounds must be even since the core runs
+# rounds / 2 double rounds.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import re
+import sys
+import argparse
+import subprocess
+import concurrent.futures
+
+from chacha_vectors import random_params, compute_records, decode_record, DEFAULT_ROUNDS
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+TOOLRUNS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "..", "..", "toolruns")
+SIM_TARGET = "core-vectors.sim"
+
+DEFAULT_CASES = 100000
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_WORKDIR = "fuzz"
+
+ERROR_RE = re.compile(r"\*\*\* ERROR: Vector (\d+) not successful\.")
+GOT_RE = re.compile(r"Got:\s+0x([0-9a-fA-FxXzZ]+)")
+TESTED_RE = re.compile(r"\*\*\* (\d+) vectors tested")
+
+
+#-------------------------------------------------------------------
+# build_sim()
+#
+# Build the vector simulation with the toolruns Makefile and
+# return the path to it.
+#-------------------------------------------------------------------
+def build_sim():
+    subprocess.run(["make", "-C", TOOLRUNS_DIR, SIM_TARGET], check = True,
+                   stdout = subprocess.DEVNULL)
+    return os.path.abspath(os.path.join(TOOLRUNS_DIR, SIM_TARGET))
+
+
+#-------------------------------------------------------------------
+# run_sim()
+#
+# Run the simulation on the given records and return a dict from
+# the index of each failing record to the data_out from the RTL
+# as bytes (None if it could not be parsed). Raises RuntimeError
+# if the simulation did not test all records.
+#-------------------------------------------------------------------
+def run_sim(sim, path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(record + "\n")
+
+    result = subprocess.run([sim, "+vectors=%s" % path], stdout = subprocess.PIPE,
+                            stderr = subprocess.STDOUT, universal_newlines = True)
+    output = result.stdout
+
+    tested = TESTED_RE.search(output)
+    if (tested is None) or (int(tested.group(1)) != len(records)):
+        raise RuntimeError("Simulation of %s did not test all %d vectors:\n%s" %
+                           (path, len(records), output[-2000:]))
+
+    failures = {}
+    lines = output.splitlines()
+    for (i, line) in enumerate(lines):
+        match = ERROR_RE.search(line)
+        if match:
+            got = None
+            for next_line in lines[(i + 1) : (i + 3)]:
+                got_match = GOT_RE.search(next_line)
+                if got_match:
+                    try:
+                        got = bytes.fromhex(got_match.group(1).zfill(128))
+                    except ValueError:
+                        pass
+            failures[int(match.group(1))] = got
+    return failures
+
+
+#-------------------------------------------------------------------
+# run_batch()
+#
+# Worker. Generate and compute the cases of one batch with the
+# model, run them through the simulation and return a list of
+# (params, expected, got) for the mismatches.
+#-------------------------------------------------------------------
+def run_batch(sim, workdir, seed, start, count, rounds_list):
+    params_list = [random_params(seed, i, rounds_list) for i in range(start, start + count)]
+    records = compute_records(params_list)
+    path = os.path.join(workdir, "batch_%d.hex" % start)
+    failures = run_sim(sim, path, records)
+
+    mismatches = []
+    for (index, got) in sorted(failures.items()):
+        mismatches.append((params_list[index], decode_record(records[index])[6], got))
+    if not mismatches:
+        os.remove(path)
+    return mismatches
+
+
+#-------------------------------------------------------------------
+# complexity()
+#
+# Size measure of a case used when shrinking. Fewer set bits,
+# fewer rounds and 128 bit keys are simpler.
+#-------------------------------------------------------------------
+def complexity(params):
+    (key, keylen, iv, ctr, rounds, data_in) = params
+    bits = sum(bin(b).count("1") for b in (key + iv + data_in))
+    return (bits + bin(ctr).count("1") + keylen, rounds)
+
+
+#-------------------------------------------------------------------
+# shrink_candidates()
+#
+# Return simpler variants of a case: each field cleared, halves,
+# quarters etc of each field cleared down to single bytes, single
+# bits cleared, and fewer rounds. The counter is handled as a
+# field of 8 bytes.
+#-------------------------------------------------------------------
+def shrink_candidates(params):
+    (key, keylen, iv, ctr, rounds, data_in) = params
+    fields = {"key" : key, "iv" : iv, "ctr" : ctr.to_bytes(8, "big"), "data_in" : data_in}
+    candidates = []
+
+    def replace(name, value):
+        p = dict(zip(("key", "keylen", "iv", "ctr", "rounds", "data_in"), params))
+        if name == "ctr":
+            value = int.from_bytes(value, "big")
+        p[name] = value
+        return (p["key"], p["keylen"], p["iv"], p["ctr"], p["rounds"], p["data_in"])
+
+    if keylen:
+        candidates.append(replace("keylen", 0))
+    if not keylen and any(key[16:32]):
+        candidates.append(replace("key", key[0:16] + bytes(16)))
+    for r in range(2, rounds, 2):
+        candidates.append(replace("rounds", r))
+
+    for (name, value) in fields.items():
+        if not any(value):
+            continue
+        candidates.append(replace(name, bytes(len(value))))
+        step = len(value) // 2
+        while step >= 1:
+            for start in range(0, len(value), step):
+                if any(value[start : (start + step)]):
+                    candidates.append(replace(name, value[0 : start] + bytes(step) +
+                                              value[(start + step):]))
+            step //= 2
+        for i in range(len(value)):
+            for bit in range(8):
+                if value[i] & (1 << bit):
+                    cleared = value[0 : i] + bytes([value[i] & ~(1 << bit)]) + value[(i + 1):]
+                    candidates.append(replace(name, cleared))
+
+    return [c for c in dict.fromkeys(candidates) if complexity(c) < complexity(params)]
+
+
+#-------------------------------------------------------------------
+# shrink()
+#
+# Greedily shrink a failing case. All candidates of a step are
+# run in one simulation, and the simplest one that still fails is
+# kept until no candidate fails. Returns the minimal case.
+#-------------------------------------------------------------------
+def shrink(sim, workdir, params):
+    path = os.path.join(workdir, "shrink.hex")
+    while True:
+        candidates = shrink_candidates(params)
+        if not candidates:
+            break
+        failures = run_sim(sim, path, compute_records(candidates))
+        if not failures:
+            break
+        params = min((candidates[i] for i in failures), key = complexity)
+    os.remove(path)
+    return params
+
+
+#-------------------------------------------------------------------
+# describe()
+#
+# Return a readable description of a case. All 32 key bytes are
+# shown, also for 128 bit keys where the model only uses the
+# first 16 bytes, since all are driven into the core.
+#-------------------------------------------------------------------
+def describe(params):
+    (key, keylen, iv, ctr, rounds, data_in) = params
+    return ("key=%s keylen=%d iv=%s ctr=0x%016x rounds=%d data_in=%s" %
+            (key.hex(), (256 if keylen else 128), iv.hex(), ctr, rounds, data_in.hex()))
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="chacha_fuzz",
+                                     description="Differential fuzzing of chacha_core against the model.")
+    parser.add_argument("--cases", type=int, default=DEFAULT_CASES)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", default="fuzz")
+    parser.add_argument("--rounds", nargs="+", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of parallel simulations.")
+    parser.add_argument("--sim", help="Use this simulation binary instead of building "
+                        "%s with the toolruns Makefile." % SIM_TARGET)
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--max-reproducers", type=int, default=10,
+                        help="Max number of mismatches to shrink.")
+    opts = parser.parse_args(args)
+
+    if any((r % 2) or not (2 <= r <= 30) for r in opts.rounds):
+        parser.error("Rounds must be even and in 2..30.")
+    if opts.batch_size > 65536:
+        parser.error("Batch size must not exceed MAX_VECTORS (65536) in the testbench.")
+
+    sim = os.path.abspath(opts.sim) if opts.sim else build_sim()
+    os.makedirs(opts.workdir, exist_ok = True)
+
+    mismatches = []
+    with concurrent.futures.ProcessPoolExecutor(opts.jobs) as pool:
+        futures = [pool.submit(run_batch, sim, opts.workdir, opts.seed, start,
+                               min(opts.batch_size, opts.cases - start), opts.rounds)
+                   for start in range(0, opts.cases, opts.batch_size)]
+        for future in concurrent.futures.as_completed(futures):
+            mismatches += future.result()
+
+    print("%d cases, %d mismatches." % (opts.cases, len(mismatches)))
+    if not mismatches:
+        return 0
+
+    # Mismatches shrinking to the same case are reported once.
+    reproducers = {}
+    for (params, expected, got) in mismatches[0 : opts.max_reproducers]:
+        minimal = shrink(sim, opts.workdir, params)
+        if minimal not in reproducers:
+            reproducers[minimal] = (params, expected, got)
+
+    for (n, (minimal, (params, expected, got))) in enumerate(reproducers.items()):
+        path = os.path.join(opts.workdir, "reproducer_%d.hex" % n)
+        with open(path, "w") as f:
+            f.write(compute_records([minimal])[0] + "\n")
+        print("")
+        print("Mismatch:  %s" % describe(params))
+        print("Expected:  data_out=%s" % expected.hex())
+        print("Got:       data_out=%s" % (got.hex() if got is not None else "unknown"))
+        print("Minimal:   %s" % describe(minimal))
+        print("Reproduce: %s +vectors=%s" % (sim, path))
+    return 1
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main(sys.argv[1:]))
+
+#=======================================================================
+# EOF chacha_fuzz.py
+#=======================================================================
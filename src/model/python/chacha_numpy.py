@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_numpy.py
+# ---------------
+# NumPy engine for the ChaCha model. The 16 state words are kept
+# as uint32 arrays with one element per block (lane), which means
+# that the double rounds for many consecutive blocks are computed
+# with a single set of array operations. The output is identical
+# to the ChaCha class in chacha.py.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import numpy as np
+
+from chacha import ChaCha, KEY_CACHE, MODE_ORIGINAL, QR_INDICES, TraceRecorder
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Default number of blocks processed in parallel per pass.
+DEFAULT_LANES = 4096
+
+
+#-------------------------------------------------------------------
+# ChaChaNumpy()
+#
+# Drop in replacement for ChaCha where the bulk keystream API,
+# encrypt() and decrypt() compute up to lanes blocks at a time
+# using NumPy.
+#-------------------------------------------------------------------
+class ChaChaNumpy(ChaCha):
+
+    __slots__ = ("lanes",)
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # As ChaCha, with the number of parallel lanes as an
+    # additional parameter.
+    #---------------------------------------------------------------
+    def __init__(self, key, iv, rounds = 8, verbose = 0, tracer = None,
+                 lanes = DEFAULT_LANES, mode = MODE_ORIGINAL, perf = None):
+        self.lanes = lanes
+        ChaCha.__init__(self, key, iv, rounds, verbose, tracer, mode = mode, perf = perf)
+
+
+    #---------------------------------------------------------------
+    # _blocks_into()
+    #
+    # Write nblocks consecutive keystream blocks into the given
+    # byte memoryview and advance the block counter. The words
+    # are written directly into the buffer, lanes blocks at a time.
+    # The lanes do not call the tracer, with a tracer attached the
+    # blocks are computed one at a time by ChaCha.
+    #---------------------------------------------------------------
+    def _blocks_into(self, view, nblocks):
+        if self.tracer is not None:
+            ChaCha._blocks_into(self, view, nblocks)
+            return
+
+        out = np.frombuffer(view, dtype='<u4', count=(nblocks * 16))
+        out = out.reshape(nblocks, 16)
+        counter = self.get_counter()
+
+        for start in range(0, nblocks, self.lanes):
+            n = min(self.lanes, nblocks - start)
+            init = init_lanes(self.state, counter + start, n, self.counter_words)
+            out[start : (start + n)] = block_lanes(init, self.rounds)
+
+        # Not counted as a seek by the perf counters.
+        ChaCha.set_counter(self, counter + nblocks)
+
+
+#-------------------------------------------------------------------
+# init_lanes()
+#
+# Given a list of 16 state words and a 64 bit start counter
+# returns the initial state for n consecutive blocks as a list
+# of 16 uint32 arrays. Words that are the same in all lanes are
+# kept as scalars and broadcast. With counter_words = 1 the
+# counter is 32 bits (IETF mode) and word 13 is kept.
+#-------------------------------------------------------------------
+def init_lanes(state, counter, n, counter_words = 2):
+    ctr = np.arange(n, dtype=np.uint64) + np.uint64(counter & 0xffffffffffffffff)
+    init = [np.uint32(w) for w in state]
+    init[12] = (ctr & np.uint64(0xffffffff)).astype(np.uint32)
+    if counter_words == 2:
+        init[13] = (ctr >> np.uint64(32)).astype(np.uint32)
+    return init
+
+
+#-------------------------------------------------------------------
+# block_lanes()
+#
+# Given the initial state as 16 uint32 arrays (or scalars) of
+# lanes, performs the rounds and the final addition. Returns an
+# array of shape (n, 16) with one block of words per row.
+#-------------------------------------------------------------------
+def block_lanes(init, rounds):
+    n = max(np.size(w) for w in init)
+    x = [np.broadcast_to(w, (n,)).astype(np.uint32) for w in init]
+    t = np.empty(n, dtype=np.uint32)
+
+    for i in range(rounds // 2):
+        _doubleround(x, t)
+
+    out = np.empty((n, 16), dtype=np.uint32)
+    for i in range(16):
+        np.add(x[i], init[i], out=out[:, i], casting='unsafe')
+    return out
+
+
+#-------------------------------------------------------------------
+# chacha_batch_encrypt()
+#
+# Encrypt/decrypt many independent messages, each with its own
+# key and iv, starting at block counter zero. The blocks of all
+# messages are computed as lanes of the same array operations,
+# up to lanes blocks at a time. Returns a list of bytes, one
+# per message.
+#-------------------------------------------------------------------
+def chacha_batch_encrypt(keys, ivs, messages, rounds = 8, lanes = DEFAULT_LANES):
+    result = []
+    batch = []
+    nblocks = 0
+    for (key, iv, message) in zip(keys, ivs, messages):
+        batch.append((key, iv, message))
+        nblocks += (len(message) + 63) // 64
+        if nblocks >= lanes:
+            result += _batch_encrypt(batch, rounds)
+            batch = []
+            nblocks = 0
+
+    if batch:
+        result += _batch_encrypt(batch, rounds)
+    return result
+
+
+#-------------------------------------------------------------------
+# _batch_encrypt()
+#
+# Encrypt a list of (key, iv, message) in one pass.
+#-------------------------------------------------------------------
+def _batch_encrypt(batch, rounds):
+    lengths = [len(memoryview(message).cast('B')) for (key, iv, message) in batch]
+    blocks = np.array([(n + 63) // 64 for n in lengths], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(blocks)[:-1]))
+    nblocks = int(blocks.sum())
+
+    # Initial state words for each message, repeated for each
+    # of its blocks. The counter is the block index within
+    # the message.
+    words = np.zeros((len(batch), 16), dtype=np.uint32)
+    for (i, (key, iv, message)) in enumerate(batch):
+        if len(key) not in (16, 32):
+            raise ValueError("Key length of %d bits, is not supported." % (len(key) * 8))
+        if len(iv) != 8:
+            raise ValueError("IV length of %d bits, is not supported." % (len(iv) * 8))
+        words[i, 0:12] = KEY_CACHE.get(key)
+        words[i, 14:16] = np.frombuffer(bytes(iv[0:8]), dtype='<u4')
+    words = np.repeat(words, blocks, axis=0)
+    words[:, 12] = np.arange(nblocks, dtype=np.uint32) - np.repeat(starts, blocks).astype(np.uint32)
+    init = [words[:, i] for i in range(16)]
+
+    buf = bytearray(nblocks * 64)
+    offsets = [int(start) * 64 for start in starts]
+    for (offset, n, (key, iv, message)) in zip(offsets, lengths, batch):
+        buf[offset : (offset + n)] = message
+
+    data = np.frombuffer(buf, dtype='<u4').reshape(nblocks, 16)
+    data ^= block_lanes(init, rounds)
+    return [bytes(buf[offset : (offset + n)]) for (offset, n) in zip(offsets, lengths)]
+
+
+#-------------------------------------------------------------------
+# _doubleround()
+#
+# Perform the eight quarterrounds of a double round in place
+# on all lanes in x, using t as scratch space.
+#-------------------------------------------------------------------
+def _doubleround(x, t):
+    for (ai, bi, ci, di) in QR_INDICES:
+        a, b, c, d = x[ai], x[bi], x[ci], x[di]
+        a += b
+        d ^= a
+        _rotl(d, 16, t)
+        c += d
+        b ^= c
+        _rotl(b, 12, t)
+        a += b
+        d ^= a
+        _rotl(d, 8, t)
+        c += d
+        b ^= c
+        _rotl(b, 7, t)
+
+
+#-------------------------------------------------------------------
+# _rotl()
+#
+# Rotate the words in v left n bits in place.
+#-------------------------------------------------------------------
+def _rotl(v, n, t):
+    np.left_shift(v, n, out=t)
+    v >>= (32 - n)
+    v |= t
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed checks that the NumPy engine and batch encryption
+# give the same result as the ChaCha class for all round and
+# key lengths.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha NumPy engine.")
+    print("--------------------------------")
+
+    errors = 0
+    iv = [0x0f, 0x1e, 0x2d, 0x3c, 0x4b, 0x59, 0x68, 0x77]
+    for keylen in (16, 32):
+        key = [(i * 0x11) & 0xff for i in range(keylen)]
+        for rounds in (8, 12, 20):
+            test_case = "NP-%d-%d" % (keylen * 8, rounds)
+            expected = ChaCha(key, iv, rounds).keystream(64 * 37)
+            result = ChaChaNumpy(key, iv, rounds, lanes = 16).keystream(64 * 37)
+            if result == expected:
+                print("SUCCESS: %s was correct." % test_case)
+            else:
+                print("ERROR: %s was not correct." % test_case)
+                errors += 1
+
+    keys = [[(i + j) & 0xff for j in range((i % 2 + 1) * 16)] for i in range(50)]
+    ivs = [[(i * j) & 0xff for j in range(8)] for i in range(50)]
+    messages = [bytes((i * 7 + j) & 0xff for j in range(i * 13)) for i in range(50)]
+    for rounds in (8, 12, 20):
+        test_case = "NP-BATCH-%d" % rounds
+        expected = [ChaCha(key, iv, rounds).encrypt(message)
+                    for (key, iv, message) in zip(keys, ivs, messages)]
+        result = chacha_batch_encrypt(keys, ivs, messages, rounds, lanes = 64)
+        if result == expected:
+            print("SUCCESS: %s was correct." % test_case)
+        else:
+            print("ERROR: %s was not correct." % test_case)
+            errors += 1
+
+    expected = TraceRecorder()
+    result = TraceRecorder()
+    ChaCha(keys[1], iv, 8, tracer = expected).keystream(64 * 3)
+    ChaChaNumpy(keys[1], iv, 8, tracer = result).keystream(64 * 3)
+    if result.buffer == expected.buffer:
+        print("SUCCESS: NP-TRACE was correct.")
+    else:
+        print("ERROR: NP-TRACE was not correct.")
+        errors += 1
+
+    try:
+        chacha_batch_encrypt([bytes(20)], [bytes(8)], [bytes(10)])
+        print("ERROR: Batch key of 160 bits was not rejected.")
+        errors += 1
+    except ValueError:
+        print("SUCCESS: Batch key of 160 bits was rejected.")
+
+    for iv_len in (4, 12):
+        try:
+            chacha_batch_encrypt([bytes(32)], [bytes(iv_len)], [bytes(10)])
+            print("ERROR: Batch iv of %d bits was not rejected." % (iv_len * 8))
+            errors += 1
+        except ValueError:
+            print("SUCCESS: Batch iv of %d bits was rejected." % (iv_len * 8))
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_numpy.py
+#=======================================================================
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_pool.py
+# --------------
+# Pool of ChaCha instances for sharing one key and iv between
+# threads. Every thread gets its own instance on first use, working
+# on a disjoint range of the block counter.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import threading
+import concurrent.futures
+
+from chacha import ChaCha, MODE_ORIGINAL, MODE_IETF, get_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Default number of block counter bits per thread range for the
+# 64 bit and 32 bit (IETF) block counters.
+DEFAULT_RANGE_BITS = 32
+DEFAULT_IETF_RANGE_BITS = 24
+
+
+#-------------------------------------------------------------------
+# ChaChaPool()
+#
+# Thread n (in order of first use) gets the block counter range
+# [n << range_bits, (n + 1) << range_bits). With the default for
+# the 64 bit block counter the upper counter word is the thread
+# index. Indices are never reused, which means that no two
+# threads ever use the same keystream. The per thread instance
+# is found through threading.local, the lock is only taken when
+# a thread uses the pool for the first time.
+#-------------------------------------------------------------------
+class ChaChaPool():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, key, iv, rounds = 8, engine = "python", mode = MODE_ORIGINAL,
+                 range_bits = None):
+        self.key = bytes(key)
+        self.iv = bytes(iv)
+        self.rounds = rounds
+        self.engine = get_engine(engine)
+        self.mode = mode
+
+        counter_bits = 32 if (mode == MODE_IETF) else 64
+        if range_bits is None:
+            range_bits = DEFAULT_IETF_RANGE_BITS if (mode == MODE_IETF) else DEFAULT_RANGE_BITS
+        if not (0 < range_bits <= counter_bits):
+            raise ValueError("Range of %d bits, is not supported." % range_bits)
+        self.range_bits = range_bits
+        self.range_bytes = 1 << (range_bits + 6)
+        self.max_threads = 1 << (counter_bits - range_bits)
+
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.ranges = 0
+
+
+    #---------------------------------------------------------------
+    # cipher()
+    #
+    # Return the instance of the calling thread, creating it with
+    # the next free counter range on first use.
+    #---------------------------------------------------------------
+    def cipher(self):
+        cipher = getattr(self.local, "cipher", None)
+        if cipher is None:
+            with self.lock:
+                index = self.ranges
+                if index >= self.max_threads:
+                    raise ValueError("All %d counter ranges are in use." % self.max_threads)
+                self.ranges += 1
+            cipher = self.engine(self.key, self.iv, self.rounds, mode = self.mode)
+            cipher.set_counter(index << self.range_bits)
+            self.local.cipher = cipher
+            self.local.index = index
+            self.local.used = 0
+        return cipher
+
+
+    #---------------------------------------------------------------
+    # thread_index()
+    #
+    # Return the index of the counter range of the calling thread.
+    #---------------------------------------------------------------
+    def thread_index(self):
+        self.cipher()
+        return self.local.index
+
+
+    #---------------------------------------------------------------
+    # _reserve()
+    #
+    # Count nbytes as used from the range of the calling thread.
+    # The bytes used are counted since the start of the range, the
+    # block counter itself can not be used since it wraps to zero
+    # at the end of the last range. Raises ValueError if this would
+    # pass the end of the range.
+    #---------------------------------------------------------------
+    def _reserve(self, nbytes):
+        if (self.local.used + nbytes) > self.range_bytes:
+            raise ValueError("Counter range of thread %d is exhausted." % self.local.index)
+        self.local.used += nbytes
+
+
+    #---------------------------------------------------------------
+    # keystream()
+    #
+    # Return the next nbytes of keystream of the calling thread.
+    # Raises ValueError if this would pass the end of the range.
+    #---------------------------------------------------------------
+    def keystream(self, nbytes):
+        cipher = self.cipher()
+        self._reserve(nbytes)
+        return cipher.keystream(nbytes)
+
+
+    #---------------------------------------------------------------
+    # encrypt()
+    #
+    # Encrypt/decrypt data with the keystream of the calling thread.
+    #---------------------------------------------------------------
+    def encrypt(self, data):
+        cipher = self.cipher()
+        self._reserve(memoryview(data).nbytes)
+        return cipher.encrypt(data)
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Generate keystream in several threads sharing one pool and check
+# that every thread got the keystream of its own counter range.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha thread pool.")
+    print("-------------------------------")
+
+    errors = 0
+    key = [(i * 0x11) & 0xff for i in range(32)]
+    iv = [0x0f, 0x1e, 0x2d, 0x3c, 0x4b, 0x59, 0x68, 0x77]
+    pool = ChaChaPool(key, iv, 20)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        result = b''.join(pool.keystream(n) for n in (100, 28, 1000))
+        return (pool.thread_index(), result)
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = [f.result() for f in [executor.submit(worker) for i in range(8)]]
+
+    for (index, result) in results:
+        cipher = ChaCha(key, iv, 20)
+        cipher.set_counter(index << DEFAULT_RANGE_BITS)
+        if result != cipher.keystream(1128):
+            errors += 1
+
+    if errors or (sorted(index for (index, result) in results) != list(range(8))):
+        print("ERROR: Thread keystreams were not correct.")
+        errors += 1
+    else:
+        print("SUCCESS: Thread keystreams were correct.")
+
+    pool = ChaChaPool(key, bytes(12), 20, mode = MODE_IETF, range_bits = 1)
+    pool.keystream(128)
+    try:
+        pool.keystream(1)
+        print("ERROR: Exhausted counter range was not detected.")
+        errors += 1
+    except ValueError:
+        print("SUCCESS: Exhausted counter range was detected.")
+
+    # The last range ends where the block counter wraps to zero.
+    pool = ChaChaPool(key, bytes(12), 20, mode = MODE_IETF, range_bits = 1)
+    pool.ranges = pool.max_threads - 1
+    pool.encrypt(bytes(100))
+    pool.keystream(28)
+    try:
+        pool.keystream(1)
+        print("ERROR: Exhausted last counter range was not detected.")
+        errors += 1
+    except ValueError:
+        print("SUCCESS: Exhausted last counter range was detected.")
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_pool.py
+#=======================================================================
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_prefetch.py
+# ------------------
+# Background keystream prefetcher for the ChaCha model. A worker
+# thread computes future keystream blocks into a bounded ring buffer,
+# which means that encrypt() on the request path normally only has
+# to XOR. If the ring runs dry the blocks needed are computed
+# synchronously.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import copy
+import time
+import threading
+import collections
+
+from chacha import ChaCha, xor_bytes
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Default ring capacity in blocks, the worker fills the ring up
+# to this high watermark.
+DEFAULT_CAPACITY = 1024
+
+# Default number of blocks computed by the worker per step.
+DEFAULT_BATCH_BLOCKS = 64
+
+
+#-------------------------------------------------------------------
+# ChaChaPrefetcher()
+#
+# Wraps a cipher and provides keystream(), encrypt() and
+# decrypt() starting at the current position of the cipher.
+#
+# The worker uses its own copy of the cipher. It sleeps until the
+# ring occupancy drops to the low watermark, then fills the ring
+# in batches up to the high watermark (the capacity). When the
+# ring is dry the consumer computes the blocks it needs with the
+# wrapped cipher and counts a stall. Blocks the worker computed
+# for positions the consumer has already passed are dropped.
+#
+# The wrapped cipher must not be used directly until close() has
+# been called, which moves it to the position of the consumer.
+#-------------------------------------------------------------------
+class ChaChaPrefetcher():
+
+    #---------------------------------------------------------------
+    # __init__()
+    #---------------------------------------------------------------
+    def __init__(self, cipher, capacity = DEFAULT_CAPACITY, low_watermark = None,
+                 batch_blocks = DEFAULT_BATCH_BLOCKS):
+        if low_watermark is None:
+            low_watermark = capacity // 2
+        if not (0 <= low_watermark < capacity):
+            raise ValueError("Low watermark must be below the capacity.")
+
+        self.cipher = cipher
+        self.capacity = capacity
+        self.low_watermark = low_watermark
+        self.batch_blocks = batch_blocks
+
+        self.position = cipher.get_counter()
+        self.tail = cipher.keystream_tail
+        self.fill = self.position
+        self.ring = collections.deque()
+        self.occupancy = 0
+        self.cond = threading.Condition()
+        self.closed = False
+
+        self.stalls = 0
+        self.sync_blocks = 0
+        self.ring_blocks = 0
+        self.dropped_blocks = 0
+        self.takes = 0
+        self.occupancy_sum = 0
+        self.min_occupancy = capacity
+
+        self.worker = threading.Thread(target = self._work, args = (copy.deepcopy(cipher),),
+                                       daemon = True)
+        self.worker.start()
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return a dict with the ring occupancy and stall metrics. The
+    # occupancy mean and min are sampled each time the consumer
+    # needs a new block.
+    #---------------------------------------------------------------
+    def stats(self):
+        with self.cond:
+            return {"capacity" : self.capacity,
+                    "low_watermark" : self.low_watermark,
+                    "occupancy" : self.occupancy,
+                    "min_occupancy" : self.min_occupancy,
+                    "mean_occupancy" : (self.occupancy_sum / self.takes) if self.takes else 0.0,
+                    "stalls" : self.stalls,
+                    "ring_blocks" : self.ring_blocks,
+                    "sync_blocks" : self.sync_blocks,
+                    "dropped_blocks" : self.dropped_blocks}
+
+
+    #---------------------------------------------------------------
+    # keystream()
+    #
+    # Return the next nbytes of keystream.
+    #---------------------------------------------------------------
+    def keystream(self, nbytes):
+        tail = self.tail
+        if nbytes <= len(tail):
+            self.tail = tail[nbytes:]
+            return tail[0 : nbytes]
+
+        parts = [tail]
+        need = nbytes - len(tail)
+        while need > 0:
+            with self.cond:
+                self.takes += 1
+                self.occupancy_sum += self.occupancy
+                self.min_occupancy = min(self.min_occupancy, self.occupancy)
+                if self.ring:
+                    (start, data) = self.ring.popleft()
+                    nblocks = len(data) // 64
+                    self.occupancy -= nblocks
+                    self.ring_blocks += nblocks
+                    self.position += nblocks
+                    if self.occupancy <= self.low_watermark:
+                        self.cond.notify_all()
+                else:
+                    data = None
+                    start = self.position
+                    nblocks = (need + 63) // 64
+                    self.position += nblocks
+                    self.stalls += 1
+                    self.sync_blocks += nblocks
+
+            if data is None:
+                self.cipher.set_counter(start)
+                data = self.cipher.keystream(nblocks * 64)
+            parts.append(data)
+            need -= len(data)
+
+        data = b''.join(parts)
+        self.tail = data[nbytes:]
+        return data[0 : nbytes]
+
+
+    #---------------------------------------------------------------
+    # encrypt(), decrypt()
+    #---------------------------------------------------------------
+    def encrypt(self, data):
+        data = memoryview(data).cast('B')
+        return xor_bytes(data, self.keystream(len(data)))
+
+
+    def decrypt(self, data):
+        return self.encrypt(data)
+
+
+    #---------------------------------------------------------------
+    # close()
+    #
+    # Stop the worker and move the wrapped cipher to the position
+    # of the consumer.
+    #---------------------------------------------------------------
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.worker.join()
+        self.cipher.set_counter(self.position)
+        self.cipher.keystream_tail = self.tail
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    #---------------------------------------------------------------
+    # _work()
+    #
+    # Worker thread. Fills the ring when the occupancy is at or
+    # below the low watermark.
+    #---------------------------------------------------------------
+    def _work(self, cipher):
+        cond = self.cond
+        while True:
+            with cond:
+                while (not self.closed) and (self.occupancy > self.low_watermark):
+                    cond.wait()
+                if self.closed:
+                    return
+
+                # Continue after the end of the ring, or at the
+                # consumer position if the consumer has passed it.
+                self.fill = max(self.fill, self.position)
+                start = self.fill
+                nblocks = min(self.batch_blocks, self.capacity - self.occupancy)
+                self.fill += nblocks
+
+            while nblocks > 0:
+                try:
+                    cipher.set_counter(start)
+                    data = cipher.keystream(nblocks * 64)
+                except OverflowError:
+                    # End of the IETF counter range. The consumer
+                    # gets the error when it computes the blocks.
+                    return
+
+                with cond:
+                    if self.closed:
+                        return
+
+                    # Drop blocks the consumer has already passed.
+                    end = start + nblocks
+                    expected = self.position + self.occupancy
+                    if start < expected:
+                        skip = min(nblocks, expected - start)
+                        self.dropped_blocks += skip
+                        data = data[(skip * 64):]
+                        start += skip
+
+                    if data:
+                        self.ring.append((start, data))
+                        self.occupancy += len(data) // 64
+                        cond.notify_all()
+
+                    # Keep filling up to the high watermark.
+                    self.fill = max(self.fill, self.position)
+                    if (self.occupancy < self.capacity) and (self.fill == end):
+                        start = end
+                        nblocks = min(self.batch_blocks, self.capacity - self.occupancy)
+                        self.fill += nblocks
+                    else:
+                        nblocks = 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Check that the prefetched keystream is the same as the keystream
+# of the cipher, with and without stalls, and print the metrics.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha keystream prefetcher.")
+    print("----------------------------------------")
+
+    errors = 0
+    key = [(i * 0x11) & 0xff for i in range(32)]
+    iv = [0x0f, 0x1e, 0x2d, 0x3c, 0x4b, 0x59, 0x68, 0x77]
+    data = bytes((i * 7) & 0xff for i in range(200000))
+    expected = ChaCha(key, iv, 8).encrypt(data)
+
+    # Small requests with pauses, served from the ring.
+    cipher = ChaCha(key, iv, 8)
+    cipher.keystream(10)
+    with ChaChaPrefetcher(cipher, capacity = 256, batch_blocks = 16) as prefetcher:
+        time.sleep(0.2)
+        result = bytearray(expected[0 : 10])
+        for start in range(10, 20000, 1000):
+            result += prefetcher.encrypt(data[start : (start + 1000)])
+            time.sleep(0.001)
+        stats = prefetcher.stats()
+    result += cipher.encrypt(data[20010 : 30000])
+    print("Ring metrics: %s" % stats)
+    if result != expected[0 : 30000]:
+        print("ERROR: Prefetched keystream was not correct.")
+        errors += 1
+    else:
+        print("SUCCESS: Prefetched keystream was correct.")
+
+    # Large requests without pauses, forcing stalls.
+    with ChaChaPrefetcher(ChaCha(key, iv, 8), capacity = 32, batch_blocks = 8) as prefetcher:
+        result = b''.join(prefetcher.encrypt(data[start : (start + 7000)])
+                          for start in range(0, len(data), 7000))
+        stats = prefetcher.stats()
+    print("Ring metrics: %s" % stats)
+    if (result != expected) or (stats["stalls"] == 0):
+        print("ERROR: Keystream with stalls was not correct.")
+        errors += 1
+    else:
+        print("SUCCESS: Keystream with stalls was correct.")
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_prefetch.py
+#=======================================================================
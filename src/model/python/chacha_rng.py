@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_rng.py
+# -------------
+# Deterministic random generator built on the ChaCha model. The
+# keystream is generated in large batches into a pool, and the
+# first 32 bytes of every batch are used as the key for the next
+# batch (fast key erasure). Requests are served from the pool.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import random
+import hashlib
+
+from chacha import ChaCha, get_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Default number of keystream blocks generated per refill.
+DEFAULT_POOL_BLOCKS = 1024
+
+# The iv used with every key.
+RNG_IV = bytes(8)
+
+RECIP_BPF = 2 ** -53
+
+
+#-------------------------------------------------------------------
+# ChaChaRNG()
+#
+# Seedable random generator. Implements random(), getrandbits()
+# and randbytes(), which means that all other methods of
+# random.Random (randrange(), choice(), shuffle() etc) use the
+# ChaCha keystream. The same seed always gives the same sequence
+# and a sequence does not depend on how it is split into calls.
+#
+# The generator keys are not stored in the key cache.
+#-------------------------------------------------------------------
+class ChaChaRNG(random.Random):
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # The seed may be None (seed from os.urandom()), an int, str,
+    # bytes or bytearray. A seed of 32 bytes is used as the key,
+    # other seeds are hashed with SHA-256. The pool must be at least
+    # one block since the first 32 bytes are used as the next key.
+    #---------------------------------------------------------------
+    def __init__(self, seed = None, rounds = 20, engine = "python",
+                 pool_blocks = DEFAULT_POOL_BLOCKS):
+        if pool_blocks < 1:
+            raise ValueError("Pool of %d blocks, is not supported." % pool_blocks)
+        self.pool_blocks = pool_blocks
+        self.cipher = get_engine(engine)(bytes(32), RNG_IV, rounds)
+        self.refills = 0
+        random.Random.__init__(self, seed)
+
+
+    #---------------------------------------------------------------
+    # seed()
+    #---------------------------------------------------------------
+    def seed(self, a = None, version = 2):
+        if a is None:
+            key = os.urandom(32)
+        elif isinstance(a, int):
+            key = hashlib.sha256(a.to_bytes(((a.bit_length() + 8) // 8), "little",
+                                            signed = True)).digest()
+        elif isinstance(a, (str, bytes, bytearray)):
+            if isinstance(a, str):
+                a = a.encode()
+            key = bytes(a) if (len(a) == 32) else hashlib.sha256(a).digest()
+        else:
+            raise TypeError("The only supported seed types are: None, "
+                            "int, str, bytes, and bytearray.")
+
+        self.key = key
+        self.pool = b''
+        self.pos = 0
+        self.gauss_next = None
+
+
+    #---------------------------------------------------------------
+    # getstate(), setstate()
+    #---------------------------------------------------------------
+    def getstate(self):
+        return (self.key, self.pool[self.pos:], self.gauss_next)
+
+
+    def setstate(self, state):
+        (self.key, self.pool, self.gauss_next) = state
+        self.pos = 0
+
+
+    #---------------------------------------------------------------
+    # randbytes()
+    #
+    # Return n random bytes.
+    #---------------------------------------------------------------
+    def randbytes(self, n):
+        if n < 0:
+            raise ValueError("number of bytes must be non-negative")
+        pos = self.pos
+        end = pos + n
+        if end <= len(self.pool):
+            self.pos = end
+            return self.pool[pos : end]
+
+        parts = [self.pool[pos:]]
+        n -= len(parts[0])
+        while n > 0:
+            self._refill()
+            end = min(len(self.pool), (self.pos + n))
+            parts.append(self.pool[self.pos : end])
+            n -= end - self.pos
+            self.pos = end
+        return b''.join(parts)
+
+
+    #---------------------------------------------------------------
+    # getrandbits()
+    #
+    # Return an int with k random bits.
+    #---------------------------------------------------------------
+    def getrandbits(self, k):
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        if k == 0:
+            return 0
+        n = (k + 7) // 8
+        return int.from_bytes(self.randbytes(n), "little") >> ((n * 8) - k)
+
+
+    #---------------------------------------------------------------
+    # random()
+    #
+    # Return a float in [0.0, 1.0) with 53 random bits.
+    #---------------------------------------------------------------
+    def random(self):
+        return (int.from_bytes(self.randbytes(7), "little") >> 3) * RECIP_BPF
+
+
+    #---------------------------------------------------------------
+    # _refill()
+    #
+    # Generate pool_blocks keystream blocks with the current key.
+    # The first 32 bytes are the next key, the rest is the pool.
+    #---------------------------------------------------------------
+    def _refill(self):
+        self.cipher.set_key_iv(self.key, RNG_IV, cache = False)
+        buf = bytearray(self.pool_blocks * 64)
+        self.cipher.keystream_into(buf, self.pool_blocks)
+        self.pool = bytes(buf)
+        self.key = self.pool[0 : 32]
+        self.pos = 32
+        self.refills += 1
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Check the generator against the ChaCha keystream and check that
+# it is reproducible.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha random generator.")
+    print("------------------------------------")
+
+    errors = 0
+    seed = bytes(range(32))
+
+    rng = ChaChaRNG(seed, pool_blocks = 4)
+    result = rng.randbytes(300)
+    stream = ChaCha(seed, RNG_IV, 20).keystream(256)
+    expected = stream[32:] + ChaCha(stream[0:32], RNG_IV, 20).keystream(256)[32:108]
+    if result == expected:
+        print("SUCCESS: Keystream with key erasure was correct.")
+    else:
+        print("ERROR: Keystream with key erasure was not correct.")
+        errors += 1
+
+    rng1 = ChaChaRNG("simulation 42", pool_blocks = 16)
+    rng2 = ChaChaRNG("simulation 42", pool_blocks = 16)
+    values1 = list(range(100))
+    values2 = list(range(100))
+    rng1.shuffle(values1)
+    rng2.shuffle(values2)
+    state = rng1.getstate()
+    result1 = [rng1.randbytes(n) for n in (1, 7, 5000, 3)] + [rng1.getrandbits(77), rng1.random()]
+    result2 = [rng2.randbytes(n) for n in (1, 7, 5000, 3)] + [rng2.getrandbits(77), rng2.random()]
+    rng1.setstate(state)
+    result3 = [rng1.randbytes(n) for n in (1, 7, 5000, 3)] + [rng1.getrandbits(77), rng1.random()]
+    if (values1 == values2) and (result1 == result2 == result3) and (values1 != list(range(100))):
+        print("SUCCESS: Generator was reproducible.")
+    else:
+        print("ERROR: Generator was not reproducible.")
+        errors += 1
+
+    values = [rng1.random() for i in range(10000)]
+    if (0.0 <= min(values)) and (max(values) < 1.0) and (0.45 < (sum(values) / 10000) < 0.55):
+        print("SUCCESS: random() range and mean was correct.")
+    else:
+        print("ERROR: random() range or mean was not correct.")
+        errors += 1
+
+    rng = ChaChaRNG(seed)
+    first = rng.randbytes(16)
+    try:
+        rng.randbytes(-8)
+        print("ERROR: Negative number of bytes was not rejected.")
+        errors += 1
+    except ValueError:
+        if rng.randbytes(16) != first:
+            print("SUCCESS: Negative number of bytes was rejected.")
+        else:
+            print("ERROR: Negative number of bytes moved the generator back.")
+            errors += 1
+
+    try:
+        ChaChaRNG(seed, pool_blocks = 0)
+        print("ERROR: Empty pool was not rejected.")
+        errors += 1
+    except ValueError:
+        print("SUCCESS: Empty pool was rejected.")
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_rng.py
+#=======================================================================
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_stream.py
+# ----------------
+# File-like wrapper that encrypts or decrypts a binary stream
+# on the fly using the ChaCha model. The wrapper is an io.RawIOBase
+# and can be used anywhere a binary file object is expected, for
+# example with shutil.copyfileobj() or wrapped in io.BufferedReader
+# for tarfile and gzip.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import io
+import sys
+
+from chacha import ChaCha
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Default number of bytes encrypted per call to the cipher.
+# Must be a multiple of the block size.
+DEFAULT_BATCH_SIZE = 64 * 1024
+
+
+#-------------------------------------------------------------------
+# ChaChaStream()
+#
+# Wraps the binary file object raw. Data read from the stream is
+# read from raw and decrypted, data written to the stream is
+# encrypted and written to raw. The keystream position follows
+# the position in raw, which means that the stream is seekable
+# if raw is seekable.
+#-------------------------------------------------------------------
+class ChaChaStream(io.RawIOBase):
+
+    #---------------------------------------------------------------
+    # __init__()
+    #
+    # The current keystream position of the cipher is taken to
+    # correspond to the current position of raw. If closefd is
+    # false, raw is left open when the stream is closed.
+    #---------------------------------------------------------------
+    def __init__(self, raw, cipher, batch_size = DEFAULT_BATCH_SIZE, closefd = True):
+        io.RawIOBase.__init__(self)
+        self.raw = raw
+        self.cipher = cipher
+        self.batch_size = batch_size
+        self.closefd = closefd
+
+        if raw.seekable():
+            self.base = cipher.tell() - raw.tell()
+        else:
+            self.base = None
+
+
+    #---------------------------------------------------------------
+    # readable(), writable(), seekable()
+    #
+    # Capabilities are the same as for the wrapped object.
+    #---------------------------------------------------------------
+    def readable(self):
+        return self.raw.readable()
+
+
+    def writable(self):
+        return self.raw.writable()
+
+
+    def seekable(self):
+        return self.raw.seekable()
+
+
+    #---------------------------------------------------------------
+    # readinto()
+    #
+    # Read up to len(b) bytes from raw directly into b and decrypt
+    # them in place. Returns the number of bytes read.
+    #---------------------------------------------------------------
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        n = self.raw.readinto(view)
+        if not n:
+            return n
+
+        for start in range(0, n, self.batch_size):
+            end = min(n, start + self.batch_size)
+            view[start : end] = self.cipher.encrypt(view[start : end])
+        return n
+
+
+    #---------------------------------------------------------------
+    # write()
+    #
+    # Encrypt b and write the result to raw. Returns the number of
+    # bytes written. If raw is non-blocking and not ready, fewer
+    # bytes may be written and the keystream is moved back to the
+    # end of the written data. None is returned if no bytes could
+    # be written. If raw raises, the keystream is moved back the
+    # same way. A BlockingIOError after some bytes were written
+    # gives the number written, other errors are passed on.
+    #---------------------------------------------------------------
+    def write(self, b):
+        data = memoryview(b).cast('B')
+        pos = self.cipher.tell()
+        written = 0
+        try:
+            while written < len(data):
+                result = memoryview(self.cipher.encrypt(data[written : (written + self.batch_size)]))
+                while result:
+                    n = self.raw.write(result)
+                    if n is None:
+                        self.cipher.seek(pos + written)
+                        return written or None
+                    written += n
+                    result = result[n:]
+        except BaseException as e:
+            self.cipher.seek(pos + written)
+            if written and isinstance(e, BlockingIOError):
+                return written
+            raise
+        return written
+
+
+    #---------------------------------------------------------------
+    # seek()
+    #
+    # Seek in raw and move the keystream to the new position.
+    #---------------------------------------------------------------
+    def seek(self, offset, whence = io.SEEK_SET):
+        if self.base is None:
+            raise io.UnsupportedOperation("Wrapped stream is not seekable.")
+
+        pos = self.raw.seek(offset, whence)
+        self.cipher.seek(self.base + pos)
+        return pos
+
+
+    #---------------------------------------------------------------
+    # tell()
+    #---------------------------------------------------------------
+    def tell(self):
+        return self.raw.tell()
+
+
+    #---------------------------------------------------------------
+    # flush()
+    #---------------------------------------------------------------
+    def flush(self):
+        if not self.closed:
+            self.raw.flush()
+
+
+    #---------------------------------------------------------------
+    # close()
+    #
+    # Close the stream and, unless closefd was false, raw.
+    #---------------------------------------------------------------
+    def close(self):
+        if not self.closed:
+            io.RawIOBase.close(self)
+            if self.closefd:
+                self.raw.close()
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed checks that data written through a stream and read
+# back through another stream is unchanged, including after seeks
+# and writes to a non-blocking stream that is not ready.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the ChaCha stream wrapper.")
+    print("----------------------------------")
+
+    errors = 0
+    key = [(i * 0x11) & 0xff for i in range(32)]
+    iv = [0x0f, 0x1e, 0x2d, 0x3c, 0x4b, 0x59, 0x68, 0x77]
+    data = bytes((i * 7) & 0xff for i in range(10000))
+
+    f = io.BytesIO()
+    with ChaChaStream(f, ChaCha(key, iv, 20), batch_size = 256, closefd = False) as s:
+        s.write(data[:1000])
+        s.write(data[1000:])
+
+    if f.getvalue() == ChaCha(key, iv, 20).encrypt(data):
+        print("SUCCESS: Stream encryption was correct.")
+    else:
+        print("ERROR: Stream encryption was not correct.")
+        errors += 1
+
+    f.seek(0)
+    with io.BufferedReader(ChaChaStream(f, ChaCha(key, iv, 20))) as s:
+        s.seek(4321)
+        result = s.read(100)
+        s.seek(17)
+        result += s.read()
+
+    if result == data[4321:4421] + data[17:]:
+        print("SUCCESS: Stream decryption with seek was correct.")
+    else:
+        print("ERROR: Stream decryption with seek was not correct.")
+        errors += 1
+
+    # Non-blocking raw stream that is not ready every other call
+    # and otherwise accepts at most 100 bytes.
+    class SlowRaw(io.BytesIO):
+        ready = False
+
+        def write(self, b):
+            self.ready = not self.ready
+            if self.ready:
+                return None
+            return io.BytesIO.write(self, bytes(b[:100]))
+
+    f = SlowRaw()
+    s = ChaChaStream(f, ChaCha(key, iv, 20), batch_size = 256, closefd = False)
+    pos = 0
+    counts = []
+    while pos < len(data):
+        n = s.write(data[pos:])
+        counts.append(n)
+        if n:
+            pos += n
+
+    if (None in counts) and (f.getvalue() == ChaCha(key, iv, 20).encrypt(data)):
+        print("SUCCESS: Partial writes to a non-blocking stream were correct.")
+    else:
+        print("ERROR: Partial writes to a non-blocking stream were not correct.")
+        errors += 1
+
+    # Raw stream that raises on every other call.
+    class FailingRaw(io.BytesIO):
+        fail = False
+
+        def write(self, b):
+            self.fail = not self.fail
+            if self.fail:
+                raise BlockingIOError("Raw stream not ready.")
+            return io.BytesIO.write(self, bytes(b[:100]))
+
+    f = FailingRaw()
+    s = ChaChaStream(f, ChaCha(key, iv, 20), batch_size = 256, closefd = False)
+    pos = 0
+    failures = 0
+    while pos < len(data):
+        try:
+            pos += s.write(data[pos:])
+        except BlockingIOError:
+            failures += 1
+
+    if failures and (f.getvalue() == ChaCha(key, iv, 20).encrypt(data)):
+        print("SUCCESS: Writes after errors from the raw stream were correct.")
+    else:
+        print("ERROR: Writes after errors from the raw stream were not correct.")
+        errors += 1
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF chacha_stream.py
+#=======================================================================
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha_vectors.py
+# -----------------
+# Generator of test vector files for the Verilog testbenches. The
+# vectors are computed with the ChaCha model and written as one
+# record per line, in a format that can be loaded with $readmemh.
+# See tb_chacha_core_vectors.v for a testbench using the files.
+#
+# Each record is 1424 bits, from MSB to LSB:
+#   key      256 bits. For 128 bit keys only the upper 128 bits are used.
+#   keylen     8 bits. 0 for 128 bit key, 1 for 256 bit key.
+#   rounds     8 bits.
+#   iv        64 bits.
+#   ctr       64 bits. Initial block counter.
+#   data_in  512 bits.
+#   data_out 512 bits.
+# The first byte of key, iv, data_in and data_out is in the MSBs
+# of the field, as on the ports of chacha_core.
+#
+# When regenerating into an existing file, records whose parameters
+# are already in the file are reused and only new ones computed.
+#
+#
+# Copyright (c) 2026 Secworks Sweden AB
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import random
+import argparse
+import concurrent.futures
+
+from chacha import ChaCha
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+RECORD_BITS = 1424
+PARAMS_DIGITS = 228
+RECORD_DIGITS = 356
+
+DEFAULT_COUNT = 10000
+DEFAULT_ROUNDS = [8, 12, 20]
+DEFAULT_KEYLENS = [128, 256]
+
+# Number of records computed per job in the worker processes.
+JOB_SIZE = 1000
+
+# Counter values around the word boundaries used more often than
+# random counters.
+EDGE_CTRS = [0x0, 0x1, 0xfffffffe, 0xffffffff, 0x100000000,
+             0xffffffffffffffff]
+
+
+#-------------------------------------------------------------------
+# random_params()
+#
+# Return the parameters for vector index given the seed as a
+# tuple (key, keylen, iv, ctr, rounds, data_in). The parameters
+# only depend on the arguments, which means that the same seed
+# always gives the same vectors.
+#-------------------------------------------------------------------
+def random_params(seed, index, rounds_list = DEFAULT_ROUNDS, keylens = DEFAULT_KEYLENS):
+    rng = random.Random("%s:%d" % (seed, index))
+    key = bytes(rng.getrandbits(8) for i in range(32))
+    keylen = int(rng.choice(keylens) == 256)
+    iv = bytes(rng.getrandbits(8) for i in range(8))
+
+    if rng.random() < 0.25:
+        ctr = rng.choice(EDGE_CTRS)
+    else:
+        ctr = rng.getrandbits(64)
+
+    rounds = rng.choice(rounds_list)
+
+    if rng.random() < 0.25:
+        data_in = bytes(64)
+    else:
+        data_in = bytes(rng.getrandbits(8) for i in range(64))
+    return (key, keylen, iv, ctr, rounds, data_in)
+
+
+#-------------------------------------------------------------------
+# encode_params()
+#
+# Return the parameter part of a record as hex digits.
+#-------------------------------------------------------------------
+def encode_params(params):
+    (key, keylen, iv, ctr, rounds, data_in) = params
+    return "%s%02x%02x%s%016x%s" % (bytes(key).hex(), keylen, rounds,
+                                     bytes(iv).hex(), ctr, bytes(data_in).hex())
+
+
+#-------------------------------------------------------------------
+# decode_record()
+#
+# Given a record as hex digits returns the tuple
+# (key, keylen, iv, ctr, rounds, data_in, data_out).
+#-------------------------------------------------------------------
+def decode_record(line):
+    return (bytes.fromhex(line[0:64]), int(line[64:66], 16),
+            bytes.fromhex(line[68:84]), int(line[84:100], 16),
+            int(line[66:68], 16), bytes.fromhex(line[100:228]),
+            bytes.fromhex(line[228:356]))
+
+
+#-------------------------------------------------------------------
+# compute_block()
+#
+# Compute data_out for the given parameters with the model.
+#-------------------------------------------------------------------
+def compute_block(params):
+    (key, keylen, iv, ctr, rounds, data_in) = params
+    if not keylen:
+        key = key[0:16]
+
+    cipher = ChaCha(key, iv, rounds)
+    cipher.set_counter(ctr)
+    return bytes(cipher.next(data_in))
+
+
+#-------------------------------------------------------------------
+# compute_records()
+#
+# Return the complete records for a list of parameters.
+#-------------------------------------------------------------------
+def compute_records(params_list):
+    return [encode_params(params) + compute_block(params).hex()
+            for params in params_list]
+
+
+#-------------------------------------------------------------------
+# read_records()
+#
+# Read a vector file and return a dict from the parameter part
+# to the complete record. Returns an empty dict if the file does
+# not exist.
+#-------------------------------------------------------------------
+def read_records(path):
+    records = {}
+    if not os.path.exists(path):
+        return records
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == RECORD_DIGITS:
+                records[line[0:PARAMS_DIGITS]] = line
+    return records
+
+
+#-------------------------------------------------------------------
+# generate()
+#
+# Generate count vectors from the seed into the file at path.
+# Records already in the file are reused, the rest are computed
+# by jobs worker processes. Returns the tuple (computed, reused).
+#-------------------------------------------------------------------
+def generate(path, count, seed, rounds_list = DEFAULT_ROUNDS,
+             keylens = DEFAULT_KEYLENS, jobs = 1):
+    existing = read_records(path)
+    params_list = [random_params(seed, i, rounds_list, keylens) for i in range(count)]
+    encoded = [encode_params(params) for params in params_list]
+    missing = [params for (params, e) in zip(params_list, encoded) if e not in existing]
+
+    chunks = [missing[i : (i + JOB_SIZE)] for i in range(0, len(missing), JOB_SIZE)]
+    if (jobs <= 1) or (len(chunks) <= 1):
+        results = [compute_records(chunk) for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(compute_records, chunks))
+
+    for records in results:
+        for record in records:
+            existing[record[0:PARAMS_DIGITS]] = record
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("// ChaCha test vectors. seed: %s, count: %d\n" % (seed, count))
+        f.write("// key[256] keylen[8] rounds[8] iv[64] ctr[64] data_in[512] data_out[512]\n")
+        for e in encoded:
+            f.write(existing[e] + "\n")
+    os.replace(tmp_path, path)
+    return (len(missing), count - len(missing))
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="chacha_vectors",
+                                     description="Generate ChaCha test vectors for $readmemh.")
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--rounds", nargs="+", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--keylens", nargs="+", type=int, choices=DEFAULT_KEYLENS,
+                        default=DEFAULT_KEYLENS)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="vectors.hex")
+    opts = parser.parse_args(args)
+
+    (computed, reused) = generate(opts.output, opts.count, opts.seed, opts.rounds,
+                                  opts.keylens, opts.jobs)
+    print("%s: %d vectors, %d computed, %d reused." %
+          (opts.output, opts.count, computed, reused))
+    return 0
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main(sys.argv[1:]))
+
+#=======================================================================
+# EOF chacha_vectors.py
+#=======================================================================
@@ -0,0 +1,248 @@
+//======================================================================
+//
+// tb_chacha_core_vectors.v
+// ------------------------
+// Testbench for the Chacha stream cipher core that checks the core
+// against a file of test vectors generated by the Python model
+// with chacha_vectors.py. The file is loaded with $readmemh and
+// given with the plusarg +vectors=<file>. Vectors are processed
+// until the end of the file, a record with rounds set to zero, or
+// MAX_VECTORS.
+//
+//
+// Copyright (c) 2026, Secworks Sweden AB
+// All rights reserved.
+//
+// Redistribution and use in source and binary forms, with or
+// without modification, are permitted provided that the following
+// conditions are met:
+//
+// 1. Redistributions of source code must retain the above copyright
+//    notice, this list of conditions and the following disclaimer.
+//
+// 2. Redistributions in binary form must reproduce the above copyright
+//    notice, this list of conditions and the following disclaimer in
+//    the documentation and/or other materials provided with the
+//    distribution.
+//
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+// FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+// COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+// INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+// BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+// LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+// STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+// ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+// ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+//
+//======================================================================
+
+`default_nettype none
+
+module tb_chacha_core_vectors();
+
+  //----------------------------------------------------------------
+  // Internal constant and parameter definitions.
+  //----------------------------------------------------------------
+  parameter CLK_HALF_PERIOD = 2;
+  parameter CLK_PERIOD = 2 * CLK_HALF_PERIOD;
+
+  parameter MAX_VECTORS = 65536;
+  parameter RECORD_BITS = 1424;
+
+
+  //----------------------------------------------------------------
+  // Register and Wire declarations.
+  //----------------------------------------------------------------
+  // One slot more than MAX_VECTORS to detect files that do not fit.
+  reg [RECORD_BITS - 1 : 0] vectors [0 : MAX_VECTORS];
+  reg [2047 : 0]            vector_file;
+
+  reg [31 : 0] cycle_ctr;
+  reg [31 : 0] error_ctr;
+  reg [31 : 0] tc_ctr;
+
+  reg tb_clk;
+  reg tb_reset_n;
+
+  reg            tb_core_init;
+  reg [255 : 0]  tb_core_key;
+  reg            tb_core_keylen;
+  reg [4 : 0]    tb_core_rounds;
+  reg [63 : 0]   tb_core_iv;
+  reg [63 : 0]   tb_core_ctr;
+  wire           tb_core_ready;
+  reg [511 : 0]  tb_core_data_in;
+  wire [511 : 0] tb_core_data_out;
+  wire           tb_core_data_out_valid;
+
+
+  //----------------------------------------------------------------
+  // chacha_core device under test.
+  //----------------------------------------------------------------
+  chacha_core dut(
+                   // Clock and reset.
+                   .clk(tb_clk),
+                   .reset_n(tb_reset_n),
+
+                   // Control.
+                   .init(tb_core_init),
+                   .next(1'b0),
+
+                   // Parameters.
+                   .key(tb_core_key),
+                   .keylen(tb_core_keylen),
+                   .iv(tb_core_iv),
+                   .ctr(tb_core_ctr),
+                   .rounds(tb_core_rounds),
+
+                   // Data input.
+                   .data_in(tb_core_data_in),
+
+                   // Status output.
+                   .ready(tb_core_ready),
+
+                   // Data out with valid signal.
+                   .data_out(tb_core_data_out),
+                   .data_out_valid(tb_core_data_out_valid)
+                  );
+
+
+  //----------------------------------------------------------------
+  // clk_gen
+  //
+  // Clock generator process.
+  //----------------------------------------------------------------
+  always
+    begin : clk_gen
+      #CLK_HALF_PERIOD tb_clk = !tb_clk;
+    end // clk_gen
+
+
+  //----------------------------------------------------------------
+  // sys_monitor
+  //
+  // Cycle counter.
+  //----------------------------------------------------------------
+  always @ (posedge tb_clk)
+    begin : sys_monitor
+      cycle_ctr = cycle_ctr + 1;
+    end // sys_monitor
+
+
+  //----------------------------------------------------------------
+  // run_vector
+  //
+  // Runs the test vector with the given index. The core is
+  // initialized with the key, iv, counter and rounds from the
+  // vector and the result compared to the expected data out.
+  //----------------------------------------------------------------
+  task run_vector(input [31 : 0] index);
+    reg [RECORD_BITS - 1 : 0] record;
+    reg [511 : 0] expected;
+    begin
+      record = vectors[index];
+      tc_ctr = tc_ctr + 1;
+
+      @(negedge tb_clk);
+      tb_core_key     = record[1423 : 1168];
+      tb_core_keylen  = record[1160];
+      tb_core_rounds  = record[1156 : 1152];
+      tb_core_iv      = record[1151 : 1088];
+      tb_core_ctr     = record[1087 : 1024];
+      tb_core_data_in = record[1023 : 512];
+      expected        = record[511 : 0];
+      tb_core_init    = 1;
+
+      @(negedge tb_clk);
+      tb_core_init = 0;
+
+      while (!tb_core_data_out_valid)
+        @(negedge tb_clk);
+
+      if (tb_core_data_out != expected)
+        begin
+          $display("*** ERROR: Vector %0d not successful.", index);
+          $display("Expected: 0x%0128x", expected);
+          $display("Got:      0x%0128x", tb_core_data_out);
+          $display("");
+          error_ctr = error_ctr + 1;
+        end
+    end
+  endtask // run_vector
+
+
+  //----------------------------------------------------------------
+  // init_sim()
+  //
+  // Initialize all counters and testbed functionality as well
+  // as setting the DUT inputs to defined values.
+  //----------------------------------------------------------------
+  task init_sim;
+    begin
+      cycle_ctr       = 0;
+      error_ctr       = 0;
+      tc_ctr          = 0;
+      tb_clk          = 0;
+      tb_reset_n      = 0;
+      tb_core_init    = 0;
+      tb_core_key     = 256'h0;
+      tb_core_keylen  = 0;
+      tb_core_rounds  = 5'h0;
+      tb_core_iv      = 64'h0;
+      tb_core_ctr     = 64'h0;
+      tb_core_data_in = 512'h0;
+    end
+  endtask // init_sim
+
+
+  //----------------------------------------------------------------
+  // chacha_core_vectors_test
+  //
+  // The main test functionality.
+  //----------------------------------------------------------------
+  initial
+    begin : chacha_core_vectors_test
+      integer i;
+
+      $display("   -- Testbench for chacha_core with test vectors started --");
+      $display("");
+
+      if (!$value$plusargs("vectors=%s", vector_file))
+        vector_file = "vectors.hex";
+      $readmemh(vector_file, vectors);
+
+      init_sim();
+      #(2 * CLK_PERIOD);
+      @(negedge tb_clk)
+      tb_reset_n = 1;
+
+      i = 0;
+      while ((i < MAX_VECTORS) && (^vectors[i] !== 1'bx) &&
+             (vectors[i][1159 : 1152] != 8'h0))
+        begin
+          run_vector(i);
+          i = i + 1;
+        end
+
+      if ((i == MAX_VECTORS) && (^vectors[MAX_VECTORS] !== 1'bx) &&
+          (vectors[MAX_VECTORS][1159 : 1152] != 8'h0))
+        $fatal(1, "*** ERROR: %0s has more than MAX_VECTORS (%0d) vectors.",
+               vector_file, MAX_VECTORS);
+
+      $display("*** %0d vectors tested in %0d cycles.", tc_ctr, cycle_ctr);
+      if (error_ctr == 0)
+        $display("*** All test vectors completed successfully");
+      else
+        $display("*** %0d test vectors did not complete successfully.", error_ctr);
+      $finish;
+    end // chacha_core_vectors_test
+
+endmodule // tb_chacha_core_vectors
+
+//======================================================================
+// EOF tb_chacha_core_vectors.v
+//======================================================================
@@ -4,9 +4,27 @@
 #
 # lsbgen.py
 # ---------
-# Given the length of a vector will calculate and print Verilog
-# statements needed to extract a number of 32-bit words from
-# the vector.
+# Generator of Verilog for the ChaCha core.
+#
+# Given the number of quarterround (chacha_qr) instances per cycle
+# (1, 2, 4 or 8) generates a variant of chacha_core.v. The variant
+# has the same module name, ports and register names as
+# chacha_core.v and can be simulated with the existing testbenches
+# by using the generated file instead of src/rtl/chacha_core.v.
+# With four instances the generated core is the same as
+# chacha_core.v. With eight instances a full double round is done
+# in each cycle.
+#
+# Optionally the core is pipelined. The round engine then runs
+# ahead of the output and starts the double rounds of the next
+# block directly when a block is done, while the current block is
+# handed to data_out or is held in a keystream register.
+#
+# The generated file contains the cycles per block predicted by
+# the cycle model in src/model/python/chacha_core_model.py.
+#
+# Without a variant given, prints the Verilog statements needed to
+# extract a number of 32-bit words from a vector.
 #
 # The vector is assumed to be in the format [(n-1)..0] where n
 # is the given number of bits. The vector is considered to
@@ -20,33 +38,33 @@
 #
 # Simple, isn't it? ;-)
 #
-# 
+#
 # Copyright (c) 2013 Secworks Sweden AB
 # Author: Joachim Strömbergson
-# 
-# Redistribution and use in source and binary forms, with or 
-# without modification, are permitted provided that the following 
-# conditions are met: 
-# 
-# 1. Redistributions of source code must retain the above copyright 
-#    notice, this list of conditions and the following disclaimer. 
-# 
-# 2. Redistributions in binary form must reproduce the above copyright 
-#    notice, this list of conditions and the following disclaimer in 
-#    the documentation and/or other materials provided with the 
-#    distribution. 
-# 
-# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
-# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT 
-# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS 
-# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE 
-# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, 
-# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, 
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
 # BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
-# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER 
-# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
-# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
-# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF 
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
 # ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 #=======================================================================
@@ -55,26 +73,880 @@
 # Python module imports.
 #-------------------------------------------------------------------
 import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src", "model", "python"))
+
+from chacha import QR_INDICES
+from chacha_core_model import predict
+
 
-    
 #-------------------------------------------------------------------
-# main()
-#
-# If executed tests the ChaCha class using known test vectors.
+# Constants.
+#-------------------------------------------------------------------
+QR_PER_CYCLE = [1, 2, 4, 8]
+PREDICT_ROUNDS = [8, 12, 20]
+STATE_NAMES = ["a", "b", "c", "d"]
+
+
+#-------------------------------------------------------------------
+# Verilog templates. The parts are joined by core_variant() and
+# filled in with the % operator.
 #-------------------------------------------------------------------
-def main():
-    vector_name = "state_reg"
-    vector_bits = 512
-    word_bits = 32
-    word_name = "x"
+HEADER = """\
+//======================================================================
+//
+// chacha_core.v
+// --------------
+// Verilog 2001 implementation of the stream cipher ChaCha.
+// This is the internal core with wide interfaces.
+//
+// Generated by tools/lsbgen.py with %(args)s.
+// Do not edit, regenerate instead.
+//
+// Variant with %(qr_per_cycle)d quarterround instances, %(qr_states)d cycle(s) per double round.
+%(pipeline_text)s//
+// Cycles predicted by the cycle model, with next asserted as soon
+// as data_out_valid is set:
+%(prediction)s//
+//
+// Copyright (c) 2013 Secworks Sweden AB
+// All rights reserved.
+//
+// Redistribution and use in source and binary forms, with or
+// without modification, are permitted provided that the following
+// conditions are met:
+//
+// 1. Redistributions of source code must retain the above copyright
+//    notice, this list of conditions and the following disclaimer.
+//
+// 2. Redistributions in binary form must reproduce the above copyright
+//    notice, this list of conditions and the following disclaimer in
+//    the documentation and/or other materials provided with the
+//    distribution.
+//
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+// FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+// COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+// INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+// BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+// LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+// STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+// ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+// ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+//
+//======================================================================
+
+`default_nettype none
+
+module chacha_core(
+                   input wire            clk,
+                   input wire            reset_n,
+
+                   input wire            init,
+                   input wire            next,
+
+                   input wire [255 : 0]  key,
+                   input wire            keylen,
+                   input wire [63 : 0]   iv,
+                   input wire [63 : 0]   ctr,
+                   input wire [4 : 0]    rounds,
+
+                   input wire [511 : 0]  data_in,
+
+                   output wire           ready,
+
+                   output wire [511 : 0] data_out,
+                   output wire           data_out_valid
+                  );
+
+
+  //----------------------------------------------------------------
+  // Internal constant and parameter definitions.
+  //----------------------------------------------------------------
+  // Datapath quartterround states names.
+%(qr_params)s
+  localparam NUM_ROUNDS = 4'h8;
+
+  localparam TAU0 = 32'h61707865;
+  localparam TAU1 = 32'h3120646e;
+  localparam TAU2 = 32'h79622d36;
+  localparam TAU3 = 32'h6b206574;
+
+  localparam SIGMA0 = 32'h61707865;
+  localparam SIGMA1 = 32'h3320646e;
+  localparam SIGMA2 = 32'h79622d32;
+  localparam SIGMA3 = 32'h6b206574;
+
+%(ctrl_params)s
+
+  //----------------------------------------------------------------
+  // l2b()
+  //
+  // Swap bytes from little to big endian byte order.
+  //----------------------------------------------------------------
+  function [31 : 0] l2b(input [31 : 0] op);
+    begin
+      l2b = {op[7 : 0], op[15 : 8], op[23 : 16], op[31 : 24]};
+    end
+  endfunction // b2l
+
+
+  //----------------------------------------------------------------
+  // Registers including update variables and write enable.
+  //----------------------------------------------------------------
+  reg [31 : 0]  state_reg [0 : 15];
+  reg [31 : 0]  state_new [0 : 15];
+  reg           state_we;
+
+  reg [511 : 0] data_out_reg;
+  reg [511 : 0] data_out_new;
+
+  reg           data_out_valid_reg;
+  reg           data_out_valid_new;
+  reg           data_out_valid_we;
+%(ks_regs)s
+  reg %(qr_range)s   qr_ctr_reg;
+  reg %(qr_range)s   qr_ctr_new;
+  reg           qr_ctr_we;
+  reg           qr_ctr_inc;
+  reg           qr_ctr_rst;
+
+  reg [3 : 0]   dr_ctr_reg;
+  reg [3 : 0]   dr_ctr_new;
+  reg           dr_ctr_we;
+  reg           dr_ctr_inc;
+  reg           dr_ctr_rst;
+
+  reg [31 : 0]  block0_ctr_reg;
+  reg [31 : 0]  block0_ctr_new;
+  reg           block0_ctr_we;
+  reg [31 : 0]  block1_ctr_reg;
+  reg [31 : 0]  block1_ctr_new;
+  reg           block1_ctr_we;
+  reg           block_ctr_inc;
+  reg           block_ctr_set;
+
+  reg           ready_reg;
+  reg           ready_new;
+  reg           ready_we;
+
+  reg [%(ctrl_msb)d : 0]   chacha_ctrl_reg;
+  reg [%(ctrl_msb)d : 0]   chacha_ctrl_new;
+  reg           chacha_ctrl_we;
+%(round_regs)s
+
+  //----------------------------------------------------------------
+  // Wires.
+  //----------------------------------------------------------------
+  reg [31 : 0] init_state_word [0 : 15];
+
+  reg init_state;
+  reg update_state;
+  reg update_output;
+%(wires)s
+%(qr_wires)s
+
+  //----------------------------------------------------------------
+  // Instantiation of the qr modules.
+  //----------------------------------------------------------------
+%(qr_instances)s
+
+  //----------------------------------------------------------------
+  // Concurrent connectivity for ports etc.
+  //----------------------------------------------------------------
+  assign data_out = data_out_reg;
+  assign data_out_valid = data_out_valid_reg;
+  assign ready = ready_reg;
+
+
+  //----------------------------------------------------------------
+  // reg_update
+  //
+  // Update functionality for all registers in the core.
+  // All registers are positive edge triggered with synchronous
+  // active low reset. All registers have write enable.
+  //----------------------------------------------------------------
+  always @ (posedge clk)
+    begin : reg_update
+     integer i;
+
+      if (!reset_n)
+        begin
+          for (i = 0 ; i < 16 ; i = i + 1)
+            state_reg[i] <= 32'h0;
+
+          data_out_reg       <= 512'h0;
+          data_out_valid_reg <= 0;
+%(ks_reset)s          qr_ctr_reg         <= QR0;
+          dr_ctr_reg         <= 0;
+          block0_ctr_reg     <= 32'h0;
+          block1_ctr_reg     <= 32'h0;
+          chacha_ctrl_reg    <= CTRL_IDLE;
+%(round_reset)s          ready_reg          <= 1;
+        end
+      else
+        begin
+          if (state_we)
+            begin
+              for (i = 0 ; i < 16 ; i = i + 1)
+                state_reg[i] <= state_new[i];
+            end
+
+          if (update_output)
+            data_out_reg <= data_out_new;
+
+          if (data_out_valid_we)
+            data_out_valid_reg <= data_out_valid_new;
+%(ks_update)s
+          if (qr_ctr_we)
+            qr_ctr_reg <= qr_ctr_new;
+
+          if (dr_ctr_we)
+            dr_ctr_reg <= dr_ctr_new;
+
+          if (block0_ctr_we)
+            block0_ctr_reg <= block0_ctr_new;
+
+          if (block1_ctr_we)
+            block1_ctr_reg <= block1_ctr_new;
+
+          if (ready_we)
+            ready_reg <= ready_new;
+
+          if (chacha_ctrl_we)
+            chacha_ctrl_reg <= chacha_ctrl_new;
+%(round_update)s        end
+    end // reg_update
+
+
+  //----------------------------------------------------------------
+  // init_state_logic
+  //
+  // Calculates the initial state for a given block.
+  //----------------------------------------------------------------
+  always @*
+    begin : init_state_logic
+      reg [31 : 0] key0;
+      reg [31 : 0] key1;
+      reg [31 : 0] key2;
+      reg [31 : 0] key3;
+      reg [31 : 0] key4;
+      reg [31 : 0] key5;
+      reg [31 : 0] key6;
+      reg [31 : 0] key7;
+
+      key0 = l2b(key[255 : 224]);
+      key1 = l2b(key[223 : 192]);
+      key2 = l2b(key[191 : 160]);
+      key3 = l2b(key[159 : 128]);
+      key4 = l2b(key[127 :  96]);
+      key5 = l2b(key[95  :  64]);
+      key6 = l2b(key[63  :  32]);
+      key7 = l2b(key[31  :   0]);
+
+      init_state_word[04] = key0;
+      init_state_word[05] = key1;
+      init_state_word[06] = key2;
+      init_state_word[07] = key3;
+      init_state_word[12] = block0_ctr_reg;
+      init_state_word[13] = block1_ctr_reg;
+      init_state_word[14] = l2b(iv[63 : 32]);
+      init_state_word[15] = l2b(iv[31 :  0]);
+
+      if (keylen)
+        begin
+          // 256 bit key.
+          init_state_word[00] = SIGMA0;
+          init_state_word[01] = SIGMA1;
+          init_state_word[02] = SIGMA2;
+          init_state_word[03] = SIGMA3;
+          init_state_word[08] = key4;
+          init_state_word[09] = key5;
+          init_state_word[10] = key6;
+          init_state_word[11] = key7;
+        end
+      else
+        begin
+          // 128 bit key.
+          init_state_word[00] = TAU0;
+          init_state_word[01] = TAU1;
+          init_state_word[02] = TAU2;
+          init_state_word[03] = TAU3;
+          init_state_word[08] = key0;
+          init_state_word[09] = key1;
+          init_state_word[10] = key2;
+          init_state_word[11] = key3;
+        end
+    end
+
+
+  //----------------------------------------------------------------
+  // state_logic
+  // Logic to init and update the internal state.
+  //----------------------------------------------------------------
+  always @*
+    begin : state_logic
+      integer i;
+
+      for (i = 0 ; i < 16 ; i = i + 1)
+        state_new[i] = 32'h0;
+      state_we = 0;
+
+%(qr_clear)s
+
+      if (init_state)
+        begin
+          for (i = 0 ; i < 16 ; i = i + 1)
+            state_new[i] = init_state_word[i];
+          state_we   = 1;
+        end // if (init_state)
+%(next_state)s
+      if (update_state)
+        begin
+          state_we = 1;
+          case (qr_ctr_reg)
+%(round_cases)s          endcase // case (quarterround_select)
+        end // if (update_state)
+    end // state_logic
+
+
+%(data_out_logic)s
+
+  //----------------------------------------------------------------
+  // qr_ctr
+  // Update logic for the quarterround counter, a monotonically
+  // increasing counter with reset.
+  //----------------------------------------------------------------
+  always @*
+    begin : qr_ctr
+      qr_ctr_new = 0;
+      qr_ctr_we  = 0;
+
+      if (qr_ctr_rst)
+        begin
+          qr_ctr_new = 0;
+          qr_ctr_we  = 1;
+        end
+
+      if (qr_ctr_inc)
+        begin
+          qr_ctr_new = %(qr_ctr_inc)s;
+          qr_ctr_we  = 1;
+        end
+    end // qr_ctr
+
+
+  //----------------------------------------------------------------
+  // dr_ctr
+  // Update logic for the round counter, a monotonically
+  // increasing counter with reset.
+  //----------------------------------------------------------------
+  always @*
+    begin : dr_ctr
+      dr_ctr_new = 0;
+      dr_ctr_we  = 0;
+
+      if (dr_ctr_rst)
+        begin
+          dr_ctr_new = 0;
+          dr_ctr_we  = 1;
+        end
+
+      if (dr_ctr_inc)
+        begin
+          dr_ctr_new = dr_ctr_reg + 1'b1;
+          dr_ctr_we  = 1;
+        end
+    end // dr_ctr
+
+
+  //----------------------------------------------------------------
+  // block_ctr
+  // Update logic for the 64-bit block counter, a monotonically
+  // increasing counter with reset.
+  //----------------------------------------------------------------
+  always @*
+    begin : block_ctr
+      block0_ctr_new = 32'h0;
+      block1_ctr_new = 32'h0;
+      block0_ctr_we = 0;
+      block1_ctr_we = 0;
+
+      if (block_ctr_set)
+        begin
+          block0_ctr_new = ctr[31 : 00];
+          block1_ctr_new = ctr[63 : 32];
+          block0_ctr_we = 1;
+          block1_ctr_we = 1;
+        end
+
+      if (block_ctr_inc)
+        begin
+          block0_ctr_new = block0_ctr_reg + 1;
+          block0_ctr_we = 1;
+
+          // Avoid chaining the 32-bit adders.
+          if (block0_ctr_reg == 32'hffffffff)
+            begin
+              block1_ctr_new = block1_ctr_reg + 1;
+              block1_ctr_we = 1;
+            end
+        end
+    end // block_ctr
+
+
+%(fsm)s
+endmodule // chacha_core
+
+//======================================================================
+// EOF chacha_core.v
+//======================================================================
+"""
+
+CTRL_PARAMS = """\
+  localparam CTRL_IDLE     = 3'h0;
+  localparam CTRL_INIT     = 3'h1;
+  localparam CTRL_ROUNDS   = 3'h2;
+  localparam CTRL_FINALIZE = 3'h3;
+  localparam CTRL_DONE     = 3'h4;
+"""
+
+PIPELINED_CTRL_PARAMS = """\
+  localparam CTRL_IDLE     = 2'h0;
+  localparam CTRL_WAIT     = 2'h1;
+  localparam CTRL_DONE     = 2'h2;
+
+  localparam ROUND_IDLE    = 2'h0;
+  localparam ROUND_INIT    = 2'h1;
+  localparam ROUND_ROUNDS  = 2'h2;
+  localparam ROUND_STORE   = 2'h3;
+"""
+
+PIPELINED_KS_REGS = """
+  reg [511 : 0] ks_reg;
+  reg [511 : 0] ks_new;
+  reg           ks_we;
+
+  reg           ks_valid_reg;
+  reg           ks_valid_new;
+  reg           ks_valid_we;
+"""
+
+PIPELINED_ROUND_REGS = """
+  reg [1 : 0]   round_ctrl_reg;
+  reg [1 : 0]   round_ctrl_new;
+  reg           round_ctrl_we;
+"""
+
+PIPELINED_WIRES = """  reg next_state;
+
+  reg restart;
+  reg ks_consume;
+  reg ks_bypass;
+"""
+
+PIPELINED_KS_RESET = """\
+          ks_reg             <= 512'h0;
+          ks_valid_reg       <= 0;
+"""
+
+PIPELINED_ROUND_RESET = """\
+          round_ctrl_reg     <= ROUND_IDLE;
+"""
+
+PIPELINED_KS_UPDATE = """
+          if (ks_we)
+            ks_reg <= ks_new;
+
+          if (ks_valid_we)
+            ks_valid_reg <= ks_valid_new;
+"""
+
+PIPELINED_ROUND_UPDATE = """
+          if (round_ctrl_we)
+            round_ctrl_reg <= round_ctrl_new;
+"""
 
-    # Check that the given size is ok.
+PIPELINED_NEXT_STATE = """
+      if (next_state)
+        begin
+          for (i = 0 ; i < 16 ; i = i + 1)
+            state_new[i] = init_state_word[i];
+
+          // The block counter of the next block.
+          state_new[12] = block0_ctr_reg + 1;
+          state_new[13] = block1_ctr_reg;
+          if (block0_ctr_reg == 32'hffffffff)
+            state_new[13] = block1_ctr_reg + 1;
+          state_we   = 1;
+        end // if (next_state)
+"""
+
+BLOCK_STATE = """\
+      for (i = 0 ; i < 16 ; i = i + 1)
+        begin
+          msb_block_state[i] = init_state_word[i] + state_reg[i];
+          lsb_block_state[i] = l2b(msb_block_state[i][31 : 0]);
+        end
+
+      block_state = {lsb_block_state[00], lsb_block_state[01],
+                     lsb_block_state[02], lsb_block_state[03],
+                     lsb_block_state[04], lsb_block_state[05],
+                     lsb_block_state[06], lsb_block_state[07],
+                     lsb_block_state[08], lsb_block_state[09],
+                     lsb_block_state[10], lsb_block_state[11],
+                     lsb_block_state[12], lsb_block_state[13],
+                     lsb_block_state[14], lsb_block_state[15]};
+"""
+
+DATA_OUT_LOGIC = """\
+  //----------------------------------------------------------------
+  // data_out_logic
+  // Final output logic that combines the result from state
+  // update with the input block. This adds a 16 rounds and
+  // a final layer of XOR gates.
+  //
+  // Note that we also remap all the words into LSB format.
+  //----------------------------------------------------------------
+  always @*
+    begin : data_out_logic
+      integer i;
+      reg [31 : 0] msb_block_state [0 : 15];
+      reg [31 : 0] lsb_block_state [0 : 15];
+      reg [511 : 0] block_state;
+
+""" + BLOCK_STATE + """
+      data_out_new = data_in ^ block_state;
+    end // data_out_logic
+"""
+
+PIPELINED_DATA_OUT_LOGIC = """\
+  //----------------------------------------------------------------
+  // data_out_logic
+  // Final output logic that combines the result from state
+  // update with the input block. This adds a 16 rounds and
+  // a final layer of XOR gates. The keystream is either taken
+  // directly from the round engine or from the keystream
+  // register where a block computed ahead is held.
+  //
+  // Note that we also remap all the words into LSB format.
+  //----------------------------------------------------------------
+  always @*
+    begin : data_out_logic
+      integer i;
+      reg [31 : 0] msb_block_state [0 : 15];
+      reg [31 : 0] lsb_block_state [0 : 15];
+      reg [511 : 0] block_state;
+
+""" + BLOCK_STATE + """
+      ks_new = block_state;
+
+      if (ks_bypass)
+        data_out_new = data_in ^ block_state;
+      else
+        data_out_new = data_in ^ ks_reg;
+    end // data_out_logic
+"""
+
+FSM = """\
+  //----------------------------------------------------------------
+  // chacha_ctrl_fsm
+  // Logic for the state machine controlling the core behaviour.
+  //----------------------------------------------------------------
+  always @*
+    begin : chacha_ctrl_fsm
+      init_state         = 0;
+      update_state       = 0;
+      update_output      = 0;
+      qr_ctr_inc         = 0;
+      qr_ctr_rst         = 0;
+      dr_ctr_inc         = 0;
+      dr_ctr_rst         = 0;
+      block_ctr_inc      = 0;
+      block_ctr_set      = 0;
+      ready_new          = 0;
+      ready_we           = 0;
+      data_out_valid_new = 0;
+      data_out_valid_we  = 0;
+      chacha_ctrl_new    = CTRL_IDLE;
+      chacha_ctrl_we     = 0;
+
+      case (chacha_ctrl_reg)
+        CTRL_IDLE:
+          begin
+            if (init)
+              begin
+                block_ctr_set   = 1;
+                ready_new       = 0;
+                ready_we        = 1;
+                chacha_ctrl_new = CTRL_INIT;
+                chacha_ctrl_we  = 1;
+              end
+          end
+
+        CTRL_INIT:
+          begin
+            init_state      = 1;
+            qr_ctr_rst      = 1;
+            dr_ctr_rst      = 1;
+            chacha_ctrl_new = CTRL_ROUNDS;
+            chacha_ctrl_we  = 1;
+          end
+
+        CTRL_ROUNDS:
+          begin
+            update_state = 1;
+            qr_ctr_inc   = 1;
+            if (qr_ctr_reg == %(qr_last)s)
+              begin
+                dr_ctr_inc = 1;
+                if (dr_ctr_reg == (rounds[4 : 1] - 1))
+                  begin
+                    chacha_ctrl_new = CTRL_FINALIZE;
+                    chacha_ctrl_we  = 1;
+                  end
+              end
+          end
+
+        CTRL_FINALIZE:
+          begin
+            ready_new          = 1;
+            ready_we           = 1;
+            update_output      = 1;
+            data_out_valid_new = 1;
+            data_out_valid_we  = 1;
+            chacha_ctrl_new    = CTRL_DONE;
+            chacha_ctrl_we     = 1;
+          end
+
+        CTRL_DONE:
+          begin
+            if (init)
+              begin
+                ready_new          = 0;
+                ready_we           = 1;
+                data_out_valid_new = 0;
+                data_out_valid_we  = 1;
+                block_ctr_set      = 1;
+                chacha_ctrl_new    = CTRL_INIT;
+                chacha_ctrl_we     = 1;
+              end
+            else if (next)
+              begin
+                ready_new          = 0;
+                ready_we           = 1;
+                data_out_valid_new = 0;
+                data_out_valid_we  = 1;
+                block_ctr_inc      = 1;
+                chacha_ctrl_new    = CTRL_INIT;
+                chacha_ctrl_we     = 1;
+              end
+          end
+
+        default:
+          begin
+
+          end
+      endcase // case (chacha_ctrl_reg)
+    end // chacha_ctrl_fsm"""
+
+PIPELINED_FSM = """\
+  //----------------------------------------------------------------
+  // chacha_ctrl_fsm
+  // Logic for the state machine controlling the output of the
+  // core. Init restarts the round engine. A block is output as
+  // soon as the round engine has it ready.
+  //----------------------------------------------------------------
+  always @*
+    begin : chacha_ctrl_fsm
+      restart            = 0;
+      ks_consume         = 0;
+      ks_bypass          = 0;
+      update_output      = 0;
+      block_ctr_set      = 0;
+      ready_new          = 0;
+      ready_we           = 0;
+      data_out_valid_new = 0;
+      data_out_valid_we  = 0;
+      chacha_ctrl_new    = CTRL_IDLE;
+      chacha_ctrl_we     = 0;
+
+      case (chacha_ctrl_reg)
+        CTRL_IDLE:
+          begin
+            if (init)
+              begin
+                restart         = 1;
+                block_ctr_set   = 1;
+                ready_new       = 0;
+                ready_we        = 1;
+                chacha_ctrl_new = CTRL_WAIT;
+                chacha_ctrl_we  = 1;
+              end
+          end
+
+        CTRL_WAIT:
+          begin
+            if (ks_valid_reg)
+              ks_consume = 1;
+            else if (round_ctrl_reg == ROUND_STORE)
+              ks_bypass = 1;
+
+            if (ks_consume || ks_bypass)
+              begin
+                ready_new          = 1;
+                ready_we           = 1;
+                update_output      = 1;
+                data_out_valid_new = 1;
+                data_out_valid_we  = 1;
+                chacha_ctrl_new    = CTRL_DONE;
+                chacha_ctrl_we     = 1;
+              end
+          end
+
+        CTRL_DONE:
+          begin
+            if (init)
+              begin
+                restart            = 1;
+                block_ctr_set      = 1;
+                ready_new          = 0;
+                ready_we           = 1;
+                data_out_valid_new = 0;
+                data_out_valid_we  = 1;
+                chacha_ctrl_new    = CTRL_WAIT;
+                chacha_ctrl_we     = 1;
+              end
+            else if (next)
+              begin
+                ready_new          = 0;
+                ready_we           = 1;
+                data_out_valid_new = 0;
+                data_out_valid_we  = 1;
+                chacha_ctrl_new    = CTRL_WAIT;
+                chacha_ctrl_we     = 1;
+              end
+          end
+
+        default:
+          begin
+
+          end
+      endcase // case (chacha_ctrl_reg)
+    end // chacha_ctrl_fsm
+
+
+  //----------------------------------------------------------------
+  // round_ctrl_fsm
+  // Logic for the state machine controlling the round engine.
+  // When the rounds of a block are done the block is handed to
+  // the output or stored in the keystream register, and the
+  // rounds of the next block are started directly.
+  //----------------------------------------------------------------
+  always @*
+    begin : round_ctrl_fsm
+      init_state     = 0;
+      next_state     = 0;
+      update_state   = 0;
+      qr_ctr_inc     = 0;
+      qr_ctr_rst     = 0;
+      dr_ctr_inc     = 0;
+      dr_ctr_rst     = 0;
+      block_ctr_inc  = 0;
+      ks_we          = 0;
+      ks_valid_new   = 0;
+      ks_valid_we    = 0;
+      round_ctrl_new = ROUND_IDLE;
+      round_ctrl_we  = 0;
+
+      if (restart)
+        begin
+          ks_valid_new   = 0;
+          ks_valid_we    = 1;
+          round_ctrl_new = ROUND_INIT;
+          round_ctrl_we  = 1;
+        end
+      else
+        begin
+          if (ks_consume)
+            begin
+              ks_valid_new = 0;
+              ks_valid_we  = 1;
+            end
+
+          case (round_ctrl_reg)
+            ROUND_INIT:
+              begin
+                init_state     = 1;
+                qr_ctr_rst     = 1;
+                dr_ctr_rst     = 1;
+                round_ctrl_new = ROUND_ROUNDS;
+                round_ctrl_we  = 1;
+              end
+
+            ROUND_ROUNDS:
+              begin
+                update_state = 1;
+                qr_ctr_inc   = 1;
+                if (qr_ctr_reg == %(qr_last)s)
+                  begin
+                    dr_ctr_inc = 1;
+                    if (dr_ctr_reg == (rounds[4 : 1] - 1))
+                      begin
+                        round_ctrl_new = ROUND_STORE;
+                        round_ctrl_we  = 1;
+                      end
+                  end
+              end
+
+            ROUND_STORE:
+              begin
+                if (!ks_valid_reg || ks_consume)
+                  begin
+                    next_state     = 1;
+                    qr_ctr_rst     = 1;
+                    dr_ctr_rst     = 1;
+                    block_ctr_inc  = 1;
+                    round_ctrl_new = ROUND_ROUNDS;
+                    round_ctrl_we  = 1;
+
+                    if (!ks_bypass)
+                      begin
+                        ks_we        = 1;
+                        ks_valid_new = 1;
+                        ks_valid_we  = 1;
+                      end
+                  end
+              end
+
+            default:
+              begin
+
+              end
+          endcase // case (round_ctrl_reg)
+        end
+    end // round_ctrl_fsm"""
+
+
+#-------------------------------------------------------------------
+# lsb_assignments()
+#
+# Return the statements extracting 32-bit lsb words from the
+# given vector.
+#-------------------------------------------------------------------
+def lsb_assignments(vector_name = "state_reg", vector_bits = 512, word_bits = 32,
+                    word_name = "x"):
     if (vector_bits % word_bits != 0):
-        print("Error: Vector with %d bits can not be evenly divided into %d-bit words." % (vector_bits, word_bits))
-        return
-    else:
-        print("Creating %d words of size %d" )
+        raise ValueError("Vector with %d bits can not be evenly divided into %d-bit words." %
+                         (vector_bits, word_bits))
 
+    lines = []
     for i in range(int(vector_bits / word_bits)):
         b0max = (vector_bits - 1)  - i * word_bits
         b0min = (vector_bits - 8)  - i * word_bits
@@ -84,20 +956,222 @@ def main():
         b2min = (vector_bits - 24) - i * word_bits
         b3max = (vector_bits - 25) - i * word_bits
         b3min = (vector_bits - 32) - i * word_bits
-        
-        print("x%d_new = {%s[%d:%d], %s[%d:%d], %s[%d:%d], %s[%d:%d]}" %\
-              (i, vector_name, b3max, b3min, vector_name, b2max, b2min,
-               vector_name, b1max, b1min, vector_name, b0max, b0min))
-                   
+
+        lines.append("%s%d_new = {%s[%d:%d], %s[%d:%d], %s[%d:%d], %s[%d:%d]}" %\
+                     (word_name, i, vector_name, b3max, b3min, vector_name, b2max, b2min,
+                      vector_name, b1max, b1min, vector_name, b0max, b0min))
+    return lines
+
+
+#-------------------------------------------------------------------
+# qr_range()
+#
+# The range of the qr_ctr registers, padded to the column of
+# the register names.
+#-------------------------------------------------------------------
+def qr_range(qr_states):
+    if qr_states <= 2:
+        return "       "
+    return "[%d : 0]" % ((qr_states - 1).bit_length() - 1)
+
+
+#-------------------------------------------------------------------
+# qr_wires()
+#
+# Declarations of the inputs and outputs of the qr instances.
+#-------------------------------------------------------------------
+def qr_wires(qr_per_cycle):
+    groups = []
+    for i in range(qr_per_cycle):
+        text = ""
+        for n in STATE_NAMES:
+            text += "  reg [31 : 0]  qr%d_%s;\n" % (i, n)
+        for n in STATE_NAMES:
+            text += "  wire [31 : 0] qr%d_%s_prim;\n" % (i, n)
+        groups.append(text)
+    return "\n".join(groups)
+
+
+#-------------------------------------------------------------------
+# qr_instances()
+#
+# Instantiation of the qr modules.
+#-------------------------------------------------------------------
+def qr_instances(qr_per_cycle):
+    text = ""
+    for i in range(qr_per_cycle):
+        text += "  chacha_qr qr%d(\n" % i
+        for n in STATE_NAMES:
+            text += "                .%s(qr%d_%s),\n" % (n, i, n)
+        text += "\n"
+        for n in STATE_NAMES:
+            text += "                .%s_prim(qr%d_%s_prim)%s\n" % (n, i, n, ["", ","][n != "d"])
+        text += "               );\n\n"
+    return text[:-1]
+
+
+#-------------------------------------------------------------------
+# qr_clear()
+#
+# Default values of the qr inputs in state_logic.
+#-------------------------------------------------------------------
+def qr_clear(qr_per_cycle):
+    return "\n".join(("      qr%d_%s = 32'h0;" % (i, n)) for i in range(qr_per_cycle)
+                     for n in STATE_NAMES)
+
+
+#-------------------------------------------------------------------
+# round_cases()
+#
+# The case items of state_logic, one for each value of
+# qr_ctr_reg. The quarterrounds done in the same cycle are
+# chained, the inputs of a quarterround are taken from the
+# outputs of an earlier one in the cycle if it updated the word.
+# Words not updated in the cycle keep their value.
+#-------------------------------------------------------------------
+def round_cases(qr_per_cycle):
+    text = ""
+    for qr_state in range(8 // qr_per_cycle):
+        word = ["state_reg[%02d]" % i for i in range(16)]
+        inputs = []
+        for i in range(qr_per_cycle):
+            indices = QR_INDICES[qr_state * qr_per_cycle + i]
+            for (n, w) in zip(STATE_NAMES, indices):
+                inputs.append("qr%d_%s = %s;" % (i, n, word[w]))
+            for (n, w) in zip(STATE_NAMES, indices):
+                word[w] = "qr%d_%s_prim" % (i, n)
+
+        outputs = []
+        for i in range(qr_per_cycle):
+            for (n, w) in zip(STATE_NAMES, QR_INDICES[qr_state * qr_per_cycle + i]):
+                if word[w] == "qr%d_%s_prim" % (i, n):
+                    outputs.append("state_new[%02d] = %s;" % (w, word[w]))
+        for w in range(16):
+            if word[w] == "state_reg[%02d]" % w:
+                outputs.append("state_new[%02d] = %s;" % (w, word[w]))
+
+        text += "            QR%d:\n" % qr_state
+        text += "              begin\n"
+        for line in inputs + outputs:
+            text += "                %s\n" % line
+        text += "              end\n\n"
+    return text[:-1]
+
+
+#-------------------------------------------------------------------
+# prediction()
+#
+# Comment lines with the latency and cycles per block predicted
+# by the cycle model for the variant.
+#-------------------------------------------------------------------
+def prediction(qr_per_cycle, pipeline):
+    text = ""
+    for rounds in PREDICT_ROUNDS:
+        for keylen in [128, 256]:
+            p = predict(rounds, keylen, qr_per_cycle = qr_per_cycle, pipeline = pipeline)
+            text += ("//   rounds=%2d keylen=%d: latency %2d cycles, %4.1f cycles/block, %.3f bytes/cycle\n" %
+                     (rounds, keylen, p["latency"], p["cycles_per_block"], p["bytes_per_cycle"]))
+    return text
+
+
+#-------------------------------------------------------------------
+# core_variant()
+#
+# Return the Verilog source of the chacha_core variant with the
+# given number of qr instances, optionally pipelined.
+#-------------------------------------------------------------------
+def core_variant(qr_per_cycle = 4, pipeline = False):
+    if qr_per_cycle not in QR_PER_CYCLE:
+        raise ValueError("Unsupported number of quarterrounds per cycle: %d" % qr_per_cycle)
+
+    qr_states = 8 // qr_per_cycle
+    args = "--qr-per-cycle %d" % qr_per_cycle
+    if pipeline:
+        args += " --pipeline"
+
+    fields = {"args" : args, "qr_per_cycle" : qr_per_cycle, "qr_states" : qr_states,
+              "prediction" : prediction(qr_per_cycle, pipeline),
+              "qr_params" : "".join(("  localparam QR%d = %d;\n" % (i, i))
+                                    for i in range(qr_states)),
+              "qr_last" : "QR%d" % (qr_states - 1),
+              "qr_range" : qr_range(qr_states),
+              "qr_wires" : qr_wires(qr_per_cycle),
+              "qr_instances" : qr_instances(qr_per_cycle),
+              "qr_clear" : qr_clear(qr_per_cycle),
+              "round_cases" : round_cases(qr_per_cycle)}
+
+    # With one qr state the counter must stay at QR0.
+    if qr_states > 1:
+        fields["qr_ctr_inc"] = "qr_ctr_reg + 1'b1"
+    else:
+        fields["qr_ctr_inc"] = "QR0"
+
+    if pipeline:
+        fields.update({"pipeline_text" : "// Pipelined, the double rounds of the next block are started\n"
+                                         "// while the current block is output.\n",
+                       "ctrl_params" : PIPELINED_CTRL_PARAMS, "ctrl_msb" : 1,
+                       "ks_regs" : PIPELINED_KS_REGS, "round_regs" : PIPELINED_ROUND_REGS,
+                       "wires" : PIPELINED_WIRES, "ks_reset" : PIPELINED_KS_RESET,
+                       "round_reset" : PIPELINED_ROUND_RESET,
+                       "ks_update" : PIPELINED_KS_UPDATE,
+                       "round_update" : PIPELINED_ROUND_UPDATE,
+                       "next_state" : PIPELINED_NEXT_STATE,
+                       "data_out_logic" : PIPELINED_DATA_OUT_LOGIC,
+                       "fsm" : PIPELINED_FSM % fields})
+    else:
+        fields.update({"pipeline_text" : "", "ctrl_params" : CTRL_PARAMS, "ctrl_msb" : 2,
+                       "ks_regs" : "", "round_regs" : "", "wires" : "", "ks_reset" : "",
+                       "round_reset" : "", "ks_update" : "", "round_update" : "",
+                       "next_state" : "", "data_out_logic" : DATA_OUT_LOGIC,
+                       "fsm" : FSM % fields})
+
+    return HEADER % fields
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Generate a chacha_core variant if the number of quarterrounds
+# per cycle is given, otherwise print the lsb word statements.
+#-------------------------------------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(prog="lsbgen",
+                                     description="Generate chacha_core variants or lsb word statements.")
+    parser.add_argument("--qr-per-cycle", type=int, choices=QR_PER_CYCLE,
+                        help="Generate a chacha_core variant with the given number of qr instances.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Generate a pipelined variant.")
+    parser.add_argument("--output", help="Write the variant to the given file instead of stdout.")
+    opts = parser.parse_args(args)
+
+    if opts.qr_per_cycle is None:
+        vector_bits = 512
+        word_bits = 32
+        print("Creating %d words of size %d" % (vector_bits // word_bits, word_bits))
+        for line in lsb_assignments("state_reg", vector_bits, word_bits, "x"):
+            print(line)
+        return 0
+
+    source = core_variant(opts.qr_per_cycle, opts.pipeline)
+    if opts.output:
+        with open(opts.output, "w") as f:
+            f.write(source)
+        print("Wrote chacha_core variant with %d qr instances%s to %s" %
+              (opts.qr_per_cycle, ["", ", pipelined"][opts.pipeline], opts.output))
+        print(prediction(opts.qr_per_cycle, opts.pipeline).replace("//   ", ""), end="")
+    else:
+        sys.stdout.write(source)
+    return 0
+
 
 #-------------------------------------------------------------------
 # __name__
 # Python thingy which allows the file to be run standalone as
 # well as parsed from within a Python interpreter.
 #-------------------------------------------------------------------
-if __name__=="__main__": 
+if __name__=="__main__":
     # Run the main function.
-    sys.exit(main())
+    sys.exit(main(sys.argv[1:]))
 
 #=======================================================================
 # EOF lsbgen.py